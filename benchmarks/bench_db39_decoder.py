@@ -0,0 +1,81 @@
+"""
+DB39 decoder microbenchmark
+Compares the compiled struct decoder against the original get_bool/get_real decoder.
+
+Run from the repository root:  python benchmarks/bench_db39_decoder.py
+Works in a scratch directory, so the repository's pump_events.db is never touched.
+"""
+
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import timeit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from snap7.util import get_real, get_bool
+
+# (prefix, offset, ready bit, running bit, trip bit) exactly as the original read_db39() hardcoded them
+LEGACY_PUMPS = [
+    ('', 0, 1, 2, 3),
+    ('p2_', 10, 0, 1, 2),
+    ('p3_', 20, 0, 1, 2),
+    ('p4_', 30, 0, 2, 1),
+    ('p5_', 40, 1, 0, 2),
+    ('p6_', 50, 0, 1, 2),
+    ('p7_', 60, 0, 1, 2),
+]
+
+def legacy_decode(data):
+    """Original decoder: one get_bool/get_real call per field"""
+    result = {}
+    for prefix, offset, ready_bit, running_bit, trip_bit in LEGACY_PUMPS:
+        if offset == 0:
+            result['alarm'] = get_bool(data, 0, 0)
+        ready = get_bool(data, offset, ready_bit)
+        running = get_bool(data, offset, running_bit)
+        trip = get_bool(data, offset, trip_bit)
+        result[prefix + 'ready_yellow'] = ready
+        result[prefix + 'running_green'] = running
+        result[prefix + 'trip_red'] = trip
+        result[prefix + 'pressure'] = round(get_real(data, offset + 2), 2)
+        result[prefix + 'pressure_setpoint'] = round(get_real(data, offset + 6), 2)
+        result[prefix + 'status'] = "READY" if ready else ("RUNNING" if running else ("TRIP" if trip else "UNKNOWN"))
+    result['connected'] = True
+    return result
+
+def random_frame(layout, size):
+    """Synthetic DB39 buffer with random status bits and pressures"""
+    data = bytearray(size)
+    for pump in layout:
+        data[pump['offset']] = random.getrandbits(4)
+        struct.pack_into('>ff', data, pump['offset'] + 2, random.uniform(0, 10), random.uniform(0, 10))
+    return data
+
+if __name__ == '__main__':
+    workdir = tempfile.mkdtemp(prefix='pump_db39_')
+    os.chdir(workdir)  # the app creates its database in the working directory on import
+    from pump_dasboard import PUMP_LAYOUT, DB39Decoder
+    
+    decoder = DB39Decoder(PUMP_LAYOUT)
+    frames = [random_frame(PUMP_LAYOUT, decoder.size) for _ in range(256)]
+    
+    for frame in frames:
+        assert decoder.decode(frame) == legacy_decode(frame), "decoders disagree"
+    
+    number = 200
+    legacy = min(timeit.repeat(lambda: [legacy_decode(f) for f in frames], number=number, repeat=5))
+    compiled = min(timeit.repeat(lambda: [decoder.decode(f) for f in frames], number=number, repeat=5))
+    frames_run = number * len(frames)
+    
+    print(f"Frame size: {decoder.size} bytes, format {decoder.struct.format}")
+    print(f"Legacy decoder:   {legacy / frames_run * 1e6:8.2f} us/frame")
+    print(f"Compiled decoder: {compiled / frames_run * 1e6:8.2f} us/frame")
+    print(f"Speedup:          {legacy / compiled:8.2f}x")
+    
+    os.chdir(REPO_ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
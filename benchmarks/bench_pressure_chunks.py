@@ -0,0 +1,145 @@
+"""
+Pressure storage benchmark
+Compares one pressure_history row per sample against compressed pressure_chunks
+(delta-of-delta timestamps, XOR float32) for bytes per sample, write time and
+scan speed.
+
+Run from the repository root:
+    python benchmarks/bench_pressure_chunks.py
+    python benchmarks/bench_pressure_chunks.py --hours 48 --pumps 7 --cycle 0.5
+Works in a scratch directory, so the repository's pump_events.db is never touched.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# The pressure_history schema as it was before schema migration 8
+LEGACY_SCHEMA = [
+    '''
+    CREATE TABLE pressure_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pump_id INTEGER NOT NULL,
+        pump_name TEXT NOT NULL,
+        pressure REAL,
+        pressure_setpoint REAL,
+        status TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        site_id TEXT
+    )
+    ''',
+    'CREATE INDEX idx_pressure_history_pump_ts ON pressure_history (pump_id, timestamp)',
+    'CREATE INDEX idx_pressure_history_ts ON pressure_history (timestamp)',
+]
+
+def synthetic_series(pumps, hours, cycle, start):
+    """Per cycle: (ts, [(pump_id, pressure, setpoint, status)]) with PLC-like jitter, noise and trips"""
+    state = {pump_id: [random.uniform(2, 6), 4.0, 'RUNNING'] for pump_id in range(1, pumps + 1)}
+    ts = start
+    for _ in range(int(hours * 3600 / cycle)):
+        ts += cycle + random.gauss(0, 0.002)
+        samples = []
+        for pump_id, values in state.items():
+            if random.random() < 0.0002:
+                values[2] = 'TRIP' if values[2] == 'RUNNING' else 'RUNNING'
+            values[0] = 0.0 if values[2] == 'TRIP' else min(max(values[0] + random.gauss(0, 0.02), 0.0), 10.0)
+            # The transmitter resolves 0.01 bar, so consecutive readings often repeat
+            samples.append((pump_id, round(values[0], 2), values[1], values[2]))
+        yield ts, samples
+
+def file_size(conn, path):
+    conn.execute('VACUUM')
+    return os.path.getsize(path)
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix='pump_chunks_')
+    os.chdir(workdir)  # the app creates its database in the working directory on import
+    import pump_dasboard as pd
+
+    random.seed(args.seed)
+    start = time.time() - args.hours * 3600
+    series = list(synthetic_series(args.pumps, args.hours, args.cycle, start))
+    samples = len(series) * args.pumps
+    print(f"{args.pumps} pumps x {args.hours} h at {args.cycle} s: {samples} samples")
+
+    # Legacy rows
+    legacy_path = os.path.join(workdir, 'legacy.db')
+    legacy = sqlite3.connect(legacy_path)
+    for sql in LEGACY_SCHEMA:
+        legacy.execute(sql)
+    started = time.perf_counter()
+    with legacy:
+        legacy.executemany(
+            'INSERT INTO pressure_history (pump_id, pump_name, pressure, pressure_setpoint, status, timestamp, site_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((pump_id, f"PUMP {pump_id} AIR HANDLING UNIT", pressure, setpoint, status, pd.db_timestamp(ts), 'challawa')
+             for ts, cycle in series for pump_id, pressure, setpoint, status in cycle))
+    legacy_write = time.perf_counter() - started
+    legacy_bytes = file_size(legacy, legacy_path)
+
+    # Chunks, through the same PressureChunks path the monitor uses
+    chunk_path = os.path.join(workdir, 'chunks.db')
+    chunked = sqlite3.connect(chunk_path)
+    chunked.execute(pd.SCHEMA_MIGRATIONS[pd.PRESSURE_CHUNKS_MIGRATION - 1][0])
+    rows = []
+    chunks = pd.PressureChunks(sink=rows.extend)
+    started = time.perf_counter()
+    for ts, cycle in series:
+        ts_ms = round(ts * 1000)
+        for pump_id, pressure, setpoint, status in cycle:
+            closed = chunks.add_sample(ts_ms, pump_id, pressure, setpoint, pd.PRESSURE_STATUS_CODES[status])
+            if closed:
+                rows.append(closed)
+    chunks.flush()
+    encode_time = time.perf_counter() - started
+    with chunked:
+        chunked.executemany(pd.PRESSURE_CHUNK_INSERT, rows)
+    chunk_write = time.perf_counter() - started
+    chunk_bytes = file_size(chunked, chunk_path)
+    payload = sum(len(row[4]) for row in rows)
+
+    # Scan one pump's last `--scan-hours`
+    scan_start = start + (args.hours - args.scan_hours) * 3600
+    started = time.perf_counter()
+    legacy_rows = legacy.execute('SELECT pressure, timestamp FROM pressure_history WHERE pump_id = ? AND timestamp >= ? '
+                                 'ORDER BY timestamp', (1, pd.db_timestamp(scan_start))).fetchall()
+    legacy_scan = time.perf_counter() - started
+    pd.pressure_chunks = pd.PressureChunks()  # no open in-memory chunks in this process
+    started = time.perf_counter()
+    chunk_rows = list(pd.read_pressure_samples(chunked, scan_start, None, 1))
+    chunk_scan = time.perf_counter() - started
+    started = time.perf_counter()
+    first = next(pd.read_pressure_samples(chunked, scan_start, None, 1))
+    first_sample = time.perf_counter() - started
+
+    print(f"\n{'':24} {'rows':>14} {'chunks':>14}")
+    print(f"{'database bytes/sample':24} {legacy_bytes / samples:14.2f} {chunk_bytes / samples:14.2f}")
+    print(f"{'payload bytes/sample':24} {'':>14} {payload / samples:14.2f}  ({len(rows)} chunks)")
+    print(f"{'write samples/s':24} {samples / legacy_write:14,.0f} {samples / chunk_write:14,.0f}"
+          f"  (encode alone {samples / encode_time:,.0f}/s)")
+    print(f"{'scan samples/s':24} {len(legacy_rows) / legacy_scan:14,.0f} {len(chunk_rows) / chunk_scan:14,.0f}"
+          f"  ({args.scan_hours} h of pump 1: {len(legacy_rows)} / {len(chunk_rows)} samples)")
+    print(f"{'first sample ms':24} {'':>14} {first_sample * 1000:14.2f}  (lazy decode)")
+    print(f"\nSize ratio: {legacy_bytes / chunk_bytes:.1f}x smaller")
+
+    legacy.close()
+    chunked.close()
+    os.chdir(REPO_ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pumps', type=int, default=7)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--cycle', type=float, default=1.0)
+    parser.add_argument('--scan-hours', type=float, default=6)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
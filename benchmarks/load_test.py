@@ -0,0 +1,308 @@
+"""
+Load test against a simulated S7-1200
+Starts a snap7 server exposing a synthetic DB39, runs the app against it in a
+child process, then drives N websocket clients and M REST pollers and reports
+PLC reads/s, publish-to-client latency, REST latency, SQLite commit times and
+memory per websocket client.
+
+Run from the repository root:
+    python benchmarks/load_test.py --pumps 7 --clients 100 --pollers 10 --duration 60
+    python benchmarks/load_test.py --latency 80 --job-pending 0.2    # a struggling PLC
+
+Needs the websocket client extras:  pip install "python-socketio[client]"
+The app runs in a scratch directory, so the repository's pump_events.db is never touched.
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DB_NUMBER = 39
+PUMP_BLOCK = 10  # bytes per pump: status byte, pad, pressure REAL, setpoint REAL
+
+def synthetic_layout(pumps):
+    """PUMP_LAYOUT rows for `pumps` identical pump blocks"""
+    return [{'pump_id': i + 1, 'name': f"SIM PUMP {i + 1}", 'offset': i * PUMP_BLOCK,
+             'ready': 0, 'running': 1, 'trip': 2} for i in range(pumps)]
+
+class SyntheticPLC:
+    """snap7 server with a DB39 whose pumps run, trip and recover at random"""
+
+    def __init__(self, pumps, port, trip_rate, trip_seconds):
+        import snap7
+        self.snap7 = snap7
+        self.pumps = pumps
+        self.port = port
+        self.trip_rate = trip_rate        # trips per pump per minute
+        self.trip_seconds = trip_seconds  # mean time a trip stays latched
+        self.buffer = (ctypes.c_uint8 * (pumps * PUMP_BLOCK))()
+        self.pressure = [random.uniform(2, 6) for _ in range(pumps)]
+        self.tripped_until = [0.0] * pumps
+        self.trips = 0
+        self.server = snap7.server.Server(log=False)
+        self.server.register_area(snap7.types.srvAreaDB, DB_NUMBER, self.buffer)
+        self.running = False
+
+    def start(self):
+        self.server.start(tcpport=self.port)
+        self.running = True
+        self.update()
+        threading.Thread(target=self.update_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.server.stop()
+        self.server.destroy()
+
+    def update(self, dt=0.0):
+        now = time.time()
+        self.server.lock_area(self.snap7.types.srvAreaDB, DB_NUMBER)
+        try:
+            for i in range(self.pumps):
+                if self.tripped_until[i] <= now and random.random() < self.trip_rate / 60 * dt:
+                    self.tripped_until[i] = now + random.expovariate(1 / self.trip_seconds)
+                    self.trips += 1
+                tripped = self.tripped_until[i] > now
+                self.pressure[i] = min(max(self.pressure[i] + random.gauss(0, 0.05), 0.0), 10.0)
+                offset = i * PUMP_BLOCK
+                self.buffer[offset] = 0b100 if tripped else 0b010
+                packed = struct.pack('>ff', 0.0 if tripped else self.pressure[i], 4.0)
+                for j, byte in enumerate(packed):
+                    self.buffer[offset + 2 + j] = byte
+        finally:
+            self.server.unlock_area(self.snap7.types.srvAreaDB, DB_NUMBER)
+
+    def update_loop(self):
+        while self.running:
+            time.sleep(0.25)
+            self.update(0.25)
+
+def run_app(args):
+    """Child process: the app against the synthetic PLC, with latency and "Job pending" injected"""
+    import pump_dasboard as pd
+
+    # Faults are injected in front of the snap7 read, inside the PLC executor thread
+    original_read = pd.PumpMonitor.execute_read
+    def execute_read(self):
+        if args.latency:
+            time.sleep(args.latency / 1000)
+        if random.random() < args.job_pending:
+            raise RuntimeError(b'CLI : Job pending')
+        return original_read(self)
+    pd.PumpMonitor.execute_read = execute_read
+
+    # Publish time of every snapshot, for publish-to-client latency
+    publish_times = {}
+    original_publish = pd.PumpMonitor.publish
+    def publish(self, data):
+        snapshot = original_publish(self, data)
+        publish_times[snapshot.sequence] = snapshot.timestamp
+        return snapshot
+    pd.PumpMonitor.publish = publish
+
+    @pd.app.route('/bench/publish-times')
+    def bench_publish_times():
+        return pd.jsonify(publish_times)
+
+    for monitor in pd.monitors.values():
+        monitor.rate = pd.AdaptiveRate(args.cycle, enabled=not args.fixed_rate)
+        monitor.cycle_stats.target = monitor.rate.period
+    pd.start_monitors()
+    pd.socketio.run(pd.app, host='127.0.0.1', port=args.app_port, debug=False, allow_unsafe_werkzeug=True,
+                    log_output=False)
+
+def get_json(url, timeout=10):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def rss_kb(pid):
+    """Resident set size of a process (Linux)"""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def percentiles(values):
+    if len(values) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return f"p50 {cuts[49]:7.2f}  p95 {cuts[94]:7.2f}  p99 {cuts[98]:7.2f}  max {max(values):7.2f}"
+
+class SocketClient:
+    """One dashboard-like websocket client recording when each sequence number arrived"""
+
+    def __init__(self, url, binary):
+        import socketio
+        self.received = []  # (sequence, receive time)
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('pump_data', self.on_json)
+        self.client.on('pump_delta', self.on_json)
+        self.client.on('pump_frame', self.on_frame)
+        self.url = url + ('?format=binary' if binary else '')
+
+    def on_json(self, data):
+        self.received.append((data.get('sequence'), time.time()))
+
+    def on_frame(self, frame):
+        self.received.append((struct.unpack_from('<I', frame, 4)[0], time.time()))
+
+    def connect(self):
+        self.client.connect(self.url, transports=['websocket'])
+
+    def disconnect(self):
+        self.client.disconnect()
+
+def rest_poller(base_url, interval, stop, latencies, errors):
+    """Poll the endpoints the dashboard and reports pages poll"""
+    paths = ['/api/status', '/api/pump-health']
+    i = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            get_json(base_url + paths[i % len(paths)])
+            latencies.append((time.perf_counter() - started) * 1000)
+        except Exception:
+            errors.append(1)
+        i += 1
+        stop.wait(max(interval - (time.perf_counter() - started), 0))
+
+def db_sampler(base_url, stop, samples):
+    while not stop.is_set():
+        try:
+            samples.append(get_json(base_url + '/api/db-writer'))
+        except Exception:
+            pass
+        stop.wait(0.5)
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix='pump_load_')
+    with open(os.path.join(workdir, 'sites.json'), 'w') as f:
+        json.dump({'sites': [{'site_id': 'sim', 'name': 'Simulated', 'plc_ip': '127.0.0.1',
+                              'port': args.plc_port, 'pumps': synthetic_layout(args.pumps)}]}, f)
+
+    plc = SyntheticPLC(args.pumps, args.plc_port, args.trip_rate, args.trip_seconds)
+    plc.start()
+
+    env = dict(os.environ, PUMP_SITES_CONFIG='sites.json')
+    env.pop('PUMP_MESSAGE_QUEUE', None)
+    child_args = [sys.executable, os.path.abspath(__file__), '--app-process', '--app-port', str(args.app_port),
+                  '--cycle', str(args.cycle), '--latency', str(args.latency), '--job-pending', str(args.job_pending)]
+    if args.fixed_rate:
+        child_args.append('--fixed-rate')
+    app = subprocess.Popen(child_args, cwd=workdir, env=env, stdout=subprocess.DEVNULL if args.quiet else None,
+                           stderr=subprocess.DEVNULL if args.quiet else None)
+    base_url = f'http://127.0.0.1:{args.app_port}'
+    clients = []
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if get_json(base_url + '/api/status', timeout=2).get('sequence'):
+                    break
+            except Exception:
+                pass
+            if time.time() > deadline or app.poll() is not None:
+                raise SystemExit("app did not come up")
+            time.sleep(0.5)
+
+        time.sleep(2)  # let the app settle before the baseline
+        rss_before = rss_kb(app.pid)
+        for _ in range(args.clients):
+            client = SocketClient(base_url, args.binary)
+            client.connect()
+            clients.append(client)
+        time.sleep(2)
+        rss_after = rss_kb(app.pid)
+
+        stop = threading.Event()
+        rest_latencies, rest_errors, db_samples = [], [], []
+        threads = [threading.Thread(target=rest_poller, args=(base_url, args.poll_interval, stop, rest_latencies,
+                                                              rest_errors), daemon=True)
+                   for _ in range(args.pollers)]
+        threads.append(threading.Thread(target=db_sampler, args=(base_url, stop, db_samples), daemon=True))
+
+        poller_start = get_json(base_url + '/api/poller?site=sim')
+        measure_start = time.time()
+        for client in clients:
+            client.received.clear()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        measured = time.time() - measure_start
+        poller_end = get_json(base_url + '/api/poller?site=sim')
+        publish_times = {int(k): v for k, v in get_json(base_url + '/bench/publish-times').items()}
+        for thread in threads:
+            thread.join(5)
+    finally:
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        app.terminate()
+        app.wait(10)
+        plc.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = [(received - publish_times[sequence]) * 1000
+                 for client in clients for sequence, received in client.received if sequence in publish_times]
+    messages = sum(len(client.received) for client in clients)
+    commit_ms = [sample['last_commit_ms'] for sample in db_samples if sample['commits']]
+
+    print(f"Pumps: {args.pumps}, websocket clients: {args.clients} ({'binary' if args.binary else 'json'}), "
+          f"REST pollers: {args.pollers}, duration: {measured:.1f} s")
+    print(f"Injected: {args.latency} ms read latency, {args.job_pending:.0%} Job pending; "
+          f"{plc.trips} synthetic trips")
+    print(f"PLC cycles/s:         {(poller_end['cycles'] - poller_start['cycles']) / measured:8.2f}"
+          f"  (now {poller_end['rate']['rate_hz']:.2f} Hz: {poller_end['rate']['reason']}; "
+          f"jitter {poller_end['jitter_ms']} ms, missed {poller_end['missed_cycles'] - poller_start['missed_cycles']})")
+    print(f"Socket messages/s:    {messages / measured:8.1f}")
+    print(f"Publish->client ms:   {percentiles(latencies)}")
+    print(f"REST ms:              {percentiles(rest_latencies)}  ({len(rest_latencies) / measured:.1f} req/s, "
+          f"{len(rest_errors)} errors)")
+    print(f"SQLite commit ms:     {percentiles(commit_ms)}")
+    if db_samples:
+        print(f"DB rows written:      {db_samples[-1]['rows_written']:8d}  (dropped {db_samples[-1]['rows_dropped']})")
+    print(f"App RSS:              {rss_before / 1024:8.1f} MB idle, {rss_after / 1024:.1f} MB with clients, "
+          f"{(rss_after - rss_before) / max(args.clients, 1):.1f} KB per client")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pumps', type=int, default=7)
+    parser.add_argument('--clients', type=int, default=50, help="websocket clients")
+    parser.add_argument('--binary', action='store_true', help="clients ask for binary frames")
+    parser.add_argument('--pollers', type=int, default=5, help="REST pollers")
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--cycle', type=float, default=1.0, help="starting PLC cycle time (s)")
+    parser.add_argument('--fixed-rate', action='store_true', help="disable adaptive polling")
+    parser.add_argument('--latency', type=float, default=0.0, help="injected PLC read latency (ms)")
+    parser.add_argument('--job-pending', type=float, default=0.0, help="fraction of reads failing with Job pending")
+    parser.add_argument('--trip-rate', type=float, default=1.0, help="trips per pump per minute")
+    parser.add_argument('--trip-seconds', type=float, default=5.0, help="mean trip duration (s)")
+    parser.add_argument('--plc-port', type=int, default=1102)
+    parser.add_argument('--app-port', type=int, default=5055)
+    parser.add_argument('--quiet', action='store_true', help="hide the app's console output")
+    parser.add_argument('--app-process', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.app_process:
+        run_app(args)
+    else:
+        main(args)
@@ -4,9 +4,11 @@ Real-time monitoring of Siemens S7-1200 PLC via Snap7
 """
 
 from flask import Flask, render_template, jsonify, request, Response
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import snap7
-from snap7.util import get_real, get_bool
+from snap7.types import S7DataItem, Areas, WordLen
+from snap7.common import check_error
+import ctypes
 import struct
 import time
 import threading
@@ -23,16 +25,42 @@ Challawa Monitoring System
 Real-time monitoring of Siemens S7-1200 PLC via Snap7
 """
 
-from flask import Flask, render_template, jsonify, request, Response
-from flask_socketio import SocketIO
+from flask import Flask, render_template, jsonify, request, Response, send_file
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import snap7
-from snap7.util import get_real, get_bool
 import struct
 import time
 import threading
 import sqlite3
 from datetime import datetime, timedelta
 import io
+import os
+import json
+import base64
+import uuid
+import queue
+import hashlib
+import tempfile
+import multiprocessing
+import asyncio
+import re
+import zlib
+import itertools
+import statistics
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from array import array
+from collections import namedtuple, deque
+from types import MappingProxyType
+from bisect import bisect_left
+import socket
+import sys
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from socketio import PubSubManager
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -41,398 +69,2579 @@ from reportlab.lib.units import inch
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'pump-monitor-secret'
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+# Serving. `python pump_dasboard.py` runs everything in one process on the
+# threaded development server. In production the web app runs under async
+# workers, one gunicorn per port behind nginx with ip_hash for sticky sessions:
+#   PUMP_ASYNC_MODE=gevent PUMP_MESSAGE_QUEUE=unix:///run/pump/bus.sock \
+#       gunicorn -k gevent -w 1 -b 127.0.0.1:5001 pump_dasboard:app
+# plus one poller process (`python pump_dasboard.py --poller`) that owns the PLCs
+# through the leader lock, and the bus broker (`python pump_dasboard.py --bus`).
+# PUMP_MESSAGE_QUEUE may also be a Redis URL (redis://localhost:6379/0).
+ASYNC_MODE = os.environ.get('PUMP_ASYNC_MODE', 'threading')
+MESSAGE_QUEUE = os.environ.get('PUMP_MESSAGE_QUEUE')
+POLLER_LOCK_PATH = os.environ.get('PUMP_POLLER_LOCK', 'pump_poller.lock')
+POLLER_LEADER_RETRY = 5.0  # seconds between lock attempts of a standby poller
+STATE_DIR = os.environ.get('PUMP_STATE_DIR', 'run')  # latest snapshots shared with web workers
+BUS_SEND_TIMEOUT = 5.0  # seconds; a bus subscriber that stalls longer is dropped
+
+class LocalBusManager(PubSubManager):
+    """Socket.IO client manager over the local Unix-socket bus run by run_message_bus().
+    
+    Publishers and subscribers use separate connections; each message is one
+    line of JSON, and every subscriber (this process included) receives it.
+    """
+    
+    name = 'localbus'
+    
+    def __init__(self, path, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = path
+        self.sock = None
+        self.send_lock = threading.Lock()
+    
+    def _connect(self, role):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        sock.sendall(role + b'\n')
+        return sock
+    
+    def _publish(self, data):
+        line = (self.json.dumps(data) + '\n').encode()
+        with self.send_lock:
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self.sock = self._connect(b'PUB')
+                    self.sock.sendall(line)
+                    return
+                except OSError as e:
+                    error = e
+                    if self.sock is not None:
+                        self.sock.close()
+                    self.sock = None
+            print(f"⚠ Message bus unavailable, update not shared: {error}")
+    
+    def _listen(self):
+        retry = 1
+        while True:
+            try:
+                sock = self._connect(b'SUB')
+                retry = 1
+                with sock, sock.makefile('rb') as lines:
+                    for line in lines:
+                        yield line
+            except OSError as e:
+                print(f"⚠ Message bus unavailable ({e}), retrying in {retry}s")
+                time.sleep(retry)
+                retry = min(retry * 2, 30)
+
+def run_message_bus(path):
+    """Fan-out broker for LocalBusManager: every published line goes to every subscriber"""
+    if os.path.exists(path):
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o660)
+    server.listen(64)
+    subscribers = set()
+    lock = threading.Lock()
+    outbox = queue.Queue()
+    
+    def fan_out():
+        # One sender thread, so lines from concurrent publishers never interleave
+        while True:
+            line = outbox.get()
+            with lock:
+                targets = list(subscribers)
+            for conn in targets:
+                try:
+                    conn.sendall(line)
+                except OSError:
+                    with lock:
+                        subscribers.discard(conn)
+                    conn.close()
+    
+    def serve(conn):
+        lines = conn.makefile('rb')
+        role = lines.readline()
+        if role == b'SUB\n':
+            conn.settimeout(BUS_SEND_TIMEOUT)
+            with lock:
+                subscribers.add(conn)
+            return
+        for line in lines:
+            outbox.put(line)
+        conn.close()
+    
+    threading.Thread(target=fan_out, daemon=True).start()
+    print(f"✓ Message bus listening on {path}")
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+if MESSAGE_QUEUE and MESSAGE_QUEUE.startswith('unix://'):
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE,
+                        client_manager=LocalBusManager(MESSAGE_QUEUE[len('unix://'):]))
+else:
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, message_queue=MESSAGE_QUEUE)
 
 # PLC Configuration
 PLC_IP = "192.168.200.25"
 PLC_RACK = 0
 PLC_SLOT = 1
+PLC_PORT = 102  # ISO-on-TCP
 DB_NUMBER = 39
 CYCLE_TIME = 1.0  # 1 second (increased from 500ms to reduce "Job pending" errors)
 MAX_RETRIES = 3
 RETRY_DELAY = 0.5  # seconds between retries
+CYCLE_STATS_WINDOW = 300  # cycles kept for achieved cycle time / jitter stats
 
-# Pump names mapping
-PUMP_NAMES = {
-    1: "LINE 3&5 UPS FAN COIL UNITS",
-    2: "CAN Line UPS Room AHU 1",
-    3: "GREENFIELD LV UPS ROOM",
-    4: "CAN LINE UPS ROOM AHU 2",
-    5: "LINE 7 BLOW MOULD SPARE",
-    6: "GREENFIELD LV UPS ROOM AHU & 2",
-    7: "LINE 7 BLOWMOULD"
-}
+# Adaptive polling (AIMD on the sample rate). CYCLE_TIME is the starting period;
+# healthy stretches add ADAPTIVE_RATE_STEP Hz, a busy or slow PLC divides the rate
+# by ADAPTIVE_BACKOFF. The period always stays within MIN/MAX_CYCLE_TIME.
+ADAPTIVE_POLLING = True
+MIN_CYCLE_TIME = 0.25            # seconds; fastest sampling (4 Hz)
+MAX_CYCLE_TIME = 5.0             # seconds; slowest sampling under sustained pressure
+ADAPTIVE_RATE_STEP = 0.25        # Hz added after every ADAPTIVE_HEALTHY_CYCLES clean cycles
+ADAPTIVE_BACKOFF = 2.0           # rate divisor on Job pending or a failed read
+ADAPTIVE_HEALTHY_CYCLES = 20     # consecutive clean cycles before speeding up
+ADAPTIVE_SLOW_READ = 0.5         # a read taking this fraction of the period counts as slow
+ADAPTIVE_HISTORY = 50            # rate changes kept for /api/poller
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # seconds
+
+# Database configuration
+DB_PATH = 'pump_events.db'
+DB_QUEUE_SIZE = 10000      # pending writes before new ones are dropped
+DB_COMMIT_INTERVAL = 2.0   # seconds; max time a write waits for its commit
+DB_COMMIT_ROWS = 500       # rows; commit early once this many are pending
+
+# Pressure history retention. Every cycle's raw sample is stored in compressed
+# CHUNK_SECONDS chunks per pump. Rollup tiers (bucket seconds -> retention hours,
+# None = forever) are fed every cycle and serve /api/pressure-history; the chunks
+# are only decoded for single-pump zooms finer than the smallest tier
+# (?pump_id=<id>&interval=<seconds>).
+CHUNK_SECONDS = 600
+MIN_HISTORY_INTERVAL = 1.0  # seconds; finest thinning a chunk zoom returns
+RAW_RETENTION_HOURS = 48
+ROLLUP_TIERS = {60: 14 * 24, 900: 180 * 24, 3600: None}
+MAX_HISTORY_POINTS = 2000   # per pump; /api/pressure-history picks the finest tier under this
+MAX_HISTORY_HOURS = 366 * 24
+PRUNE_INTERVAL = 3600       # seconds between retention sweeps
+HISTORY_CHECKPOINT_INTERVAL = 60  # seconds; open buckets and chunks are written this often
+
+# Reliability KPIs: state durations accumulate every cycle and are written as
+# daily rollups every KPI_FLUSH_INTERVAL seconds
+KPI_FLUSH_INTERVAL = 60
+KPI_MAX_GAP = 5.0  # seconds; longer gaps between samples (PLC offline) are not counted
+
+# Full-rate in-memory history served by /api/live-window
+LIVE_WINDOW_HOURS = 24
+
+# Burst capture around trip edges: the pre-trigger part comes from the live window,
+# the post-trigger part is polled every BURST_CYCLE_TIME when the PLC has headroom
+BURST_PRE_SECONDS = 30.0
+BURST_POST_SECONDS = 10.0
+BURST_CYCLE_TIME = 0.1  # seconds (10 Hz)
+
+# /api/trip-events keyset pagination
+TRIP_EVENTS_PAGE_SIZE = 100
+TRIP_EVENTS_MAX_PAGE_SIZE = 500
+
+# DB39 pump layout. Each pump block is a status byte at `offset` followed by two
+# REALs (pressure at offset+2, setpoint at offset+6). Bit orders differ per pump
+# as wired in the PLC program. Adding a pump is a new row here.
+PUMP_LAYOUT = [
+    {'pump_id': 1, 'name': "LINE 3&5 UPS FAN COIL UNITS", 'offset': 0, 'ready': 1, 'running': 2, 'trip': 3, 'alarm': 0},
+    {'pump_id': 2, 'name': "CAN Line UPS Room AHU 1", 'offset': 10, 'ready': 0, 'running': 1, 'trip': 2},
+    {'pump_id': 3, 'name': "GREENFIELD LV UPS ROOM", 'offset': 20, 'ready': 0, 'running': 1, 'trip': 2},
+    {'pump_id': 4, 'name': "CAN LINE UPS ROOM AHU 2", 'offset': 30, 'ready': 0, 'running': 2, 'trip': 1},
+    {'pump_id': 5, 'name': "LINE 7 BLOW MOULD SPARE", 'offset': 40, 'ready': 1, 'running': 0, 'trip': 2},
+    {'pump_id': 6, 'name': "GREENFIELD LV UPS ROOM AHU & 2", 'offset': 50, 'ready': 0, 'running': 1, 'trip': 2},
+    {'pump_id': 7, 'name': "LINE 7 BLOWMOULD", 'offset': 60, 'ready': 0, 'running': 1, 'trip': 2},
+]
+
+def pump_prefix(pump_id):
+    """Key prefix used for a pump in the pump_data dict (pump 1 has none)"""
+    return '' if pump_id == 1 else f'p{pump_id}_'
+
+# Per-pump fields of the pump_data dict, before the pump prefix
+PUMP_FIELDS = ('alarm', 'ready_yellow', 'running_green', 'trip_red', 'pressure', 'pressure_setpoint', 'status')
+
+class DB39Decoder:
+    """Decodes a whole DB39 frame with one struct unpack plus bitmask tests.
+    
+    The layout table is compiled once into a big-endian struct format that
+    skips padding bytes, so decode() does no per-field offset arithmetic.
+    """
+    
+    def __init__(self, layout):
+        fields = []  # (byte offset, struct code)
+        for pump in layout:
+            fields += [(pump['offset'], 'B'), (pump['offset'] + 2, 'f'), (pump['offset'] + 6, 'f')]
+        fields.sort()
+        
+        fmt = '>'
+        position = 0
+        for offset, code in fields:
+            if offset > position:
+                fmt += f'{offset - position}x'
+            fmt += code
+            position = offset + struct.calcsize('>' + code)
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        
+        # Index of each pump's values in the unpacked tuple
+        index = {offset: i for i, (offset, _) in enumerate(fields)}
+        self.pumps = []
+        for pump in sorted(layout, key=lambda p: p['pump_id']):
+            prefix = pump_prefix(pump['pump_id'])
+            self.pumps.append((
+                prefix,
+                index[pump['offset']],
+                index[pump['offset'] + 2],
+                index[pump['offset'] + 6],
+                1 << pump['ready'],
+                1 << pump['running'],
+                1 << pump['trip'],
+                1 << pump['alarm'] if 'alarm' in pump else 0,
+            ))
+    
+    def decode(self, data):
+        """Decode one raw DB39 buffer into the pump_data dict"""
+        values = self.struct.unpack_from(data)
+        result = {}
+        for prefix, status_i, pressure_i, setpoint_i, ready_mask, running_mask, trip_mask, alarm_mask in self.pumps:
+            status_byte = values[status_i]
+            ready = bool(status_byte & ready_mask)
+            running = bool(status_byte & running_mask)
+            trip = bool(status_byte & trip_mask)
+            if alarm_mask:
+                result[prefix + 'alarm'] = bool(status_byte & alarm_mask)
+            result[prefix + 'ready_yellow'] = ready
+            result[prefix + 'running_green'] = running
+            result[prefix + 'trip_red'] = trip
+            result[prefix + 'pressure'] = round(values[pressure_i], 2)
+            result[prefix + 'pressure_setpoint'] = round(values[setpoint_i], 2)
+            # Mutually exclusive status logic
+            result[prefix + 'status'] = "READY" if ready else ("RUNNING" if running else ("TRIP" if trip else "UNKNOWN"))
+        result['connected'] = True
+        return result
+    
+    def error_state(self):
+        """pump_data dict reported when the PLC cannot be read"""
+        result = {}
+        for prefix, *_, alarm_mask in self.pumps:
+            if alarm_mask:
+                result[prefix + 'alarm'] = False
+            result[prefix + 'ready_yellow'] = False
+            result[prefix + 'running_green'] = False
+            result[prefix + 'trip_red'] = False
+            result[prefix + 'pressure'] = 0.0
+            result[prefix + 'pressure_setpoint'] = 0.0
+            result[prefix + 'status'] = "ERROR"
+        result['connected'] = False
+        return result
+
+db39_decoder = DB39Decoder(PUMP_LAYOUT)
+
+# PLC areas read every cycle on the built-in site: (name, db_number, start byte,
+# size in bytes). 'pumps' is decoded by the site's decoder; other areas (run hours,
+# motor currents, alarm words, ...) are published raw in PumpMonitor.areas for
+# their consumers. Registry sites may list their own under "areas".
+PLC_READ_AREAS = [
+    ('pumps', DB_NUMBER, 0, db39_decoder.size),
+    # ('run_hours', 40, 0, 28),
+    # ('motor_currents', 41, 0, 28),
+    # ('alarm_words', 42, 0, 4),
+]
+READ_MERGE_GAP = 16  # bytes; neighbouring areas closer than this are read as one block
+
+# Site registry. Every pump house is one S7-1200 polled by its own PumpMonitor.
+# Sites are loaded from SITES_CONFIG when that file exists, otherwise the single
+# built-in site above is used. Example:
+#   {"sites": [{"site_id": "challawa", "name": "Challawa", "plc_ip": "192.168.200.25",
+#               "rack": 0, "slot": 1, "port": 102, "db_number": 39, "pumps": [<PUMP_LAYOUT rows>]}]}
+# Pump ids are unique across all sites, so every table, rollup and API keeps
+# keying on pump_id and a site is simply the set of pumps its PLC serves.
+SITES_CONFIG = os.environ.get('PUMP_SITES_CONFIG', 'sites.json')
+
+def load_site_configs(path=SITES_CONFIG):
+    """Site configs from the registry file, or the built-in site when it does not exist"""
+    builtin = {'site_id': 'challawa', 'name': 'Challawa', 'plc_ip': PLC_IP, 'rack': PLC_RACK, 'slot': PLC_SLOT,
+               'port': PLC_PORT, 'db_number': DB_NUMBER, 'pumps': PUMP_LAYOUT, 'areas': PLC_READ_AREAS}
+    if not os.path.exists(path):
+        return [builtin]
+    with open(path, encoding='utf-8') as f:
+        configs = json.load(f)['sites']
+    owners = {}
+    for config in configs:
+        if 'site_id' not in config or 'plc_ip' not in config or not config.get('pumps'):
+            raise ValueError(f"{path}: every site needs site_id, plc_ip and pumps")
+        config.setdefault('name', config['site_id'])
+        config.setdefault('rack', PLC_RACK)
+        config.setdefault('slot', PLC_SLOT)
+        config.setdefault('port', PLC_PORT)
+        config.setdefault('db_number', DB_NUMBER)
+        for pump in config['pumps']:
+            if pump['pump_id'] in owners:
+                raise ValueError(f"{path}: pump_id {pump['pump_id']} is used by sites "
+                                 f"{owners[pump['pump_id']]} and {config['site_id']}")
+            owners[pump['pump_id']] = config['site_id']
+    return configs
+
+SITE_CONFIGS = load_site_configs()
+DEFAULT_SITE_ID = SITE_CONFIGS[0]['site_id']  # served to clients that do not name a site
+SITE_PUMPS = {config['site_id']: sorted(p['pump_id'] for p in config['pumps']) for config in SITE_CONFIGS}
+
+# Pump names mapping (all sites)
+PUMP_NAMES = {p['pump_id']: p['name'] for config in SITE_CONFIGS for p in config['pumps']}
+PUMP_SITES = {pump_id: site_id for site_id, pump_ids in SITE_PUMPS.items() for pump_id in pump_ids}
+
+class ReadPlan:
+    """Coalesces PLC read areas into the fewest read_multi_vars requests.
+    
+    Areas in the same DB that overlap or sit within READ_MERGE_GAP bytes of
+    each other become one block. Blocks are split to fit the negotiated PDU
+    and packed into requests of at most MAX_VARS items, so round-trips per
+    cycle stay constant as tags are added.
+    """
+    
+    MAX_VARS = 20          # Snap7 limit on items per multi-var request
+    REQUEST_HEADER = 19    # S7 header + read-var parameter header
+    REQUEST_ITEM = 12      # Per-item address specification
+    RESPONSE_HEADER = 14   # S7 ack header + parameter header
+    RESPONSE_ITEM = 4      # Per-item return code/transport size/length
+    
+    def __init__(self, areas, merge_gap=READ_MERGE_GAP):
+        self.areas = list(areas)
+        self.merge_gap = merge_gap
+        self.pdu_length = None
+        self.blocks = []    # [db_number, start, size, [(name, offset in block, size)]]
+        self.requests = []  # [[(block index, db_number, start, size), ...], ...]
+        
+        for name, db_number, start, size in sorted(self.areas, key=lambda a: (a[1], a[2])):
+            block = self.blocks[-1] if self.blocks else None
+            if block and block[0] == db_number and start <= block[1] + block[2] + merge_gap:
+                block[2] = max(block[2], start + size - block[1])
+            else:
+                block = [db_number, start, size, []]
+                self.blocks.append(block)
+            block[3].append((name, start - block[1], size))
+    
+    def build(self, pdu_length):
+        """Pack blocks into requests that fit a PDU of pdu_length bytes"""
+        self.pdu_length = pdu_length
+        max_item = pdu_length - self.RESPONSE_HEADER - self.RESPONSE_ITEM
+        max_item -= max_item % 2  # Item data is padded to an even length
+        
+        pieces = []
+        for index, (db_number, start, size, _) in enumerate(self.blocks):
+            for piece_start in range(start, start + size, max_item):
+                pieces.append((index, db_number, piece_start, min(max_item, start + size - piece_start)))
+        
+        # First-fit, largest pieces first
+        requests = []
+        for piece in sorted(pieces, key=lambda p: -p[3]):
+            cost = self.RESPONSE_ITEM + piece[3] + piece[3] % 2
+            for request in requests:
+                if (len(request['items']) < self.MAX_VARS
+                        and request['response'] + cost <= pdu_length
+                        and request['request'] + self.REQUEST_ITEM <= pdu_length):
+                    break
+            else:
+                request = {'items': [], 'request': self.REQUEST_HEADER, 'response': self.RESPONSE_HEADER}
+                requests.append(request)
+            request['items'].append(piece)
+            request['response'] += cost
+            request['request'] += self.REQUEST_ITEM
+        self.requests = [r['items'] for r in requests]
+        return self
+    
+    def execute(self, plc):
+        """Run the plan on a connected client, returning {area name: bytearray}"""
+        buffers = [bytearray(block[2]) for block in self.blocks]
+        
+        for request in self.requests:
+            if len(request) == 1:
+                # Plain db_read is the same single round-trip and avoids multi-var quirks
+                index, db_number, start, size = request[0]
+                offset = start - self.blocks[index][1]
+                buffers[index][offset:offset + size] = plc.db_read(db_number, start, size)
+                continue
+            
+            items = (S7DataItem * len(request))()
+            data = []
+            for item, (index, db_number, start, size) in zip(items, request):
+                buffer = (ctypes.c_uint8 * size)()
+                item.Area = Areas.DB.value
+                item.WordLen = WordLen.Byte.value
+                item.DBNumber = db_number
+                item.Start = start
+                item.Amount = size
+                item.pData = ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8))
+                data.append(buffer)
+            plc.read_multi_vars(items)
+            
+            for item, buffer, (index, db_number, start, size) in zip(items, data, request):
+                check_error(item.Result)
+                offset = start - self.blocks[index][1]
+                buffers[index][offset:offset + size] = bytes(buffer)
+        
+        areas = {}
+        for (_, _, _, members), buffer in zip(self.blocks, buffers):
+            for name, offset, size in members:
+                areas[name] = buffer[offset:offset + size]
+        return areas
 
 # Database initialization
 def init_database():
-    conn = sqlite3.connect('pump_events.db')
+    conn = sqlite3.connect(DB_PATH, timeout=60)
     cursor = conn.cursor()
     
-    # Trip events table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trip_events (
+    # WAL lets report queries read while the writer thread commits
+    cursor.execute('PRAGMA journal_mode=WAL')
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    
+    # Trip events table. Migration 9 moves its rows to trip_event_log and replaces it
+    # with a view of the same name, so it is only created for the migrations before.
+    if version < TRIP_EVENT_LOG_MIGRATION:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trip_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pump_id INTEGER NOT NULL,
+                pump_name TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                pressure REAL,
+                pressure_setpoint REAL
+            )
+        ''')
+    
+    # Pressure history table for health monitoring. Its rows move to pressure_chunks
+    # in migration 8, so it is only created for the migrations before that one.
+    if version < PRESSURE_CHUNKS_MIGRATION:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pressure_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pump_id INTEGER NOT NULL,
+                pump_name TEXT NOT NULL,
+                pressure REAL,
+                pressure_setpoint REAL,
+                status TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    
+    conn.commit()
+    migrate_database(conn)
+    with conn:
+        conn.executemany('''
+            INSERT INTO sites (site_id, name, plc_ip) VALUES (?, ?, ?)
+            ON CONFLICT (site_id) DO UPDATE SET name = excluded.name, plc_ip = excluded.plc_ip
+        ''', [(config['site_id'], config['name'], config['plc_ip']) for config in SITE_CONFIGS])
+        # Names live only here, so renaming a pump in the registry renames its whole history
+        conn.executemany('''
+            INSERT INTO pumps (pump_id, name, site_id) VALUES (?, ?, ?)
+            ON CONFLICT (pump_id) DO UPDATE SET name = excluded.name, site_id = excluded.site_id
+        ''', [(pump_id, PUMP_NAMES[pump_id], PUMP_SITES[pump_id]) for pump_id in PUMP_NAMES])
+    check_query_plans(conn)
+    conn.close()
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Append new steps; never edit one that has shipped.
+SCHEMA_MIGRATIONS = [
+    # 1: indexes for the report routes' pump/event/time filters
+    [
+        'CREATE INDEX IF NOT EXISTS idx_trip_events_pump_type_ts ON trip_events (pump_id, event_type, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_trip_events_pump_ts ON trip_events (pump_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_trip_events_type_ts ON trip_events (event_type, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_trip_events_ts ON trip_events (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_pressure_history_pump_ts ON pressure_history (pump_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_pressure_history_ts ON pressure_history (timestamp)',
+    ],
+    # 2: min/max/avg/last pressure rollups per tier, backfilled from raw history
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS pressure_rollups (
+            tier INTEGER NOT NULL,
+            pump_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            pressure_min REAL,
+            pressure_max REAL,
+            pressure_sum REAL,
+            pressure_last REAL,
+            setpoint_last REAL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (tier, pump_id, bucket)
+        ) WITHOUT ROWID
+        ''',
+        lambda conn: backfill_rollups(conn),
+    ],
+    # 3: per-day trip counters kept current by triggers, for constant-cost totals
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS trip_daily_counts (
+            day TEXT NOT NULL,
+            pump_id INTEGER NOT NULL,
+            trips INTEGER NOT NULL,
+            PRIMARY KEY (day, pump_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_daily_counts_insert AFTER INSERT ON trip_events
+        WHEN NEW.event_type = 'TRIP'
+        BEGIN
+            INSERT INTO trip_daily_counts (day, pump_id, trips) VALUES (date(NEW.timestamp), NEW.pump_id, 1)
+            ON CONFLICT (day, pump_id) DO UPDATE SET trips = trips + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_daily_counts_delete AFTER DELETE ON trip_events
+        WHEN OLD.event_type = 'TRIP'
+        BEGIN
+            UPDATE trip_daily_counts SET trips = trips - 1
+            WHERE day = date(OLD.timestamp) AND pump_id = OLD.pump_id;
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO trip_daily_counts (day, pump_id, trips)
+        SELECT date(timestamp), pump_id, COUNT(*) FROM trip_events WHERE event_type = 'TRIP'
+        GROUP BY date(timestamp), pump_id
+        ''',
+    ],
+    # 4: materialized TRIP -> TRIP_CLEARED intervals, opened and closed by triggers
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS trip_intervals (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             pump_id INTEGER NOT NULL,
-            pump_name TEXT NOT NULL,
-            event_type TEXT NOT NULL,
+            trip_event_id INTEGER NOT NULL UNIQUE,
+            clear_event_id INTEGER UNIQUE,
+            start_time DATETIME NOT NULL,
+            end_time DATETIME,
+            duration_seconds REAL,
+            pressure_at_trip REAL,
+            setpoint_at_trip REAL,
+            pressure_at_clear REAL,
+            setpoint_at_clear REAL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_trip_intervals_pump_start ON trip_intervals (pump_id, start_time)',
+        'CREATE INDEX IF NOT EXISTS idx_trip_intervals_start ON trip_intervals (start_time)',
+        # Partial index: the open interval of a pump is found without scanning closed ones
+        'CREATE INDEX IF NOT EXISTS idx_trip_intervals_open ON trip_intervals (pump_id) WHERE end_time IS NULL',
+        lambda conn: backfill_trip_intervals(conn),
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_intervals_open AFTER INSERT ON trip_events
+        WHEN NEW.event_type = 'TRIP'
+        BEGIN
+            INSERT INTO trip_intervals (pump_id, trip_event_id, start_time, pressure_at_trip, setpoint_at_trip)
+            VALUES (NEW.pump_id, NEW.id, NEW.timestamp, NEW.pressure, NEW.pressure_setpoint);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_intervals_close AFTER INSERT ON trip_events
+        WHEN NEW.event_type = 'TRIP_CLEARED'
+        BEGIN
+            UPDATE trip_intervals SET
+                clear_event_id = NEW.id,
+                end_time = NEW.timestamp,
+                duration_seconds = CAST(strftime('%s', NEW.timestamp) AS INTEGER) - CAST(strftime('%s', start_time) AS INTEGER),
+                pressure_at_clear = NEW.pressure,
+                setpoint_at_clear = NEW.pressure_setpoint
+            WHERE id = (SELECT id FROM trip_intervals WHERE pump_id = NEW.pump_id AND end_time IS NULL
+                        ORDER BY start_time DESC LIMIT 1);
+        END
+        ''',
+    ],
+    # 5: daily state-duration rollups for reliability KPIs
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS pump_daily_kpis (
+            day TEXT NOT NULL,
+            pump_id INTEGER NOT NULL,
+            running_seconds REAL NOT NULL DEFAULT 0,
+            ready_seconds REAL NOT NULL DEFAULT 0,
+            trip_seconds REAL NOT NULL DEFAULT 0,
+            offline_seconds REAL NOT NULL DEFAULT 0,
+            trips INTEGER NOT NULL DEFAULT 0,
+            repairs INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, pump_id)
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 6: site namespace on raw rows, filled in from the registry
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS sites (
+            site_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            plc_ip TEXT NOT NULL
+        )
+        ''',
+        "ALTER TABLE trip_events ADD COLUMN site_id TEXT",
+        "ALTER TABLE pressure_history ADD COLUMN site_id TEXT",
+        lambda conn: backfill_site_ids(conn),
+    ],
+    # 7: pressure waveform captured around each trip, one compressed blob per trip event
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS trip_bursts (
+            trip_event_id INTEGER PRIMARY KEY,
+            pump_id INTEGER NOT NULL,
+            trigger_time REAL NOT NULL,
+            pre_samples INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            waveform BLOB NOT NULL
+        )
+        ''',
+    ],
+    # 8: raw pressure in compressed per-pump chunks; pressure_history rows are converted and dropped
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS pressure_chunks (
+            pump_id INTEGER NOT NULL,
+            start_ms INTEGER NOT NULL,
+            end_ms INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (pump_id, start_ms)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_pressure_chunks_end ON pressure_chunks (end_ms)',
+        lambda conn: backfill_pressure_chunks(conn),
+        'DROP TABLE pressure_history',
+    ],
+    # 9: pumps and code dimensions; trip events keep only integer keys and the old
+    # table becomes a view with its original columns
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS pumps (
+            pump_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            site_id TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS event_types (
+            event_code INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS pump_statuses (
+            status_code INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''',
+        lambda conn: fill_code_tables(conn),
+        # Pumps no longer in the registry keep the name of their latest event
+        '''
+        INSERT OR IGNORE INTO pumps (pump_id, name, site_id)
+        SELECT pump_id, pump_name, site_id FROM trip_events
+        WHERE id IN (SELECT MAX(id) FROM trip_events GROUP BY pump_id)
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS trip_event_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pump_id INTEGER NOT NULL,
+            event_code INTEGER NOT NULL,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
             pressure REAL,
             pressure_setpoint REAL
         )
+        ''',
+        '''
+        INSERT INTO trip_event_log (id, pump_id, event_code, timestamp, pressure, pressure_setpoint)
+        SELECT e.id, e.pump_id, t.event_code, e.timestamp, e.pressure, e.pressure_setpoint
+        FROM trip_events e JOIN event_types t ON t.name = e.event_type
+        ''',
+        # Also drops the old indexes and the triggers of migrations 3 and 4
+        'DROP TABLE trip_events',
+        'CREATE INDEX IF NOT EXISTS idx_trip_event_log_pump_code_ts ON trip_event_log (pump_id, event_code, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_trip_event_log_pump_ts ON trip_event_log (pump_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_trip_event_log_code_ts ON trip_event_log (event_code, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_trip_event_log_ts ON trip_event_log (timestamp)',
+        '''
+        CREATE VIEW IF NOT EXISTS trip_events AS
+        SELECT e.id, e.pump_id, p.name AS pump_name, t.name AS event_type, e.timestamp,
+               e.pressure, e.pressure_setpoint, p.site_id
+        FROM trip_event_log e
+        JOIN pumps p ON p.pump_id = e.pump_id
+        JOIN event_types t ON t.event_code = e.event_code
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_daily_counts_insert AFTER INSERT ON trip_event_log
+        WHEN NEW.event_code = 1
+        BEGIN
+            INSERT INTO trip_daily_counts (day, pump_id, trips) VALUES (date(NEW.timestamp), NEW.pump_id, 1)
+            ON CONFLICT (day, pump_id) DO UPDATE SET trips = trips + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_daily_counts_delete AFTER DELETE ON trip_event_log
+        WHEN OLD.event_code = 1
+        BEGIN
+            UPDATE trip_daily_counts SET trips = trips - 1
+            WHERE day = date(OLD.timestamp) AND pump_id = OLD.pump_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_intervals_open AFTER INSERT ON trip_event_log
+        WHEN NEW.event_code = 1
+        BEGIN
+            INSERT INTO trip_intervals (pump_id, trip_event_id, start_time, pressure_at_trip, setpoint_at_trip)
+            VALUES (NEW.pump_id, NEW.id, NEW.timestamp, NEW.pressure, NEW.pressure_setpoint);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trip_intervals_close AFTER INSERT ON trip_event_log
+        WHEN NEW.event_code = 2
+        BEGIN
+            UPDATE trip_intervals SET
+                clear_event_id = NEW.id,
+                end_time = NEW.timestamp,
+                duration_seconds = CAST(strftime('%s', NEW.timestamp) AS INTEGER) - CAST(strftime('%s', start_time) AS INTEGER),
+                pressure_at_clear = NEW.pressure,
+                setpoint_at_clear = NEW.pressure_setpoint
+            WHERE id = (SELECT id FROM trip_intervals WHERE pump_id = NEW.pump_id AND end_time IS NULL
+                        ORDER BY start_time DESC LIMIT 1);
+        END
+        ''',
+    ],
+    # 10: event times in epoch milliseconds next to the second-resolution timestamp,
+    # so a trip burst finds its own trip row when a pump trips twice within a second
+    [
+        'ALTER TABLE trip_event_log ADD COLUMN event_ms INTEGER',
+    ],
+]
+PRESSURE_CHUNKS_MIGRATION = 8
+TRIP_EVENT_LOG_MIGRATION = 9
+
+# Integer codes stored in trip_event_log.event_code (the triggers above hardcode 1 and 2)
+EVENT_TYPES = ('TRIP', 'TRIP_CLEARED')
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES, 1)}
+
+def migrate_database(conn):
+    """Apply any schema migrations newer than the database's user_version"""
+    while True:
+        with conn:
+            # Each migration runs under the write lock, so processes starting together
+            # (web workers, poller) apply it once between them
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= len(SCHEMA_MIGRATIONS):
+                return
+            for step in SCHEMA_MIGRATIONS[version]:
+                # Steps are SQL strings or callables for data migrations
+                if isinstance(step, str):
+                    conn.execute(step)
+                else:
+                    step(conn)
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+        print(f"✓ Database migrated to schema version {version + 1}")
+
+# Dimension tables with one row per site, pump or code; scanning them is fine
+SMALL_TABLES = {'sites', 'pumps', 'event_types', 'pump_statuses'}
+
+def check_query_plans(conn):
+    """Warn about route queries that SQLite would answer by scanning a large table"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    views = [row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view'")]
+    ok = True
+    for route, query, params in route_query_samples():
+        # Plans name tables by their alias, so map "FROM trip_event_log e" back to the table
+        aliases = {alias: table for sql in [query] + views
+                   for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.I)
+                   if alias}
+        for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params):
+            detail = row[-1]
+            words = detail.split()
+            # Only SEARCH seeks a range. Any SCAN, including "SCAN t USING [COVERING] INDEX ...",
+            # reads the whole table or index. Scans of CTEs and constant rows are not table scans.
+            table = aliases.get(words[1], words[1]) if len(words) > 1 else ''
+            if words[0] == 'SCAN' and table in tables - SMALL_TABLES:
+                print(f"⚠ Query plan for {route} scans a whole table: {detail}")
+                ok = False
+    return ok
+
+class Histogram:
+    """Fixed-bucket latency histogram in Prometheus layout (seconds, le buckets plus +Inf).
+    
+    Every histogram has a single writing thread, so observe() is a bisect and two
+    additions without a lock; a scrape may see a count one sample ahead of the sum.
+    """
+    
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+    
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+    
+    def snapshot(self):
+        return {'counts': list(self.counts), 'sum': self.sum}
+
+class DatabaseWriter:
+    """Single-connection SQLite writer fed by a bounded queue.
+    
+    The monitor thread only enqueues rows; this thread batches them with
+    executemany and commits every DB_COMMIT_INTERVAL seconds or DB_COMMIT_ROWS
+    rows, so disk stalls and long report queries never delay a PLC read.
+    When the queue is full new writes are dropped and counted.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, path=DB_PATH, maxsize=DB_QUEUE_SIZE):
+        self.path = path
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = None
+        self.stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.rows_written = 0
+        self.commits = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.last_commit_ms = 0.0
+        self.commit_latency = Histogram()  # observed by the writer thread only
+    
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.thread.start()
+    
+    def submit(self, sql, rows):
+        """Queue rows for INSERT without blocking the caller"""
+        if not rows:
+            return True
+        try:
+            self.queue.put_nowait((sql, rows))
+        except queue.Full:
+            with self.stats_lock:
+                self.dropped += len(rows)
+            print(f"⚠ Database queue full, dropped {len(rows)} row(s)")
+            return False
+        with self.stats_lock:
+            self.enqueued += len(rows)
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+    
+    def writer_loop(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        pending = []  # [sql, rows] runs in enqueue order; later statements may read earlier rows
+        pending_rows = 0
+        deadline = None
+        stopping = False
+        
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+                if item is self._STOP:
+                    stopping = True
+                else:
+                    sql, rows = item
+                    if pending and pending[-1][0] == sql:
+                        pending[-1][1].extend(rows)
+                    else:
+                        pending.append([sql, list(rows)])
+                    pending_rows += len(rows)
+                    if deadline is None:
+                        deadline = time.monotonic() + DB_COMMIT_INTERVAL
+            except queue.Empty:
+                pass
+            
+            if pending and (stopping or pending_rows >= DB_COMMIT_ROWS or time.monotonic() >= deadline):
+                self.flush(conn, pending, pending_rows)
+                pending = []
+                pending_rows = 0
+                deadline = None
+        
+        conn.close()
+    
+    def flush(self, conn, pending, pending_rows):
+        started = time.perf_counter()
+        try:
+            with conn:
+                for sql, rows in pending:
+                    conn.executemany(sql, rows)
+            with self.stats_lock:
+                self.rows_written += pending_rows
+                self.commits += 1
+                self.last_commit_ms = (time.perf_counter() - started) * 1000
+            self.commit_latency.observe(self.last_commit_ms / 1000)
+        except Exception as e:
+            with self.stats_lock:
+                self.errors += 1
+            print(f"Database error: {e}")
+    
+    def stop(self, timeout=10.0):
+        """Flush everything queued so far and stop the writer thread"""
+        if not self.thread or not self.thread.is_alive():
+            return
+        self.queue.put(self._STOP)
+        self.thread.join(timeout)
+    
+    def stats(self):
+        """Backpressure and throughput counters"""
+        with self.stats_lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'queue_capacity': self.queue.maxsize,
+                'max_queue_depth': self.max_depth,
+                'rows_enqueued': self.enqueued,
+                'rows_dropped': self.dropped,
+                'rows_written': self.rows_written,
+                'commits': self.commits,
+                'errors': self.errors,
+                'last_commit_ms': round(self.last_commit_ms, 2)
+            }
+
+db_writer = DatabaseWriter()
+
+def db_timestamp(ts=None):
+    """UTC timestamp in the format SQLite's CURRENT_TIMESTAMP uses"""
+    # Rows are committed in batches, so the sample time must be stamped by the caller
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+
+def event_ms(ts):
+    """Epoch milliseconds stored in trip_event_log.event_ms"""
+    return round(ts * 1000)
+
+ROLLUP_UPSERT = '''
+    INSERT INTO pressure_rollups (tier, pump_id, bucket, pressure_min, pressure_max, pressure_sum,
+                                  pressure_last, setpoint_last, samples)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (tier, pump_id, bucket) DO UPDATE SET
+        pressure_min = MIN(pressure_min, excluded.pressure_min),
+        pressure_max = MAX(pressure_max, excluded.pressure_max),
+        pressure_sum = pressure_sum + excluded.pressure_sum,
+        pressure_last = excluded.pressure_last,
+        setpoint_last = excluded.setpoint_last,
+        samples = samples + excluded.samples
+'''
+
+class PressureRollups:
+    """Downsamples pressure at cycle rate into min/max/avg/last buckets per tier.
+    
+    Each open bucket lives in memory; when a sample lands in a later bucket the
+    finished one is handed to `sink` as ROLLUP_UPSERT rows. The upsert merges
+    with any partial bucket already stored, so every HISTORY_CHECKPOINT_INTERVAL
+    the open buckets are also written and restarted; a crash or power loss
+    loses at most that much of each bucket.
+    """
+    
+    def __init__(self, tiers=ROLLUP_TIERS, sink=None):
+        self.tiers = sorted(tiers)
+        self.sink = sink or (lambda rows: db_writer.submit(ROLLUP_UPSERT, rows))
+        self.open = {}  # (tier, pump_id) -> [bucket, min, max, sum, last, setpoint, samples]
+        self.last_prune = 0.0
+        self.last_checkpoint = None
+        self.lock = threading.Lock()  # shared by every site's monitor thread
+    
+    def add_sample(self, ts, pump_id, pressure, setpoint):
+        closed = []
+        for tier in self.tiers:
+            bucket = int(ts // tier) * tier
+            acc = self.open.get((tier, pump_id))
+            if acc and acc[0] == bucket:
+                acc[1] = min(acc[1], pressure)
+                acc[2] = max(acc[2], pressure)
+                acc[3] += pressure
+                acc[4] = pressure
+                acc[5] = setpoint
+                acc[6] += 1
+                continue
+            if acc:
+                closed.append((tier, pump_id, *acc))
+            self.open[(tier, pump_id)] = [bucket, pressure, pressure, pressure, pressure, setpoint, 1]
+        return closed
+    
+    def add(self, data, ts=None, pump_ids=PUMP_NAMES):
+        """Feed one site's pump_data dict; write out any buckets it closes"""
+        if not data.get('connected'):
+            return
+        ts = time.time() if ts is None else ts
+        closed = []
+        with self.lock:
+            for pump_id in pump_ids:
+                prefix = pump_prefix(pump_id)
+                closed += self.add_sample(ts, pump_id, data.get(prefix + 'pressure', 0.0),
+                                          data.get(prefix + 'pressure_setpoint', 0.0))
+            if self.last_checkpoint is None:
+                self.last_checkpoint = ts
+            elif ts - self.last_checkpoint >= HISTORY_CHECKPOINT_INTERVAL:
+                self.last_checkpoint = ts
+                closed += [(tier, pump_id, *acc) for (tier, pump_id), acc in self.open.items()]
+                self.open = {}
+            prune = ts - self.last_prune >= PRUNE_INTERVAL
+            if prune:
+                self.last_prune = ts
+        if closed:
+            self.sink(closed)
+        if prune:
+            prune_history(ts)
+    
+    def open_rows(self, tier, pump_ids=None):
+        """(pump_id, bucket, min, max, sum, last, setpoint, samples) of the tier's buckets still being filled"""
+        with self.lock:
+            return [(pump_id, *acc) for (acc_tier, pump_id), acc in self.open.items()
+                    if acc_tier == tier and (pump_ids is None or pump_id in pump_ids)]
+    
+    def flush(self):
+        """Write out all open (partial) buckets"""
+        with self.lock:
+            rows = [(tier, pump_id, *acc) for (tier, pump_id), acc in self.open.items()]
+            self.open = {}
+        if rows:
+            self.sink(rows)
+
+def prune_history(now=None):
+    """Queue deletion of raw rows and rollups past their retention"""
+    now = time.time() if now is None else now
+    db_writer.submit('DELETE FROM pressure_chunks WHERE end_ms < ?',
+                     [(int((now - RAW_RETENTION_HOURS * 3600) * 1000),)])
+    for tier, hours in ROLLUP_TIERS.items():
+        if hours is not None:
+            db_writer.submit('DELETE FROM pressure_rollups WHERE tier = ? AND bucket < ?',
+                             [(tier, int(now - hours * 3600))])
+
+def backfill_rollups(conn):
+    """Build rollup rows from existing raw pressure_history (schema migration 2)"""
+    rollups = PressureRollups(sink=lambda rows: conn.executemany(ROLLUP_UPSERT, rows))
+    cursor = conn.execute('''
+        SELECT CAST(strftime('%s', timestamp) AS INTEGER), pump_id, pressure, pressure_setpoint
+        FROM pressure_history ORDER BY timestamp, id
     ''')
+    for ts, pump_id, pressure, setpoint in cursor:
+        closed = rollups.add_sample(ts, pump_id, pressure or 0.0, setpoint or 0.0)
+        if closed:
+            rollups.sink(closed)
+    rollups.flush()
+
+pressure_rollups = PressureRollups()
+
+# Status text of a pump_data dict <-> the 3-bit code stored in pressure chunks
+PRESSURE_STATUSES = ('UNKNOWN', 'READY', 'RUNNING', 'TRIP', 'ERROR')
+PRESSURE_STATUS_CODES = {status: code for code, status in enumerate(PRESSURE_STATUSES)}
+
+CHUNK_HEADER = struct.Struct('<qH')  # first timestamp (ms), sample count
+FLOAT32 = struct.Struct('<f')
+UINT32 = struct.Struct('<I')
+
+# Delta-of-delta timestamp buckets: (prefix, prefix bits, value bits); anything larger
+# is written as '1111' and 32 bits
+DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+class BitWriter:
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.bits = 0
     
-    # Pressure history table for health monitoring
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pressure_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pump_id INTEGER NOT NULL,
-            pump_name TEXT NOT NULL,
-            pressure REAL,
-            pressure_setpoint REAL,
-            status TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | value
+        self.bits += nbits
+        while self.bits >= 8:
+            self.bits -= 8
+            self.out.append(self.acc >> self.bits)
+            self.acc &= (1 << self.bits) - 1
+    
+    def getvalue(self):
+        """Bytes written so far, the last one zero padded; the writer can keep going"""
+        if self.bits:
+            return bytes(self.out) + bytes([self.acc << (8 - self.bits)])
+        return bytes(self.out)
+
+class BitReader:
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.pos = offset
+        self.acc = 0
+        self.bits = 0
+    
+    def read(self, nbits):
+        while self.bits < nbits:
+            self.acc = (self.acc << 8) | self.data[self.pos]
+            self.pos += 1
+            self.bits += 8
+        self.bits -= nbits
+        value = self.acc >> self.bits
+        self.acc &= (1 << self.bits) - 1
+        return value
+
+class XorFloatStream:
+    """Gorilla XOR coding of a float32 series on a shared bit stream.
+    
+    A repeat of the previous value is one '0' bit. Otherwise the XOR with it is
+    written as '10' + the meaningful bits inside the previous leading/trailing
+    zero window, or '11' + 5 bits leading zeros + 5 bits length + the bits.
+    """
+    
+    def __init__(self):
+        self.previous = None
+        self.leading = 32
+        self.trailing = 0
+    
+    def write(self, out, value):
+        bits = UINT32.unpack(FLOAT32.pack(value))[0]
+        if self.previous is None:
+            out.write(bits, 32)
+            self.previous = bits
+            return
+        xor = bits ^ self.previous
+        self.previous = bits
+        if not xor:
+            out.write(0, 1)
+            return
+        leading = min(32 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if leading >= self.leading and trailing >= self.trailing:
+            out.write(0b10, 2)
+            out.write(xor >> self.trailing, 32 - self.leading - self.trailing)
+        else:
+            length = 32 - leading - trailing
+            out.write(0b11, 2)
+            out.write(leading, 5)
+            out.write(length - 1, 5)
+            out.write(xor >> trailing, length)
+            self.leading, self.trailing = leading, trailing
+    
+    def read(self, reader):
+        if self.previous is None:
+            self.previous = reader.read(32)
+        elif reader.read(1):
+            if reader.read(1):
+                self.leading = reader.read(5)
+                length = reader.read(5) + 1
+                self.trailing = 32 - self.leading - length
+            self.previous ^= reader.read(32 - self.leading - self.trailing) << self.trailing
+        return FLOAT32.unpack(UINT32.pack(self.previous))[0]
+
+class ChunkEncoder:
+    """Streaming encoder for one pump's samples: delta-of-delta ms timestamps,
+    XOR float32 pressure and setpoint, and the status code as '0' (unchanged)
+    or '1' + 3 bits."""
+    
+    def __init__(self, ts_ms):
+        self.start_ms = ts_ms
+        self.last_ms = ts_ms
+        self.delta = 0
+        self.samples = 0
+        self.status = None
+        self.bits = BitWriter()
+        self.pressure = XorFloatStream()
+        self.setpoint = XorFloatStream()
+    
+    def append(self, ts_ms, pressure, setpoint, status):
+        out = self.bits
+        if self.samples:
+            delta = ts_ms - self.last_ms
+            dod = delta - self.delta
+            self.delta = delta
+            if dod == 0:
+                out.write(0, 1)
+            else:
+                for prefix, prefix_bits, value_bits in DOD_BUCKETS:
+                    if -(1 << (value_bits - 1)) < dod <= 1 << (value_bits - 1):
+                        out.write(prefix, prefix_bits)
+                        out.write(dod + (1 << (value_bits - 1)) - 1, value_bits)
+                        break
+                else:
+                    out.write(0b1111, 4)
+                    out.write(dod & 0xFFFFFFFF, 32)
+        else:
+            self.start_ms = ts_ms
+        self.last_ms = ts_ms
+        self.pressure.write(out, pressure)
+        self.setpoint.write(out, setpoint)
+        if status == self.status:
+            out.write(0, 1)
+        else:
+            out.write(0b1000 | status, 4)
+            self.status = status
+        self.samples += 1
+    
+    def blob(self):
+        return CHUNK_HEADER.pack(self.start_ms, self.samples) + self.bits.getvalue()
+
+def iter_chunk(blob):
+    """Decode a chunk lazily: yields (ts_ms, pressure, setpoint, status code) in time order"""
+    ts_ms, samples = CHUNK_HEADER.unpack_from(blob)
+    reader = BitReader(blob, CHUNK_HEADER.size)
+    pressure, setpoint = XorFloatStream(), XorFloatStream()
+    delta = 0
+    status = 0
+    for i in range(samples):
+        if i and reader.read(1):
+            value_bits = 32
+            for _, _, bucket_bits in DOD_BUCKETS:
+                if not reader.read(1):
+                    value_bits = bucket_bits
+                    break
+            if value_bits == 32:
+                dod = reader.read(32)
+                dod -= (dod >> 31) << 32
+            else:
+                dod = reader.read(value_bits) - (1 << (value_bits - 1)) + 1
+            delta += dod
+        ts_ms += delta if i else 0
+        p = pressure.read(reader)
+        sp = setpoint.read(reader)
+        if reader.read(1):
+            status = reader.read(3)
+        yield ts_ms, p, sp, status
+
+class PressureChunks:
+    """Open chunk per pump, fed every cycle and written out when its CHUNK_SECONDS window ends.
+    
+    Every HISTORY_CHECKPOINT_INTERVAL the open chunks are also written as they
+    stand; PRESSURE_CHUNK_INSERT replaces that row as the chunk grows, so a crash
+    loses at most one interval of raw samples.
+    """
+    
+    def __init__(self, sink=None):
+        self.sink = sink or (lambda rows: db_writer.submit(PRESSURE_CHUNK_INSERT, rows))
+        self.open = {}  # pump_id -> ChunkEncoder
+        self.checkpointed = {}  # pump_id -> (start_ms, samples) of the open chunk when last written
+        self.last_checkpoint = None
+        self.lock = threading.Lock()  # shared by every site's monitor thread
+    
+    def add_sample(self, ts_ms, pump_id, pressure, setpoint, status):
+        """Append one sample; returns the row of a chunk it closed, if any"""
+        encoder = self.open.get(pump_id)
+        closed = None
+        if encoder and ts_ms // 1000 // CHUNK_SECONDS != encoder.start_ms // 1000 // CHUNK_SECONDS:
+            closed = self.row(pump_id, encoder)
+            encoder = None
+        if encoder is None:
+            encoder = self.open[pump_id] = ChunkEncoder(ts_ms)
+        encoder.append(ts_ms, pressure, setpoint, status)
+        return closed
+    
+    def add(self, data, ts=None, pump_ids=PUMP_NAMES):
+        """Feed one site's pump_data dict"""
+        if not data.get('connected'):
+            return
+        ts_ms = round((time.time() if ts is None else ts) * 1000)
+        closed = []
+        with self.lock:
+            for pump_id in pump_ids:
+                prefix = pump_prefix(pump_id)
+                row = self.add_sample(ts_ms, pump_id, data.get(prefix + 'pressure', 0.0),
+                                      data.get(prefix + 'pressure_setpoint', 0.0),
+                                      PRESSURE_STATUS_CODES.get(data.get(prefix + 'status'), 0))
+                if row:
+                    closed.append(row)
+            if self.last_checkpoint is None:
+                self.last_checkpoint = ts_ms
+            elif ts_ms - self.last_checkpoint >= HISTORY_CHECKPOINT_INTERVAL * 1000:
+                self.last_checkpoint = ts_ms
+                for pump_id, encoder in self.open.items():
+                    if self.checkpointed.get(pump_id) != (encoder.start_ms, encoder.samples):
+                        self.checkpointed[pump_id] = (encoder.start_ms, encoder.samples)
+                        closed.append(self.row(pump_id, encoder))
+        if closed:
+            self.sink(closed)
+    
+    @staticmethod
+    def row(pump_id, encoder):
+        return (pump_id, encoder.start_ms, encoder.last_ms, encoder.samples, encoder.blob())
+    
+    def open_rows(self, pump_ids=None):
+        """Rows of the chunks still being filled, for reads that need the last few minutes"""
+        with self.lock:
+            return [self.row(pump_id, encoder) for pump_id, encoder in self.open.items()
+                    if pump_ids is None or pump_id in pump_ids]
+    
+    def flush(self):
+        """Write out all open (partial) chunks"""
+        with self.lock:
+            rows = [self.row(pump_id, encoder) for pump_id, encoder in self.open.items()]
+            self.open = {}
+        if rows:
+            self.sink(rows)
+
+PRESSURE_CHUNK_INSERT = '''
+    INSERT OR REPLACE INTO pressure_chunks (pump_id, start_ms, end_ms, samples, data) VALUES (?, ?, ?, ?, ?)
+'''
+
+pressure_chunks = PressureChunks()
+
+def pressure_chunks_query(start_ms, end_ms, pump_id=None, site_id=None):
+    """Chunks overlapping [start_ms, end_ms]; a chunk never spans more than CHUNK_SECONDS,
+    which bounds the primary key range scan from below"""
+    query, params = site_filter(site_id)
+    query = '''
+        SELECT pump_id, start_ms, end_ms, samples, data FROM pressure_chunks
+        WHERE start_ms BETWEEN ? AND ? AND end_ms >= ?
+    ''' + query
+    params = [start_ms - CHUNK_SECONDS * 1000, end_ms, start_ms] + params
+    if pump_id:
+        query += " AND pump_id = ?"
+        params.append(pump_id)
+        return query + " ORDER BY pump_id, start_ms", params
+    # Across pumps, end_ms order lets the scan seek idx_pressure_chunks_end; each
+    # pump's chunks still come in time order since they never overlap
+    return query + " ORDER BY end_ms", params
+
+def read_pressure_samples(conn, start, end=None, pump_id=None, site_id=None):
+    """Raw samples (pump_id, ts, pressure, setpoint, status code) between two epoch times.
+    
+    Chunks are fetched and decoded one at a time as the iteration reaches them,
+    then the open in-memory chunks of this process are appended.
+    """
+    start_ms = int(start * 1000)
+    end_ms = int((time.time() if end is None else end) * 1000)
+    stored = conn.execute(*pressure_chunks_query(start_ms, end_ms, pump_id, site_id))
+    pump_ids = {pump_id} if pump_id else set(SITE_PUMPS[site_id]) if site_id else None
+    open_rows = pressure_chunks.open_rows(pump_ids)
+    # A checkpointed open chunk is also stored; its in-memory row is the newer one
+    open_keys = {(row[0], row[1]) for row in open_rows}
+    stored = (row for row in stored if (row[0], row[1]) not in open_keys)
+    for chunk_pump_id, chunk_start, chunk_end, _, data in itertools.chain(stored, open_rows):
+        if chunk_end < start_ms or chunk_start > end_ms:
+            continue
+        for ts_ms, pressure, setpoint, status in iter_chunk(data):
+            if ts_ms > end_ms:
+                break
+            if ts_ms >= start_ms:
+                yield chunk_pump_id, ts_ms / 1000, pressure, setpoint, status
+
+def thin_samples(samples, interval):
+    """First sample of every pump in each `interval`-second slot"""
+    last_slot = {}
+    for sample in samples:
+        slot = int(sample[1] // interval)
+        if last_slot.get(sample[0]) != slot:
+            last_slot[sample[0]] = slot
+            yield sample
+
+def backfill_pressure_chunks(conn):
+    """Re-encode existing pressure_history rows as chunks (schema migration 8)"""
+    chunks = PressureChunks(sink=lambda rows: conn.executemany(PRESSURE_CHUNK_INSERT, rows))
+    cursor = conn.execute('''
+        SELECT pump_id, CAST(strftime('%s', timestamp) AS INTEGER) * 1000, pressure, pressure_setpoint, status
+        FROM pressure_history ORDER BY pump_id, timestamp, id
     ''')
+    for pump_id, ts_ms, pressure, setpoint, status in cursor:
+        closed = chunks.add_sample(ts_ms, pump_id, pressure or 0.0, setpoint or 0.0,
+                                   PRESSURE_STATUS_CODES.get(status, 0))
+        if closed:
+            chunks.sink([closed])
+    chunks.flush()
+
+KPI_STATES = ('RUNNING', 'READY', 'TRIP', 'OFFLINE')
+
+KPI_UPSERT = '''
+    INSERT INTO pump_daily_kpis (day, pump_id, running_seconds, ready_seconds, trip_seconds, offline_seconds,
+                                 trips, repairs)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, pump_id) DO UPDATE SET
+        running_seconds = running_seconds + excluded.running_seconds,
+        ready_seconds = ready_seconds + excluded.ready_seconds,
+        trip_seconds = trip_seconds + excluded.trip_seconds,
+        offline_seconds = offline_seconds + excluded.offline_seconds,
+        trips = trips + excluded.trips,
+        repairs = repairs + excluded.repairs
+'''
+
+def kpi_state(data, prefix):
+    """Reliability state of one pump; a trip outranks the other indicators"""
+    if data.get(prefix + 'trip_red'):
+        return 'TRIP'
+    if data.get(prefix + 'running_green'):
+        return 'RUNNING'
+    if data.get(prefix + 'ready_yellow'):
+        return 'READY'
+    return 'OFFLINE'
+
+class KpiAccumulator:
+    """Accumulates per-pump state durations and trip/repair counts at cycle rate.
     
-    conn.commit()
-    conn.close()
+    One instance per site. Time between two samples is credited to the state
+    seen at the first one, split between the two days when it spans midnight.
+    Pending totals per (UTC day, pump) are upserted additively into
+    pump_daily_kpis, so /api/kpis sums a handful of rows per pump per day.
+    """
+    
+    def __init__(self, pump_ids=PUMP_NAMES, sink=None):
+        self.pump_ids = list(pump_ids)
+        self.sink = sink or (lambda rows: db_writer.submit(KPI_UPSERT, rows))
+        self.last_ts = None
+        self.last_state = {}
+        self.pending = {}  # (day, pump_id) -> [running, ready, trip, offline, trips, repairs]
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+    
+    def add(self, data, ts=None):
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            if not data.get('connected'):
+                # Stop crediting time until the PLC is back
+                self.last_ts = None
+                return
+            day = time.strftime('%Y-%m-%d', time.gmtime(ts))
+            gap = ts - self.last_ts if self.last_ts is not None else None
+            if gap is not None and not 0 < gap <= KPI_MAX_GAP:
+                gap = None
+            # The part of the gap before UTC midnight belongs to the previous day
+            before_midnight = max(0.0, ts - ts % 86400 - self.last_ts) if gap else 0.0
+            previous_day = time.strftime('%Y-%m-%d', time.gmtime(self.last_ts)) if before_midnight else None
+            for pump_id in self.pump_ids:
+                state = kpi_state(data, pump_prefix(pump_id))
+                previous = self.last_state.get(pump_id)
+                totals = self.pending.setdefault((day, pump_id), [0.0, 0.0, 0.0, 0.0, 0, 0])
+                if previous is not None and gap:
+                    totals[KPI_STATES.index(previous)] += gap - before_midnight
+                    if before_midnight:
+                        previous_totals = self.pending.setdefault((previous_day, pump_id), [0.0, 0.0, 0.0, 0.0, 0, 0])
+                        previous_totals[KPI_STATES.index(previous)] += before_midnight
+                if previous is not None and previous != 'TRIP' and state == 'TRIP':
+                    totals[4] += 1
+                elif previous == 'TRIP' and state != 'TRIP':
+                    totals[5] += 1
+                self.last_state[pump_id] = state
+            self.last_ts = ts
+        if ts - self.last_flush >= KPI_FLUSH_INTERVAL:
+            self.flush(ts)
+    
+    def flush(self, ts=None):
+        """Write pending totals as additive daily rollups"""
+        with self.lock:
+            rows = [(day, pump_id, *totals) for (day, pump_id), totals in self.pending.items() if any(totals)]
+            self.pending = {}
+            self.last_flush = time.time() if ts is None else ts
+        if rows:
+            self.sink(rows)
 
-# Initialize database on startup
-init_database()
+def kpi_query(pump_id=None, start_date=None, end_date=None, period='day', site_id=None):
+    """Sum daily KPI rollups per pump per day, week or month"""
+    group = {'day': 'day', 'week': "strftime('%Y-W%W', day)", 'month': 'substr(day, 1, 7)'}[period]
+    query, params = site_filter(site_id)
+    query = f'''
+        SELECT {group} AS period, pump_id,
+               SUM(running_seconds) AS running_seconds, SUM(ready_seconds) AS ready_seconds,
+               SUM(trip_seconds) AS trip_seconds, SUM(offline_seconds) AS offline_seconds,
+               SUM(trips) AS trips, SUM(repairs) AS repairs
+        FROM pump_daily_kpis WHERE 1=1
+    ''' + query
+    if start_date:
+        query += " AND day >= ?"
+        params.append(start_date[:10])
+    if end_date:
+        query += " AND day <= ?"
+        params.append(end_date[:10])
+    if pump_id:
+        query += " AND pump_id = ?"
+        params.append(pump_id)
+    return query + " GROUP BY period, pump_id ORDER BY period, pump_id", params
 
-# Track previous trip states to detect transitions
-previous_trip_states = {i: False for i in range(1, 8)}
+def kpi_metrics(row):
+    """Availability, MTBF and MTTR from summed state durations"""
+    monitored = row['running_seconds'] + row['ready_seconds'] + row['trip_seconds'] + row['offline_seconds']
+    return {
+        'period': row['period'],
+        'pump_id': row['pump_id'],
+        'pump_name': PUMP_NAMES.get(row['pump_id'], ''),
+        'site_id': PUMP_SITES.get(row['pump_id']),
+        'running_hours': round(row['running_seconds'] / 3600, 2),
+        'trip_hours': round(row['trip_seconds'] / 3600, 2),
+        'monitored_hours': round(monitored / 3600, 2),
+        'availability_pct': round(100 * (monitored - row['trip_seconds']) / monitored, 2) if monitored else None,
+        'trips': row['trips'],
+        # MTBF: running time per failure; MTTR: time in trip per completed repair
+        'mtbf_hours': round(row['running_seconds'] / 3600 / row['trips'], 2) if row['trips'] else None,
+        'mttr_minutes': round(row['trip_seconds'] / 60 / row['repairs'], 2) if row['repairs'] else None
+    }
 
-class PumpMonitor:
+def fill_code_tables(conn):
+    """Name the integer event and status codes (schema migration 9)"""
+    conn.executemany('INSERT OR REPLACE INTO event_types (event_code, name) VALUES (?, ?)',
+                     [(code, name) for name, code in EVENT_CODES.items()])
+    conn.executemany('INSERT OR REPLACE INTO pump_statuses (status_code, name) VALUES (?, ?)',
+                     [(code, name) for name, code in PRESSURE_STATUS_CODES.items()])
+
+def backfill_site_ids(conn):
+    """Tag existing raw rows with the site that owns their pump (schema migration 6)"""
+    for site_id, pump_ids in SITE_PUMPS.items():
+        placeholders = ', '.join('?' * len(pump_ids))
+        for table in ('trip_events', 'pressure_history'):
+            conn.execute(f"UPDATE {table} SET site_id = ? WHERE pump_id IN ({placeholders})", [site_id, *pump_ids])
+
+def backfill_trip_intervals(conn):
+    """Pair existing TRIP/TRIP_CLEARED events into trip_intervals (schema migration 4)"""
+    open_trips = {}  # pump_id -> TRIP row awaiting its clear
+    rows = []
+    cursor = conn.execute('''
+        SELECT id, pump_id, event_type, timestamp, pressure, pressure_setpoint
+        FROM trip_events ORDER BY timestamp, id
+    ''')
+    for event_id, pump_id, event_type, timestamp, pressure, setpoint in cursor:
+        if event_type == 'TRIP':
+            if pump_id in open_trips:
+                # A second TRIP without a clear in between: the first stays open-ended
+                rows.append(open_trips[pump_id] + (None, None, None, None, None))
+            open_trips[pump_id] = (pump_id, event_id, timestamp, pressure, setpoint)
+        elif event_type == 'TRIP_CLEARED' and pump_id in open_trips:
+            trip = open_trips.pop(pump_id)
+            duration = (datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+                        - datetime.strptime(trip[2], '%Y-%m-%d %H:%M:%S')).total_seconds()
+            rows.append(trip + (event_id, timestamp, duration, pressure, setpoint))
+    rows += [trip + (None, None, None, None, None) for trip in open_trips.values()]
+    
+    conn.executemany('''
+        INSERT OR IGNORE INTO trip_intervals (pump_id, trip_event_id, start_time, pressure_at_trip, setpoint_at_trip,
+                                              clear_event_id, end_time, duration_seconds, pressure_at_clear,
+                                              setpoint_at_clear)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+# Report-by-exception: pressure/setpoint changes smaller than the pump's deadband
+# (bar) are not sent; a full keyframe goes out every KEYFRAME_INTERVAL cycles.
+PRESSURE_DEADBAND = {pump_id: 0.05 for pump_id in PUMP_NAMES}
+KEYFRAME_INTERVAL = 30  # cycles
+
+class ChangeDetector:
+    """Turns successive pump_data dicts into keyframes and change-only deltas"""
+    
+    # Keys that change every cycle and are carried in every payload anyway
+    META_KEYS = ('sequence', 'snapshot_age')
+    
+    def __init__(self, deadbands=PRESSURE_DEADBAND, keyframe_interval=KEYFRAME_INTERVAL):
+        self.deadbands = {}
+        for pump_id, deadband in deadbands.items():
+            self.deadbands[pump_prefix(pump_id) + 'pressure'] = deadband
+            self.deadbands[pump_prefix(pump_id) + 'pressure_setpoint'] = deadband
+        self.keyframe_interval = keyframe_interval
+        self.last_sent = {}
+        self.cycles_since_keyframe = None
+    
+    def update(self, data):
+        """Return ('pump_data', full dict) for a keyframe, else ('pump_delta', changed fields)"""
+        if self.cycles_since_keyframe is None or self.cycles_since_keyframe + 1 >= self.keyframe_interval:
+            self.cycles_since_keyframe = 0
+            self.last_sent = dict(data)
+            return 'pump_data', data
+        self.cycles_since_keyframe += 1
+        
+        delta = {}
+        for key, value in data.items():
+            if key in self.META_KEYS:
+                continue
+            if key not in self.last_sent:
+                delta[key] = value
+                continue
+            last = self.last_sent[key]
+            deadband = self.deadbands.get(key)
+            if deadband is not None and isinstance(value, (int, float)) and isinstance(last, (int, float)):
+                if abs(value - last) >= deadband:
+                    delta[key] = value
+            elif value != last:
+                delta[key] = value
+        self.last_sent.update(delta)
+        
+        # An unchanged cycle still sends the sequence number as a heartbeat
+        for key in self.META_KEYS:
+            if key in data:
+                delta[key] = data[key]
+        return 'pump_delta', delta
+
+# Compact binary live frame, negotiated per socket with ?format=binary. Layout
+# (little-endian): version u8, flags u8 (bit 0 = connected), pump count u8, pad,
+# sequence u32, one pump id byte per pump, one status byte per pump (bit 0 ready,
+# 1 running, 2 trip, 3 alarm), padding to 4 bytes, then float32 pressure/setpoint
+# pairs, all in the order of the ids. Every site has its own frame, so the ids
+# (1-255) tell the client which pumps it carries.
+BINARY_FRAMES_ENABLED = True
+BINARY_FRAME_VERSION = 2
+BINARY_PUMP_IDS = sorted(p['pump_id'] for p in PUMP_LAYOUT)
+
+def binary_frame_struct(pump_count):
+    return struct.Struct(f'<BBBxI{pump_count}B{pump_count}B{-2 * pump_count % 4}x{2 * pump_count}f')
+
+def status_bits(data, prefix):
+    """Pack a pump's indicators: bit 0 ready, 1 running, 2 trip, 3 alarm"""
+    return (
+        (1 if data.get(prefix + 'ready_yellow') else 0)
+        | (2 if data.get(prefix + 'running_green') else 0)
+        | (4 if data.get(prefix + 'trip_red') else 0)
+        | (8 if data.get(prefix + 'alarm') else 0)
+    )
+
+def encode_binary_frame(data, pump_ids=BINARY_PUMP_IDS, frame_struct=None):
+    """Pack a pump_data dict into the compact binary frame"""
+    frame_struct = frame_struct or binary_frame_struct(len(pump_ids))
+    status_bytes = []
+    values = []
+    for pump_id in pump_ids:
+        prefix = pump_prefix(pump_id)
+        status_bytes.append(status_bits(data, prefix))
+        values += [data.get(prefix + 'pressure', 0.0), data.get(prefix + 'pressure_setpoint', 0.0)]
+    return frame_struct.pack(
+        BINARY_FRAME_VERSION,
+        1 if data.get('connected') else 0,
+        len(pump_ids),
+        data.get('sequence', 0) & 0xFFFFFFFF,
+        *pump_ids,
+        *status_bytes,
+        *values
+    )
+
+class LiveWindow:
+    """Fixed-size ring buffer of every cycle's pump values.
+    
+    Storage is preallocated typed arrays: one float64 timestamp per cycle shared
+    by all pumps, and per pump a float32 pressure, float32 setpoint and a status
+    byte (status_bits layout). 24 h x 7 pumps at 4 Hz is about 24 MB.
+    """
+    
+    def __init__(self, pump_ids, capacity):
+        self.capacity = capacity
+        self.pump_ids = list(pump_ids)
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.pressure = {pump_id: array('f', bytes(4 * capacity)) for pump_id in self.pump_ids}
+        self.setpoint = {pump_id: array('f', bytes(4 * capacity)) for pump_id in self.pump_ids}
+        self.status = {pump_id: array('B', bytes(capacity)) for pump_id in self.pump_ids}
+        self.head = 0   # Next slot to write
+        self.count = 0
+        self.lock = threading.Lock()
+    
+    def memory_bytes(self):
+        return self.capacity * (8 + 9 * len(self.pump_ids))
+    
+    def append(self, data, ts=None):
+        """Record one pump_data dict"""
+        if not data.get('connected'):
+            return
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            i = self.head
+            self.timestamps[i] = ts
+            for pump_id in self.pump_ids:
+                prefix = pump_prefix(pump_id)
+                self.pressure[pump_id][i] = data.get(prefix + 'pressure', 0.0)
+                self.setpoint[pump_id][i] = data.get(prefix + 'pressure_setpoint', 0.0)
+                self.status[pump_id][i] = status_bits(data, prefix)
+            self.head = (i + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+    
+    def window(self, pump_id, seconds, now=None):
+        """Columns for one pump covering the last `seconds`, oldest first"""
+        now = time.time() if now is None else now
+        with self.lock:
+            oldest = (self.head - self.count) % self.capacity
+            # Binary search for the first sample inside the window (timestamps ascend)
+            lo, hi = 0, self.count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.timestamps[(oldest + mid) % self.capacity] < now - seconds:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            start = (oldest + lo) % self.capacity
+            n = self.count - lo
+            
+            def take(column):
+                if start + n <= self.capacity:
+                    return column[start:start + n]
+                return column[start:] + column[:start + n - self.capacity]
+            
+            return {
+                'timestamps': [round(t, 3) for t in take(self.timestamps)],
+                'pressure': [round(v, 2) for v in take(self.pressure[pump_id])],
+                'setpoint': [round(v, 2) for v in take(self.setpoint[pump_id])],
+                'status': take(self.status[pump_id]).tolist()
+            }
+
+# Bursts reference their trip event by (pump_id, event_ms): the event's id is only
+# assigned by the database writer, which runs statements in the order they were
+# queued, so the trip row is always inserted before its burst. The timestamp term
+# lets the lookup seek idx_trip_event_log_pump_code_ts.
+BURST_INSERT = '''
+    INSERT OR REPLACE INTO trip_bursts (trip_event_id, pump_id, trigger_time, pre_samples, samples, waveform)
+    SELECT id, ?, ?, ?, ?, ? FROM trip_event_log
+    WHERE pump_id = ? AND event_code = 1 AND timestamp = ? AND event_ms = ?
+    LIMIT 1
+'''
+
+def encode_burst(trigger_time, columns):
+    """Columnar waveform blob: int32 ms offsets from the trigger, float32 pressures, status bytes; zlib"""
+    n = len(columns['timestamps'])
+    offsets = [round((ts - trigger_time) * 1000) for ts in columns['timestamps']]
+    raw = struct.pack(f'<{n}i{n}f{n}B', *offsets, *columns['pressure'], *columns['status'])
+    return zlib.compress(raw, 9)
+
+def decode_burst(blob, samples):
+    values = struct.unpack(f'<{samples}i{samples}f{samples}B', zlib.decompress(blob))
+    return {
+        'offsets_ms': list(values[:samples]),
+        'pressure': [round(v, 2) for v in values[samples:2 * samples]],
+        'status': list(values[2 * samples:])
+    }
+
+class BurstCapture:
+    """Pressure waveforms around the trip edges of one site's pumps.
+    
+    At a TRIP edge the pump's last BURST_PRE_SECONDS in the live window are frozen
+    and samples are collected until BURST_POST_SECONDS have passed; the whole burst
+    is then queued as one blob linked to the trip event. The monitor polls every
+    BURST_CYCLE_TIME meanwhile only while its AIMD controller sits at the fastest
+    rate; the first Job pending retry or failed read ends the fast phase.
+    """
+    
+    def __init__(self, live_window):
+        self.live_window = live_window
+        self.open = {}  # pump_id -> (trigger time, frozen pre-trigger columns)
+        self.captured = 0
+        self.throttled = False  # a busy or failed read since the bursts opened
+    
+    def active(self):
+        return bool(self.open)
+    
+    def read_outcome(self, busy_retries, failed):
+        """Record one cycle's read; the throttle lifts once a clean cycle runs with no burst open"""
+        if busy_retries or failed:
+            self.throttled = True
+        elif not self.open:
+            self.throttled = False
+    
+    def period(self, rate):
+        """Poll period for the next cycle under the AdaptiveRate `rate`"""
+        at_floor = not rate.enabled or rate.period <= rate.min_period
+        if self.open and at_floor and not self.throttled:
+            return min(BURST_CYCLE_TIME, rate.period)
+        return rate.period
+    
+    def trigger(self, pump_id, ts):
+        """Freeze the pre-trigger samples; call with the trip event's snapshot time before that
+        cycle enters the live window. A re-trip while the pump's burst is still open stores
+        that burst early and starts a new one."""
+        if pump_id in self.open:
+            self.close(pump_id, ts)
+        self.open[pump_id] = (ts, self.live_window.window(pump_id, BURST_PRE_SECONDS, ts))
+    
+    def update(self, now, force=False):
+        """Store every burst whose post-trigger window has elapsed (all of them when force is set)"""
+        for pump_id, (ts, pre) in list(self.open.items()):
+            if force or now - ts >= BURST_POST_SECONDS:
+                self.close(pump_id, now)
+    
+    def close(self, pump_id, now):
+        """Queue the pump's open burst with the post-trigger samples up to `now`"""
+        ts, pre = self.open.pop(pump_id)
+        post = self.live_window.window(pump_id, now - ts, now)
+        columns = {key: pre[key] + post[key] for key in ('timestamps', 'pressure', 'status')}
+        samples = len(columns['timestamps'])
+        db_writer.submit(BURST_INSERT, [(pump_id, ts, len(pre['timestamps']), samples,
+                                         encode_burst(ts, columns), pump_id, db_timestamp(ts), event_ms(ts))])
+        self.captured += 1
+
+# Sized for the fastest adaptive rate so LIVE_WINDOW_HOURS are always held (about 24 MB
+# for 7 pumps). A trip burst's BURST_POST_SECONDS at BURST_CYCLE_TIME costs 60 extra slots.
+LIVE_WINDOW_CAPACITY = int(LIVE_WINDOW_HOURS * 3600 / MIN_CYCLE_TIME)
+
+def pump_room(pump_id):
+    return f'pump:{pump_id}'
+
+class Subscriptions:
+    """Socket.IO room membership, counted so the monitors only build and emit
+    payloads for rooms somebody is in.
+    
+    Site rooms (<site>:json, <site>:binary) carry every pump of a site; pump rooms
+    (pump:<id>) carry one pump's fields in JSON. Counts only cover this process.
+    """
+    
+    def __init__(self):
+        self.client_rooms = {}  # sid -> set of rooms
+        self.members = {}       # room -> number of clients
+        self.lock = threading.Lock()
+    
+    def join(self, sid, room):
+        join_room(room, sid=sid)
+        with self.lock:
+            rooms = self.client_rooms.setdefault(sid, set())
+            if room not in rooms:
+                rooms.add(room)
+                self.members[room] = self.members.get(room, 0) + 1
+    
+    def leave(self, sid, room):
+        leave_room(room, sid=sid)
+        with self.lock:
+            if room in self.client_rooms.get(sid, ()):
+                self.client_rooms[sid].discard(room)
+                self.members[room] -= 1
+    
+    def drop(self, sid):
+        """Forget a disconnected client (Socket.IO already removed it from its rooms)"""
+        with self.lock:
+            for room in self.client_rooms.pop(sid, ()):
+                self.members[room] -= 1
+    
+    def rooms(self, sid):
+        with self.lock:
+            return sorted(self.client_rooms.get(sid, ()))
+    
+    def has(self, room):
+        # With a message queue the members may be connected to other processes
+        return bool(MESSAGE_QUEUE) or self.members.get(room, 0) > 0
+    
+    def counts(self):
+        with self.lock:
+            return {room: count for room, count in self.members.items() if count}
+
+subscriptions = Subscriptions()
+
+# Immutable result of one monitor cycle. The monitor loop is the only PLC reader;
+# routes and socket handlers serve whatever snapshot was published last.
+Snapshot = namedtuple('Snapshot', ['data', 'timestamp', 'sequence'])
+
+class CycleStats:
+    """Achieved cycle time, start jitter and overruns of the acquisition loop"""
+    
+    def __init__(self, target, window=CYCLE_STATS_WINDOW):
+        self.target = target
+        self.lateness = deque(maxlen=window)   # seconds each cycle started after its deadline
+        self.periods = deque(maxlen=window)    # seconds between consecutive cycle starts
+        self.durations = deque(maxlen=window)  # seconds of work per cycle
+        self.last_start = None
+        self.cycles = 0
+        self.missed = 0
+        self.overruns = 0
+    
+    def cycle_started(self, now, deadline):
+        if self.last_start is not None:
+            self.periods.append(now - self.last_start)
+        self.lateness.append(max(now - deadline, 0.0))
+        self.last_start = now
+        self.cycles += 1
+    
+    def cycle_finished(self, duration):
+        self.durations.append(duration)
+        if duration > self.target:
+            self.overruns += 1
+    
+    def stats(self):
+        periods, lateness, durations = list(self.periods), list(self.lateness), list(self.durations)
+        ms = lambda seconds: round(seconds * 1000, 2)
+        return {
+            'target_cycle_ms': ms(self.target),
+            'achieved_cycle_ms': ms(statistics.fmean(periods)) if periods else None,
+            'achieved_rate_hz': round(len(periods) / sum(periods), 3) if periods else None,
+            'jitter_ms': ms(statistics.pstdev(periods)) if len(periods) > 1 else None,
+            'max_start_lateness_ms': ms(max(lateness)) if lateness else None,
+            'mean_cycle_work_ms': ms(statistics.fmean(durations)) if durations else None,
+            'max_cycle_work_ms': ms(max(durations)) if durations else None,
+            'cycles': self.cycles,
+            'overruns': self.overruns,
+            'missed_cycles': self.missed,
+            'window': len(periods)
+        }
+
+ACQUISITION_STAGES = ('plc_read', 'decode', 'db_write', 'emit')
+ACQUISITION_COUNTERS = ('reads', 'read_errors', 'busy_retries', 'reconnects', 'failed_cycles', 'emits')
+
+class AcquisitionMetrics:
+    """Counters and per-stage timings of one monitor, written only by its poller thread"""
+    
     def __init__(self):
+        self.counters = dict.fromkeys(ACQUISITION_COUNTERS, 0)
+        self.histograms = {stage: Histogram() for stage in ACQUISITION_STAGES}
+    
+    def count(self, name, n=1):
+        self.counters[name] += n
+    
+    def observe(self, stage, seconds):
+        self.histograms[stage].observe(seconds)
+    
+    def snapshot(self):
+        return {'counters': dict(self.counters),
+                'histograms': {stage: histogram.snapshot() for stage, histogram in self.histograms.items()}}
+
+class AdaptiveRate:
+    """AIMD controller for the poll period of one PLC.
+    
+    Clean cycles whose reads are fast relative to the period raise the rate
+    additively; a Job pending retry, a failed read or a slow read cuts it
+    multiplicatively. After a cut the rate holds for ADAPTIVE_HEALTHY_CYCLES
+    cycles, so one busy burst backs off once rather than on every retry.
+    """
+    
+    def __init__(self, period=CYCLE_TIME, min_period=MIN_CYCLE_TIME, max_period=MAX_CYCLE_TIME,
+                 enabled=ADAPTIVE_POLLING):
+        self.min_period = min_period
+        self.max_period = max_period
+        self.enabled = enabled
+        self.period = min(max(period, min_period), max_period)
+        self.reason = 'initial'
+        self.healthy = 0
+        self.changes = deque(maxlen=ADAPTIVE_HISTORY)  # (time, period, reason)
+        self.increases = 0
+        self.decreases = 0
+    
+    def update(self, busy_retries, failed, read_seconds):
+        """Feed one cycle's outcome; returns the period for the next cycle"""
+        if not self.enabled:
+            return self.period
+        if busy_retries or failed:
+            reason = f"{busy_retries} Job pending retr{'y' if busy_retries == 1 else 'ies'}" if busy_retries \
+                else "read failed"
+            self.back_off(reason)
+        elif read_seconds is not None and read_seconds > ADAPTIVE_SLOW_READ * self.period:
+            self.back_off(f"slow read {read_seconds * 1000:.0f} ms")
+        else:
+            self.healthy += 1
+            if self.healthy >= ADAPTIVE_HEALTHY_CYCLES and self.period > self.min_period:
+                rate = 1 / self.period + ADAPTIVE_RATE_STEP
+                period = max(1 / rate, self.min_period)
+                # Speed up only while the read still fits comfortably in the shorter period
+                if read_seconds is None or read_seconds <= ADAPTIVE_SLOW_READ * period / 2:
+                    self.increases += 1
+                    self.change(period, f"{self.healthy} clean cycles")
+                self.healthy = 0
+        return self.period
+    
+    def back_off(self, reason):
+        if self.healthy < 0:
+            self.healthy += 1  # still holding after the last cut
+            return
+        self.decreases += 1
+        self.change(min(self.period * ADAPTIVE_BACKOFF, self.max_period), reason)
+        self.healthy = -ADAPTIVE_HEALTHY_CYCLES
+    
+    def change(self, period, reason):
+        if period != self.period:
+            self.period = period
+            self.reason = reason
+            self.changes.append((time.time(), period, reason))
+    
+    def stats(self):
+        return {
+            'adaptive': self.enabled,
+            'cycle_ms': round(self.period * 1000, 1),
+            'rate_hz': round(1 / self.period, 3),
+            'min_cycle_ms': round(self.min_period * 1000, 1),
+            'max_cycle_ms': round(self.max_period * 1000, 1),
+            'reason': self.reason,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'changes': [{'timestamp': datetime.fromtimestamp(ts).isoformat(timespec='seconds'),
+                         'cycle_ms': round(period * 1000, 1), 'reason': reason}
+                        for ts, period, reason in list(self.changes)[-10:]]
+        }
+
+class PumpMonitor:
+    """Acquisition for one site: its own PLC client, poller thread and per-pump state.
+    
+    Monitors share nothing but the database writer and the rollup buffer, so a
+    slow or unreachable PLC only stalls its own site.
+    """
+    
+    def __init__(self, config):
+        self.site_id = config['site_id']
+        self.name = config['name']
+        self.plc_ip = config['plc_ip']
+        self.rack = config['rack']
+        self.slot = config['slot']
+        self.port = config['port']
+        self.pump_ids = SITE_PUMPS[self.site_id]
+        self.decoder = DB39Decoder(config['pumps'])
+        areas = config.get('areas') or [('pumps', config['db_number'], 0, self.decoder.size)]
         self.plc = snap7.client.Client()
         self.connected = False
         self.running = False
         self.lock = threading.Lock()  # Prevent concurrent PLC access
+        self.snapshot = Snapshot(MappingProxyType({"connected": False}), 0.0, 0)
+        self.read_plan = ReadPlan([tuple(area) for area in areas]).build(240)  # S7-1200 default until negotiated
+        self.areas = {}  # Raw bytes of every configured area from the last read
+        self.change_detector = ChangeDetector()
+        self.rate = AdaptiveRate()
+        self.cycle_stats = CycleStats(self.rate.period)
+        self.metrics = AcquisitionMetrics()
+        self.executor = None  # single thread for blocking snap7 calls, owned by monitor_loop
+        self.read_seconds = None  # duration of the last successful read, fed to the rate controller
+        self.frame_struct = binary_frame_struct(len(self.pump_ids))
+        self.live_window = LiveWindow(self.pump_ids, LIVE_WINDOW_CAPACITY)
+        self.bursts = BurstCapture(self.live_window)
+        self.kpis = KpiAccumulator(self.pump_ids)
+        # Track previous trip states to detect transitions
+        self.previous_trip_states = {pump_id: False for pump_id in self.pump_ids}
+        # Socket.IO rooms of the clients watching this site
+        self.json_room = f'{self.site_id}:json'
+        self.binary_room = f'{self.site_id}:binary'
+        self.pump_keys = {pump_id: tuple(pump_prefix(pump_id) + field for field in PUMP_FIELDS)
+                          for pump_id in self.pump_ids}
+        self.state_path = os.path.join(STATE_DIR, f'state-{self.site_id}.json')
+        self.state_mtime = None
+        self.shared_stats = {}
+        self.shared_metrics = None
         
     def connect(self):
         try:
             if self.plc.get_connected():
                 self.plc.disconnect()
-            self.plc.connect(PLC_IP, PLC_RACK, PLC_SLOT)
+            self.plc.connect(self.plc_ip, self.rack, self.slot, self.port)
             self.connected = True
-            print(f"✓ Connected to PLC at {PLC_IP}")
+            self.read_plan.build(self.plc.get_pdu_length())
+            print(f"✓ [{self.site_id}] Connected to PLC at {self.plc_ip} (PDU {self.read_plan.pdu_length} bytes, "
+                  f"{len(self.read_plan.requests)} request(s) per cycle)")
             return True
         except Exception as e:
-            print(f"✗ Connection failed: {e}")
+            print(f"✗ [{self.site_id}] Connection failed: {e}")
             self.connected = False
             return False
     
-    def reconnect(self):
+    async def reconnect(self):
         """Force reconnection to PLC"""
+        loop = asyncio.get_running_loop()
         try:
             if self.plc.get_connected():
-                self.plc.disconnect()
+                await loop.run_in_executor(self.executor, self.plc.disconnect)
         except:
             pass
-        time.sleep(0.5)
-        return self.connect()
+        await asyncio.sleep(0.5)
+        return await loop.run_in_executor(self.executor, self.connect)
     
-    def read_db39(self):
-        """Read data from DB39 with retry logic"""
+    def execute_read(self):
         with self.lock:  # Prevent concurrent access
-            for attempt in range(MAX_RETRIES):
-                try:
-                    # Read 70 bytes from DB39 starting at byte 0 (covers all pumps: LINE 3&5 UPS FAN COIL UNITS, CAN Line UPS Room AHU 1, GREENFIELD LV UPS ROOM, CAN LINE UPS ROOM AHU 2, LINE 7 BLOW MOULD SPARE, GREENFIELD LV UPS ROOM AHU & 2, LINE 7 BLOWMOULD)
-                    data = self.plc.db_read(DB_NUMBER, 0, 70)
-            
-                    # Parse Pump 1 data (LINE 3&5 UPS FAN COIL UNITS)
-                    alarm = get_bool(data, 0, 0)
-                    ready_yellow = get_bool(data, 0, 1)
-                    running_green = get_bool(data, 0, 2)
-                    trip_red = get_bool(data, 0, 3)
-                    pressure = get_real(data, 2)
-                    pressure_sp = get_real(data, 6)
-                    
-                    # Parse Pump 2 data (CAN Line UPS Room AHU 1)
-                    p2_ready_yellow = get_bool(data, 10, 0)
-                    p2_running_green = get_bool(data, 10, 1)
-                    p2_trip_red = get_bool(data, 10, 2)
-                    p2_pressure = get_real(data, 12)
-                    p2_pressure_sp = get_real(data, 16)
-                    
-                    # Parse Pump 3 data (GREENFIELD LV UPS ROOM)
-                    p3_ready_yellow = get_bool(data, 20, 0)
-                    p3_running_green = get_bool(data, 20, 1)
-                    p3_trip_red = get_bool(data, 20, 2)
-                    p3_pressure = get_real(data, 22)
-                    p3_pressure_sp = get_real(data, 26)
-                    
-                    # Parse Pump 4 data (CAN LINE UPS ROOM AHU 2, bit order: Ready=0, Trip=1, Running=2)
-                    p4_ready_yellow = get_bool(data, 30, 0)
-                    p4_trip_red = get_bool(data, 30, 1)
-                    p4_running_green = get_bool(data, 30, 2)
-                    p4_pressure = get_real(data, 32)
-                    p4_pressure_sp = get_real(data, 36)
-                    
-                    # Parse Pump 5 data (LINE 7 BLOW MOULD SPARE, bit order: Running=0, Ready=1, Trip=2)
-                    p5_running_green = get_bool(data, 40, 0)
-                    p5_ready_yellow = get_bool(data, 40, 1)
-                    p5_trip_red = get_bool(data, 40, 2)
-                    p5_pressure = get_real(data, 42)
-                    p5_pressure_sp = get_real(data, 46)
-                    
-                    # Parse Pump 6 data (GREENFIELD LV UPS ROOM AHU & 2, Ready=0, Running=1, Trip=2)
-                    p6_ready_yellow = get_bool(data, 50, 0)
-                    p6_running_green = get_bool(data, 50, 1)
-                    p6_trip_red = get_bool(data, 50, 2)
-                    p6_pressure = get_real(data, 52)
-                    p6_pressure_sp = get_real(data, 56)
-                    
-                    # Parse Pump 7 data (LINE 7 BLOWMOULD, Ready=0, Running=1, Trip=2)
-                    p7_ready_yellow = get_bool(data, 60, 0)
-                    p7_running_green = get_bool(data, 60, 1)
-                    p7_trip_red = get_bool(data, 60, 2)
-                    p7_pressure = get_real(data, 62)
-                    p7_pressure_sp = get_real(data, 66)
-                    
-                    # Mutually exclusive status logic
-                    status = "READY" if ready_yellow else ("RUNNING" if running_green else ("TRIP" if trip_red else "UNKNOWN"))
-                    p2_status = "READY" if p2_ready_yellow else ("RUNNING" if p2_running_green else ("TRIP" if p2_trip_red else "UNKNOWN"))
-                    p3_status = "READY" if p3_ready_yellow else ("RUNNING" if p3_running_green else ("TRIP" if p3_trip_red else "UNKNOWN"))
-                    p4_status = "READY" if p4_ready_yellow else ("RUNNING" if p4_running_green else ("TRIP" if p4_trip_red else "UNKNOWN"))
-                    p5_status = "READY" if p5_ready_yellow else ("RUNNING" if p5_running_green else ("TRIP" if p5_trip_red else "UNKNOWN"))
-                    p6_status = "READY" if p6_ready_yellow else ("RUNNING" if p6_running_green else ("TRIP" if p6_trip_red else "UNKNOWN"))
-                    p7_status = "READY" if p7_ready_yellow else ("RUNNING" if p7_running_green else ("TRIP" if p7_trip_red else "UNKNOWN"))
-                    
-                    return {
-                        "alarm": alarm,
-                        "ready_yellow": ready_yellow,
-                        "running_green": running_green,
-                        "trip_red": trip_red,
-                        "pressure": round(pressure, 2),
-                        "pressure_setpoint": round(pressure_sp, 2),
-                        "status": status,
-                        "p2_ready_yellow": p2_ready_yellow,
-                        "p2_running_green": p2_running_green,
-                        "p2_trip_red": p2_trip_red,
-                        "p2_pressure": round(p2_pressure, 2),
-                        "p2_pressure_setpoint": round(p2_pressure_sp, 2),
-                        "p2_status": p2_status,
-                        "p3_ready_yellow": p3_ready_yellow,
-                        "p3_running_green": p3_running_green,
-                        "p3_trip_red": p3_trip_red,
-                        "p3_pressure": round(p3_pressure, 2),
-                        "p3_pressure_setpoint": round(p3_pressure_sp, 2),
-                        "p3_status": p3_status,
-                        "p4_ready_yellow": p4_ready_yellow,
-                        "p4_running_green": p4_running_green,
-                        "p4_trip_red": p4_trip_red,
-                        "p4_pressure": round(p4_pressure, 2),
-                        "p4_pressure_setpoint": round(p4_pressure_sp, 2),
-                        "p4_status": p4_status,
-                        "p5_ready_yellow": p5_ready_yellow,
-                        "p5_running_green": p5_running_green,
-                        "p5_trip_red": p5_trip_red,
-                        "p5_pressure": round(p5_pressure, 2),
-                        "p5_pressure_setpoint": round(p5_pressure_sp, 2),
-                        "p5_status": p5_status,
-                        "p6_ready_yellow": p6_ready_yellow,
-                        "p6_running_green": p6_running_green,
-                        "p6_trip_red": p6_trip_red,
-                        "p6_pressure": round(p6_pressure, 2),
-                        "p6_pressure_setpoint": round(p6_pressure_sp, 2),
-                        "p6_status": p6_status,
-                        "p7_ready_yellow": p7_ready_yellow,
-                        "p7_running_green": p7_running_green,
-                        "p7_trip_red": p7_trip_red,
-                        "p7_pressure": round(p7_pressure, 2),
-                        "p7_pressure_setpoint": round(p7_pressure_sp, 2),
-                        "p7_status": p7_status,
-                        "connected": True
-                    }
-                except Exception as e:
-                    error_msg = str(e)
-                    # Handle "Job pending" error - PLC is busy, wait and retry
-                    if isinstance(e.args[0], bytes) and b'Job pending' in e.args[0]:
-                        print(f"⚠ PLC busy (attempt {attempt + 1}/{MAX_RETRIES}), retrying...")
-                        time.sleep(RETRY_DELAY)
-                        continue
-                    elif 'Job pending' in error_msg:
-                        print(f"⚠ PLC busy (attempt {attempt + 1}/{MAX_RETRIES}), retrying...")
-                        time.sleep(RETRY_DELAY)
-                        continue
-                    # Handle connection errors - reconnect
-                    elif 'Unreachable' in error_msg or 'TCP' in error_msg or not self.plc.get_connected():
-                        print(f"⚠ Connection lost, reconnecting...")
-                        self.connected = False
-                        self.reconnect()
-                        time.sleep(RETRY_DELAY)
-                        continue
-                    else:
-                        print(f"Read error: {e}")
-                        break
-            
-            # All retries failed, return error state
-            print(f"✗ Failed to read PLC after {MAX_RETRIES} attempts")
-            self.connected = False
-            return {
-                "alarm": False,
-                "ready_yellow": False,
-                "running_green": False,
-                "trip_red": False,
-                "pressure": 0.0,
-                "pressure_setpoint": 0.0,
-                "status": "ERROR",
-                "p2_ready_yellow": False,
-                "p2_running_green": False,
-                "p2_trip_red": False,
-                "p2_pressure": 0.0,
-                "p2_pressure_setpoint": 0.0,
-                "p2_status": "ERROR",
-                "p3_ready_yellow": False,
-                "p3_running_green": False,
-                "p3_trip_red": False,
-                "p3_pressure": 0.0,
-                "p3_pressure_setpoint": 0.0,
-                "p3_status": "ERROR",
-                "p4_ready_yellow": False,
-                "p4_running_green": False,
-                "p4_trip_red": False,
-                "p4_pressure": 0.0,
-                "p4_pressure_setpoint": 0.0,
-                "p4_status": "ERROR",
-                "p5_ready_yellow": False,
-                "p5_running_green": False,
-                "p5_trip_red": False,
-                "p5_pressure": 0.0,
-                "p5_pressure_setpoint": 0.0,
-                "p5_status": "ERROR",
-                "p6_ready_yellow": False,
-                "p6_running_green": False,
-                "p6_trip_red": False,
-                "p6_pressure": 0.0,
-                "p6_pressure_setpoint": 0.0,
-                "p6_status": "ERROR",
-                "p7_ready_yellow": False,
-                "p7_running_green": False,
-                "p7_trip_red": False,
-                "p7_pressure": 0.0,
-                "p7_pressure_setpoint": 0.0,
-                "p7_status": "ERROR",
-                "connected": False
-            }
+            return self.read_plan.execute(self.plc)
     
-    def monitor_loop(self):
-        """Continuous monitoring loop"""
-        log_counter = 0
+    async def read_db39(self):
+        """Read all configured areas with retry logic and decode the pump block"""
+        # snap7 calls block, so they run on the single PLC executor thread; waits between
+        # retries are asyncio sleeps and never hold up the cycle schedule.
+        loop = asyncio.get_running_loop()
+        for attempt in range(MAX_RETRIES):
+            try:
+                started = time.perf_counter()
+                self.metrics.count('reads')
+                self.areas = await loop.run_in_executor(self.executor, self.execute_read)
+                read_done = time.perf_counter()
+                self.read_seconds = read_done - started
+                self.metrics.observe('plc_read', self.read_seconds)
+                data = self.decoder.decode(self.areas['pumps'])
+                self.metrics.observe('decode', time.perf_counter() - read_done)
+                return data
+            except Exception as e:
+                error_msg = str(e)
+                self.metrics.count('read_errors')
+                # Handle "Job pending" error - PLC is busy, wait and retry
+                if e.args and isinstance(e.args[0], bytes) and b'Job pending' in e.args[0]:
+                    print(f"⚠ [{self.site_id}] PLC busy (attempt {attempt + 1}/{MAX_RETRIES}), retrying...")
+                    self.metrics.count('busy_retries')
+                    await asyncio.sleep(RETRY_DELAY)
+                    continue
+                elif 'Job pending' in error_msg:
+                    print(f"⚠ [{self.site_id}] PLC busy (attempt {attempt + 1}/{MAX_RETRIES}), retrying...")
+                    self.metrics.count('busy_retries')
+                    await asyncio.sleep(RETRY_DELAY)
+                    continue
+                # Handle connection errors - reconnect
+                elif 'Unreachable' in error_msg or 'TCP' in error_msg or not self.plc.get_connected():
+                    print(f"⚠ [{self.site_id}] Connection lost, reconnecting...")
+                    self.metrics.count('reconnects')
+                    self.connected = False
+                    await self.reconnect()
+                    await asyncio.sleep(RETRY_DELAY)
+                    continue
+                else:
+                    print(f"[{self.site_id}] Read error: {e}")
+                    break
+        
+        # All retries failed, return error state
+        print(f"✗ [{self.site_id}] Failed to read PLC after {MAX_RETRIES} attempts")
+        self.metrics.count('failed_cycles')
+        self.connected = False
+        return self.decoder.error_state()
+    
+    def publish(self, data):
+        """Replace the shared snapshot with a new frozen copy of data"""
+        # A single attribute assignment is atomic, so readers never need the PLC lock
+        self.snapshot = Snapshot(MappingProxyType(dict(data)), time.time(), self.snapshot.sequence + 1)
+        if MESSAGE_QUEUE:
+            self.write_state()
+        return self.snapshot
+    
+    def write_state(self):
+        """Share the latest snapshot and poller stats with the web worker processes"""
+        snapshot = self.snapshot
+        state = {'data': dict(snapshot.data), 'timestamp': snapshot.timestamp, 'sequence': snapshot.sequence,
+                 'cycle_stats': self.local_stats(), 'metrics': self.metrics.snapshot()}
+        try:
+            with open(self.state_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(self.state_path + '.tmp', self.state_path)
+        except OSError as e:
+            print(f"⚠ [{self.site_id}] Could not write shared state: {e}")
+    
+    def shared_snapshot(self):
+        """Snapshot last written by the poller process (re-read only when the file changes)"""
+        try:
+            mtime = os.stat(self.state_path).st_mtime_ns
+            if mtime != self.state_mtime:
+                with open(self.state_path, encoding='utf-8') as f:
+                    state = json.load(f)
+                self.snapshot = Snapshot(MappingProxyType(state['data']), state['timestamp'], state['sequence'])
+                self.shared_stats = state['cycle_stats']
+                self.shared_metrics = state['metrics']
+                self.state_mtime = mtime
+        except (OSError, ValueError, KeyError):
+            pass
+        return self.snapshot
+    
+    def polled_elsewhere(self):
+        """True in web workers, whose data comes from the poller process"""
+        return bool(MESSAGE_QUEUE) and not self.running
+    
+    def is_connected(self):
+        if self.polled_elsewhere():
+            return bool(self.shared_snapshot().data.get('connected'))
+        return self.connected
+    
+    def poller_stats(self):
+        if self.polled_elsewhere():
+            self.shared_snapshot()
+            return self.shared_stats
+        return self.local_stats()
+    
+    def local_stats(self):
+        stats = self.cycle_stats.stats()
+        stats['rate'] = self.rate.stats()
+        return stats
+    
+    def metrics_snapshot(self):
+        """Counters and stage histograms, from the poller process when polled elsewhere"""
+        if self.polled_elsewhere():
+            self.shared_snapshot()
+            return self.shared_metrics or AcquisitionMetrics().snapshot()
+        return self.metrics.snapshot()
+    
+    def get_status(self):
+        """Last published pump data plus snapshot age and sequence number"""
+        snapshot = self.shared_snapshot() if self.polled_elsewhere() else self.snapshot
+        data = dict(snapshot.data)
+        data['sequence'] = snapshot.sequence
+        data['snapshot_age'] = round(time.time() - snapshot.timestamp, 3) if snapshot.sequence else None
+        return data
+    
+    def process(self, data):
+        """Publish, broadcast and log one cycle's data"""
+        self.publish(data)
+        status = self.get_status()
+        # The change detector sees every cycle; payloads are only built for rooms with members
+        started = time.perf_counter()
+        event, payload = self.change_detector.update(status)
+        emits = 0
+        if subscriptions.has(self.json_room):
+            socketio.emit(event, payload, to=self.json_room)
+            emits += 1
+        for pump_id in self.pump_ids:
+            if subscriptions.has(pump_room(pump_id)):
+                socketio.emit(event, self.pump_payload(payload, pump_id), to=pump_room(pump_id))
+                emits += 1
+        if BINARY_FRAMES_ENABLED and subscriptions.has(self.binary_room):
+            socketio.emit('pump_frame', self.binary_frame(status), to=self.binary_room)
+            emits += 1
+        emitted = time.perf_counter()
+        self.metrics.observe('emit', emitted - started)
+        self.metrics.count('emits', emits)
+        
+        # Log events and pressure data; a trip edge opens a burst capture
+        ts = self.snapshot.timestamp
+        for pump_id, event_code, *_ in log_events(data, self.previous_trip_states, self.site_id, ts):
+            if event_code == EVENT_CODES['TRIP']:
+                self.bursts.trigger(pump_id, ts)
+        
+        # Full-rate ring buffer, compressed raw chunks and rollups
+        self.live_window.append(data, ts)
+        self.bursts.update(ts)
+        pressure_chunks.add(data, ts, self.pump_ids)
+        pressure_rollups.add(data, ts, self.pump_ids)
+        self.kpis.add(data, ts)
+        self.metrics.observe('db_write', time.perf_counter() - emitted)
+    
+    def pump_payload(self, data, pump_id):
+        """One pump's fields of a pump_data dict or delta, plus the frame metadata"""
+        payload = {key: data[key] for key in self.pump_keys[pump_id] if key in data}
+        for key in ('connected',) + ChangeDetector.META_KEYS:
+            if key in data:
+                payload[key] = data[key]
+        payload['pump_id'] = pump_id
+        return payload
+    
+    def binary_frame(self, status=None):
+        return encode_binary_frame(status or self.get_status(), self.pump_ids, self.frame_struct)
+    
+    async def poll(self):
+        """Acquisition loop paced on a monotonic deadline schedule"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
         while self.running:
+            started = loop.time()
+            self.cycle_stats.cycle_started(started, deadline)
+            
             if not self.connected:
-                self.connect()
+                await loop.run_in_executor(self.executor, self.connect)
+                if not self.connected:
+                    self.publish({"connected": False})
             
             if self.connected:
-                data = self.read_db39()
-                socketio.emit('pump_data', data)
-                
-                # Log events and pressure data
-                log_events(data)
-                
-                # Log pressure history every 60 cycles (30 seconds)
-                log_counter += 1
-                if log_counter >= 60:
-                    log_pressure_history(data)
-                    log_counter = 0
+                busy, failed = self.metrics.counters['busy_retries'], self.metrics.counters['failed_cycles']
+                self.read_seconds = None
+                bursting = self.bursts.period(self.rate) < self.rate.period
+                data = await self.read_db39()
+                self.process(data)
+                busy = self.metrics.counters['busy_retries'] - busy
+                failed = self.metrics.counters['failed_cycles'] > failed
+                self.bursts.read_outcome(busy, failed)
+                # Fast burst cycles are not evidence of an idle PLC; only their failures count
+                if not bursting or busy or failed:
+                    self.adapt_rate(busy, failed)
             
-            time.sleep(CYCLE_TIME)
+            self.cycle_stats.cycle_finished(loop.time() - started)
+            
+            # Next slot on the grid; slots already missed by a slow cycle are skipped
+            # rather than run back to back, so the sample rate never bursts to catch up
+            period = self.bursts.period(self.rate)
+            deadline += period
+            now = loop.time()
+            if now > deadline:
+                missed = int((now - deadline) // period) + 1
+                self.cycle_stats.missed += missed
+                deadline += missed * period
+            await asyncio.sleep(deadline - now)
+    
+    def adapt_rate(self, busy_retries, failed):
+        """Let the AIMD controller pick the next cycle's period from this cycle's read"""
+        previous = self.rate.period
+        period = self.rate.update(busy_retries, failed, self.read_seconds)
+        if period != previous:
+            self.cycle_stats.target = period
+            symbol = '✓' if period < previous else '⚠'
+            print(f"{symbol} [{self.site_id}] Poll period {previous * 1000:.0f} -> {period * 1000:.0f} ms "
+                  f"({self.rate.reason})")
+    
+    def monitor_loop(self):
+        """Run the acquisition loop on this thread's own event loop"""
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='plc') as self.executor:
+            asyncio.run(self.poll())
+    
+    def start(self):
+        if MESSAGE_QUEUE:
+            os.makedirs(STATE_DIR, exist_ok=True)
+        self.running = True
+        self.start_time = time.time()
+        db_writer.start()
+        self.monitor_thread = threading.Thread(target=self.monitor_loop, name=f'monitor-{self.site_id}', daemon=True)
+        self.monitor_thread.start()
+    
+    def stop(self):
+        self.running = False
+        if hasattr(self, 'monitor_thread'):
+            self.monitor_thread.join(MAX_CYCLE_TIME + MAX_RETRIES * RETRY_DELAY + 1)
+        self.bursts.update(time.time(), force=True)
+        self.kpis.flush()
+        if self.connected:
+            self.plc.disconnect()
+
+def log_events(data, previous_trip_states, site_id=DEFAULT_SITE_ID, ts=None):
+    """Log trip events of one site's pumps, stamped with the snapshot time `ts`; returns the event rows"""
+    trip_states = {pump_id: data.get(pump_prefix(pump_id) + 'trip_red', False) for pump_id in previous_trip_states}
+    
+    pressures = {
+        pump_id: (data.get(pump_prefix(pump_id) + 'pressure', 0), data.get(pump_prefix(pump_id) + 'pressure_setpoint', 0))
+        for pump_id in previous_trip_states
+    }
+    
+    ts = time.time() if ts is None else ts
+    timestamp, ms = db_timestamp(ts), event_ms(ts)
+    rows = []
+    for pump_id in previous_trip_states:
+        current_trip = trip_states[pump_id]
+        previous_trip = previous_trip_states[pump_id]
+        
+        # Detect trip event (transition from False to True)
+        if current_trip and not previous_trip:
+            rows.append((pump_id, EVENT_CODES['TRIP'], timestamp, *pressures[pump_id], ms))
+        
+        # Detect trip cleared (transition from True to False)
+        elif not current_trip and previous_trip:
+            rows.append((pump_id, EVENT_CODES['TRIP_CLEARED'], timestamp, *pressures[pump_id], ms))
+        
+        previous_trip_states[pump_id] = current_trip
+    
+    # Names and sites come from the pumps table through the trip_events view
+    db_writer.submit('''
+        INSERT INTO trip_event_log (pump_id, event_code, timestamp, pressure, pressure_setpoint, event_ms)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return rows
+
+def pump_realtime(data, pump_id):
+    """Real-time values for one pump from a pump_data dict"""
+    prefix = pump_prefix(pump_id)
+    return {
+        'pressure': data.get(prefix + 'pressure', 0),
+        'setpoint': data.get(prefix + 'pressure_setpoint', 0),
+        'is_ready': data.get(prefix + 'ready_yellow', False),
+        'is_running': data.get(prefix + 'running_green', False),
+        'is_trip': data.get(prefix + 'trip_red', False)
+    }
+
+def site_filter(site_id):
+    """' AND pump_id IN (...)' clause limiting a query to one site's pumps, and its parameters"""
+    if not site_id:
+        return '', []
+    pump_ids = SITE_PUMPS[site_id]
+    return f" AND pump_id IN ({', '.join('?' * len(pump_ids))})", list(pump_ids)
+
+def trip_events_filter(pump_id=None, start_date=None, end_date=None, site_id=None):
+    """WHERE clause and parameters shared by the trip event list, count and PDF queries"""
+    where, params = site_filter(site_id)
+    where = "WHERE 1=1" + where
+    if pump_id:
+        where += " AND pump_id = ?"
+        params.append(pump_id)
+    if start_date:
+        where += " AND timestamp >= ?"
+        params.append(start_date)
+    if end_date:
+        where += " AND timestamp <= ?"
+        params.append(end_date + " 23:59:59")
+    return where, params
+
+# Event columns plus the duration of the trip interval the event opened or closed.
+# The lookups only run for the rows of the page being returned.
+TRIP_EVENT_COLUMNS = '''
+    trip_events.*,
+    COALESCE(
+        (SELECT duration_seconds FROM trip_intervals WHERE trip_intervals.trip_event_id = trip_events.id),
+        (SELECT duration_seconds FROM trip_intervals WHERE trip_intervals.clear_event_id = trip_events.id)
+    ) AS duration_seconds,
+    (SELECT end_time IS NULL FROM trip_intervals WHERE trip_intervals.trip_event_id = trip_events.id) AS trip_active
+'''
+
+def trip_events_query(pump_id=None, start_date=None, end_date=None, after=None, limit=TRIP_EVENTS_PAGE_SIZE,
+                      site_id=None):
+    """One page of events, newest first; `after` is the (timestamp, id) key of the previous page's last row"""
+    if not after:
+        where, params = trip_events_filter(pump_id, start_date, end_date, site_id)
+    else:
+        # Keyset condition on the (timestamp, id) sort key. A single "timestamp <= ?" upper
+        # bound lets the index seek straight to the cursor, so cost is independent of page depth.
+        where, params = trip_events_filter(pump_id, start_date, None, site_id)
+        upper = min(after[0], end_date + " 23:59:59") if end_date else after[0]
+        where += " AND timestamp <= ? AND (timestamp < ? OR id < ?)"
+        params += [upper, after[0], after[1]]
+    return "SELECT " + TRIP_EVENT_COLUMNS + " FROM trip_events " + where + " ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit]
+
+def trip_count_query(pump_id=None, start_date=None, end_date=None, site_id=None):
+    """Total trips from the trigger-maintained daily counters (day granularity)"""
+    query, params = site_filter(site_id)
+    query = "SELECT COALESCE(SUM(trips), 0) as total FROM trip_daily_counts WHERE 1=1" + query
+    if pump_id:
+        query += " AND pump_id = ?"
+        params.append(pump_id)
+    if start_date:
+        query += " AND day >= ?"
+        params.append(start_date[:10])
+    if end_date:
+        query += " AND day <= ?"
+        params.append(end_date[:10])
+    return query, params
+
+def trip_intervals_query(pump_id=None, start_date=None, end_date=None, site_id=None):
+    query, params = site_filter(site_id)
+    query = "SELECT * FROM trip_intervals WHERE 1=1" + query
+    if pump_id:
+        query += " AND pump_id = ?"
+        params.append(pump_id)
+    if start_date:
+        query += " AND start_time >= ?"
+        params.append(start_date)
+    if end_date:
+        query += " AND start_time <= ?"
+        params.append(end_date + " 23:59:59")
+    return query + " ORDER BY start_time DESC LIMIT ?", params + [TRIP_EVENTS_MAX_PAGE_SIZE]
+
+def format_duration(seconds):
+    """Human-readable duration such as '2h 05m', '3m 12s' or '45s'"""
+    seconds = int(round(seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+def encode_page_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row['timestamp'], row['id']]).encode()).decode()
+
+def decode_page_cursor(token):
+    """(timestamp, id) from a next_cursor token; raises ValueError if malformed"""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return str(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+def report_events_query(pump_id=None, start_date=None, end_date=None):
+    where, params = trip_events_filter(pump_id, start_date, end_date)
+    return "SELECT * FROM trip_events " + where + " ORDER BY timestamp DESC, id DESC", params
+
+def rollup_history_query(tier, cutoff_bucket, pump_id=None, site_id=None):
+    query, params = site_filter(site_id)
+    query = '''
+        SELECT pump_id, bucket, pressure_sum / samples AS pressure, pressure_min, pressure_max,
+               pressure_last, setpoint_last AS pressure_setpoint, samples
+        FROM pressure_rollups WHERE tier = ? AND bucket >= ?
+    ''' + query
+    params = [tier, cutoff_bucket] + params
+    if pump_id:
+        query += " AND pump_id = ?"
+        params.append(pump_id)
+    return query + " ORDER BY bucket DESC", params
+
+def zoom_interval(hours, interval):
+    """Thinning interval for a chunk zoom: the one asked for, widened to fit MAX_HISTORY_POINTS"""
+    return max(interval, MIN_HISTORY_INTERVAL, hours * 3600 / MAX_HISTORY_POINTS)
+
+def choose_history_tier(hours, interval=None, pump_id=None):
+    """Finest tier whose row count for `hours` fits MAX_HISTORY_POINTS; None means decoding
+    raw chunks, which only a single-pump zoom finer than the smallest tier gets"""
+    span = hours * 3600
+    if (pump_id and interval is not None and hours <= RAW_RETENTION_HOURS
+            and zoom_interval(hours, interval) < min(ROLLUP_TIERS)):
+        return None
+    for tier in sorted(ROLLUP_TIERS):
+        retention = ROLLUP_TIERS[tier]
+        if (span / tier <= MAX_HISTORY_POINTS and tier >= (interval or 0)
+                and (retention is None or hours <= retention)):
+            return tier
+    return max(ROLLUP_TIERS)
+
+def pump_trip_stats_query():
+    """24 h trip count and last trip time for every pump in one statement"""
+    # Correlated subqueries keep each lookup an index seek, so cost stays flat as history grows
+    pumps = ', '.join(f'({pump_id})' for pump_id in PUMP_NAMES)
+    trip = EVENT_CODES['TRIP']
+    return f'''
+        WITH configured(pump_id) AS (VALUES {pumps})
+        SELECT configured.pump_id,
+            (SELECT COUNT(*) FROM trip_event_log
+             WHERE trip_event_log.pump_id = configured.pump_id AND event_code = {trip}
+             AND timestamp >= datetime('now', '-24 hours')) AS trip_count,
+            (SELECT MAX(timestamp) FROM trip_event_log
+             WHERE trip_event_log.pump_id = configured.pump_id AND event_code = {trip}) AS last_trip
+        FROM configured
+    '''
+
+def route_query_samples():
+    """(route, sql, params) for each query the report routes issue, for plan checks"""
+    day, week = '2024-01-07', '2024-01-01'
+    return [
+        ('/api/trip-events', *trip_events_query(1, week, day)),
+        ('/api/trip-events (all pumps)', *trip_events_query(None, week, day)),
+        ('/api/trip-events next page', *trip_events_query(1, week, day, (day + ' 12:00:00', 100))),
+        ('/api/trip-events next page (all pumps)', *trip_events_query(None, week, day, (day + ' 12:00:00', 100))),
+        ('/api/trip-events count', *trip_count_query(1, week, day)),
+        ('/api/trip-events count (all pumps)', *trip_count_query(None, week, day)),
+        ('/api/trip-intervals', *trip_intervals_query(1, week, day)),
+        ('/api/trip-intervals (all pumps)', *trip_intervals_query(None, week, day)),
+        ('/api/kpis', *kpi_query(1, week, day, 'week')),
+        ('/api/kpis (all pumps)', *kpi_query(None, week, day, 'month')),
+        ('/api/pressure-history', *pressure_chunks_query(1704067200000, 1704585600000, 1)),
+        ('/api/pressure-history (all pumps)', *pressure_chunks_query(1704067200000, 1704585600000)),
+        ('/api/pressure-history (site)', *pressure_chunks_query(1704067200000, 1704585600000, None, DEFAULT_SITE_ID)),
+        ('/api/pressure-history rollups', *rollup_history_query(900, 1704067200, 1)),
+        ('/api/pressure-history rollups (all pumps)', *rollup_history_query(900, 1704067200)),
+        ('/api/trip-events (site)', *trip_events_query(None, week, day, site_id=DEFAULT_SITE_ID)),
+        ('/api/kpis (site)', *kpi_query(None, week, day, 'week', DEFAULT_SITE_ID)),
+        ('/api/pressure-history rollups (site)', *rollup_history_query(900, 1704067200, None, DEFAULT_SITE_ID)),
+        ('/api/pump-health', pump_trip_stats_query(), ()),
+        ('/api/generate-pdf', *report_events_query(1, week, day)),
+        ('/api/generate-pdf (all pumps)', *report_events_query(None, week, day)),
+    ]
+
+# Initialize database on startup
+init_database()
+
+# One monitor per registered site
+monitors = {config['site_id']: PumpMonitor(config) for config in SITE_CONFIGS}
+
+def start_monitors():
+    for site_monitor in monitors.values():
+        site_monitor.start()
+
+class PollerLeader:
+    """Exclusive lock on POLLER_LOCK_PATH held by the one process that polls the PLCs.
     
-    def start(self):
-        self.running = True
-        self.start_time = time.time()
-        self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
-        self.monitor_thread.start()
+    The OS releases the lock when its holder exits, so a standby process takes
+    over within POLLER_LEADER_RETRY seconds.
+    """
     
-    def stop(self):
-        self.running = False
-        if self.connected:
-            self.plc.disconnect()
-
-def log_events(data):
-    """Log trip events to database"""
-    global previous_trip_states
-    
-    trip_states = {
-        1: data.get('trip_red', False),
-        2: data.get('p2_trip_red', False),
-        3: data.get('p3_trip_red', False),
-        4: data.get('p4_trip_red', False),
-        5: data.get('p5_trip_red', False),
-        6: data.get('p6_trip_red', False),
-        7: data.get('p7_trip_red', False)
-    }
+    def __init__(self, path=POLLER_LOCK_PATH):
+        self.path = path
+        self.fd = None
     
-    pressures = {
-        1: (data.get('pressure', 0), data.get('pressure_setpoint', 0)),
-        2: (data.get('p2_pressure', 0), data.get('p2_pressure_setpoint', 0)),
-        3: (data.get('p3_pressure', 0), data.get('p3_pressure_setpoint', 0)),
-        4: (data.get('p4_pressure', 0), data.get('p4_pressure_setpoint', 0)),
-        5: (data.get('p5_pressure', 0), data.get('p5_pressure_setpoint', 0)),
-        6: (data.get('p6_pressure', 0), data.get('p6_pressure_setpoint', 0)),
-        7: (data.get('p7_pressure', 0), data.get('p7_pressure_setpoint', 0))
-    }
+    def try_acquire(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
     
-    try:
-        conn = sqlite3.connect('pump_events.db')
-        cursor = conn.cursor()
+    def lead(self):
+        """Start the monitors now if the lock is free, otherwise from a standby thread once it is"""
+        if self.try_acquire():
+            start_monitors()
+            return True
+        print(f"⚠ Another process holds {self.path} and polls the PLCs; standing by")
         
-        for pump_id in range(1, 8):
-            current_trip = trip_states[pump_id]
-            previous_trip = previous_trip_states[pump_id]
-            
-            # Detect trip event (transition from False to True)
-            if current_trip and not previous_trip:
-                cursor.execute('''
-                    INSERT INTO trip_events (pump_id, pump_name, event_type, pressure, pressure_setpoint)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (pump_id, PUMP_NAMES[pump_id], 'TRIP', pressures[pump_id][0], pressures[pump_id][1]))
-            
-            # Detect trip cleared (transition from True to False)
-            elif not current_trip and previous_trip:
-                cursor.execute('''
-                    INSERT INTO trip_events (pump_id, pump_name, event_type, pressure, pressure_setpoint)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (pump_id, PUMP_NAMES[pump_id], 'TRIP_CLEARED', pressures[pump_id][0], pressures[pump_id][1]))
-            
-            previous_trip_states[pump_id] = current_trip
+        def standby():
+            while not self.try_acquire():
+                time.sleep(POLLER_LEADER_RETRY)
+            print(f"✓ Took over the PLC poller (pid {os.getpid()})")
+            start_monitors()
         
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Database error: {e}")
+        threading.Thread(target=standby, name='poller-standby', daemon=True).start()
+        return False
 
-def log_pressure_history(data):
-    """Log pressure readings for health monitoring"""
-    try:
-        conn = sqlite3.connect('pump_events.db')
-        cursor = conn.cursor()
-        
-        pump_data = [
-            (1, data.get('pressure', 0), data.get('pressure_setpoint', 0), data.get('status', 'UNKNOWN')),
-            (2, data.get('p2_pressure', 0), data.get('p2_pressure_setpoint', 0), data.get('p2_status', 'UNKNOWN')),
-            (3, data.get('p3_pressure', 0), data.get('p3_pressure_setpoint', 0), data.get('p3_status', 'UNKNOWN')),
-            (4, data.get('p4_pressure', 0), data.get('p4_pressure_setpoint', 0), data.get('p4_status', 'UNKNOWN')),
-            (5, data.get('p5_pressure', 0), data.get('p5_pressure_setpoint', 0), data.get('p5_status', 'UNKNOWN')),
-            (6, data.get('p6_pressure', 0), data.get('p6_pressure_setpoint', 0), data.get('p6_status', 'UNKNOWN')),
-            (7, data.get('p7_pressure', 0), data.get('p7_pressure_setpoint', 0), data.get('p7_status', 'UNKNOWN'))
-        ]
-        
-        for pump_id, pressure, setpoint, status in pump_data:
-            cursor.execute('''
-                INSERT INTO pressure_history (pump_id, pump_name, pressure, pressure_setpoint, status)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (pump_id, PUMP_NAMES[pump_id], pressure, setpoint, status))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Pressure logging error: {e}")
+poller_leader = PollerLeader()
 
-# Global monitor instance
-monitor = PumpMonitor()
+def stop_monitors():
+    for site_monitor in monitors.values():
+        site_monitor.stop()
+    pressure_rollups.flush()
+    pressure_chunks.flush()
+    db_writer.stop()
+    report_jobs.shutdown()
+
+def combined_status(site_id=None):
+    """Latest values of one site's pumps, or of every connected site merged (pump keys are unique)"""
+    data = {}
+    for site_monitor in ([monitors[site_id]] if site_id else monitors.values()):
+        if site_monitor.is_connected():
+            data.update(site_monitor.get_status())
+    return data
 
 @app.route('/')
 def index():
@@ -442,56 +2651,164 @@ def index():
 def reports():
     return REPORTS_TEMPLATE
 
+@app.route('/api/sites')
+def get_sites():
+    return jsonify([{
+        'site_id': site_monitor.site_id,
+        'name': site_monitor.name,
+        'plc_ip': site_monitor.plc_ip,
+        'connected': site_monitor.is_connected(),
+        'pumps': [{'pump_id': pump_id, 'name': PUMP_NAMES[pump_id]} for pump_id in site_monitor.pump_ids]
+    } for site_monitor in monitors.values()])
+
 @app.route('/api/status')
 def get_status():
-    if monitor.connected:
-        return jsonify(monitor.read_db39())
-    return jsonify({"connected": False})
+    site_id = request.args.get('site', DEFAULT_SITE_ID)
+    if site_id not in monitors:
+        return jsonify({"error": "unknown site"}), 404
+    return jsonify(monitors[site_id].get_status())
+
+@app.route('/api/poller')
+def get_poller_stats():
+    site_id = request.args.get('site', DEFAULT_SITE_ID)
+    if site_id not in monitors:
+        return jsonify({"error": "unknown site"}), 404
+    return jsonify(monitors[site_id].poller_stats())
+
+@app.route('/api/subscriptions')
+def get_subscriptions():
+    """Clients per Socket.IO room"""
+    return jsonify(subscriptions.counts())
+
+@app.route('/api/db-writer')
+def get_db_writer_stats():
+    return jsonify(db_writer.stats())
+
+def metric_labels(**labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in labels.items()) + '}'
+
+def metric_histogram(lines, name, snapshot, **labels):
+    """Append one histogram series (cumulative buckets, sum, count) to lines"""
+    cumulative = 0
+    for bound, count in zip(METRICS_BUCKETS + ('+Inf',), snapshot['counts']):
+        cumulative += count
+        lines.append(f"{name}_bucket{metric_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_sum{metric_labels(**labels)} {snapshot['sum']:.6f}")
+    lines.append(f"{name}_count{metric_labels(**labels)} {cumulative}")
+
+METRIC_HELP = {
+    'pump_plc_connected': ('gauge', "1 while the site's PLC connection is up"),
+    'pump_acquisition_cycles_total': ('counter', "Acquisition cycles started"),
+    'pump_acquisition_missed_cycles_total': ('counter', "Cycle slots skipped because a cycle overran"),
+    'pump_acquisition_overruns_total': ('counter', "Cycles whose work took longer than the cycle time"),
+    'pump_plc_reads_total': ('counter', "PLC read attempts"),
+    'pump_plc_read_errors_total': ('counter', "PLC read attempts that raised"),
+    'pump_plc_busy_retries_total': ('counter', "Retries after a Job pending response"),
+    'pump_plc_reconnects_total': ('counter', "Reconnects after a lost connection"),
+    'pump_plc_failed_cycles_total': ('counter', "Cycles that gave up after MAX_RETRIES attempts"),
+    'pump_socket_emits_total': ('counter', "Socket.IO room emits"),
+    'pump_poll_period_seconds': ('gauge', "Current adaptive PLC poll period"),
+    'pump_poll_rate_changes_total': ('counter', "Adaptive poll rate changes by direction"),
+    'pump_cycle_stage_seconds': ('histogram', "Time per cycle spent in each acquisition stage"),
+    'pump_db_commit_seconds': ('histogram', "SQLite batch commit time"),
+    'pump_db_queue_depth': ('gauge', "Row batches waiting for the database writer"),
+    'pump_db_queue_capacity': ('gauge', "Database writer queue size"),
+    'pump_db_rows_written_total': ('counter', "Rows committed"),
+    'pump_db_rows_dropped_total': ('counter', "Rows dropped because the writer queue was full"),
+    'pump_db_errors_total': ('counter', "Failed database commits"),
+    'pump_socket_clients': ('gauge', "Connected Socket.IO clients in this process"),
+    'pump_socket_room_members': ('gauge', "Clients per Socket.IO room"),
+    'pump_report_jobs': ('gauge', "Report jobs per status"),
+}
+
+def metrics_text():
+    """Prometheus text exposition of the acquisition, database, socket and report metrics"""
+    series = {name: [] for name in METRIC_HELP}
+    for site_monitor in monitors.values():
+        site = site_monitor.site_id
+        stats = site_monitor.poller_stats()
+        snapshot = site_monitor.metrics_snapshot()
+        counters = snapshot['counters']
+        series['pump_plc_connected'].append(f"pump_plc_connected{metric_labels(site=site)} "
+                                            f"{int(site_monitor.is_connected())}")
+        for name, value in (('pump_acquisition_cycles_total', stats.get('cycles', 0)),
+                            ('pump_acquisition_missed_cycles_total', stats.get('missed_cycles', 0)),
+                            ('pump_acquisition_overruns_total', stats.get('overruns', 0)),
+                            ('pump_plc_reads_total', counters['reads']),
+                            ('pump_plc_read_errors_total', counters['read_errors']),
+                            ('pump_plc_busy_retries_total', counters['busy_retries']),
+                            ('pump_plc_reconnects_total', counters['reconnects']),
+                            ('pump_plc_failed_cycles_total', counters['failed_cycles']),
+                            ('pump_socket_emits_total', counters['emits'])):
+            series[name].append(f"{name}{metric_labels(site=site)} {value}")
+        rate = stats.get('rate')
+        if rate:
+            series['pump_poll_period_seconds'].append(f"pump_poll_period_seconds{metric_labels(site=site)} "
+                                                      f"{rate['cycle_ms'] / 1000}")
+            for direction, key in (('up', 'increases'), ('down', 'decreases')):
+                series['pump_poll_rate_changes_total'].append(
+                    f"pump_poll_rate_changes_total{metric_labels(site=site, direction=direction)} {rate[key]}")
+        for stage, histogram in snapshot['histograms'].items():
+            metric_histogram(series['pump_cycle_stage_seconds'], 'pump_cycle_stage_seconds', histogram,
+                             site=site, stage=stage)
+    
+    metric_histogram(series['pump_db_commit_seconds'], 'pump_db_commit_seconds', db_writer.commit_latency.snapshot())
+    writer = db_writer.stats()
+    for name, key in (('pump_db_queue_depth', 'queue_depth'), ('pump_db_queue_capacity', 'queue_capacity'),
+                      ('pump_db_rows_written_total', 'rows_written'), ('pump_db_rows_dropped_total', 'rows_dropped'),
+                      ('pump_db_errors_total', 'errors')):
+        series[name].append(f"{name} {writer[key]}")
+    series['pump_socket_clients'].append(f"pump_socket_clients {connected_clients}")
+    for room, count in subscriptions.counts().items():
+        series['pump_socket_room_members'].append(f"pump_socket_room_members{metric_labels(room=room)} {count}")
+    for status, count in report_jobs.counts().items():
+        series['pump_report_jobs'].append(f"pump_report_jobs{metric_labels(status=status)} {count}")
+    
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(series[name])
+    return '\n'.join(lines) + '\n'
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/trip-events')
 def get_trip_events():
     pump_id = request.args.get('pump_id')
+    site_id = request.args.get('site')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    limit = min(max(request.args.get('limit', TRIP_EVENTS_PAGE_SIZE, type=int), 1), TRIP_EVENTS_MAX_PAGE_SIZE)
+    if site_id and site_id not in SITE_PUMPS:
+        return jsonify({"error": "unknown site", 'events': [], 'total_trips': 0}), 404
+    
+    try:
+        after = decode_page_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"error": str(e), 'events': [], 'total_trips': 0}), 400
     
     try:
-        conn = sqlite3.connect('pump_events.db')
+        conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        query = "SELECT * FROM trip_events WHERE 1=1"
-        params = []
-        
-        if pump_id and pump_id != 'all':
-            query += " AND pump_id = ?"
-            params.append(int(pump_id))
+        pump_id = int(pump_id) if pump_id and pump_id != 'all' else None
         
-        if start_date:
-            query += " AND timestamp >= ?"
-            params.append(start_date)
-        
-        if end_date:
-            query += " AND timestamp <= ?"
-            params.append(end_date + " 23:59:59")
-        
-        query += " ORDER BY timestamp DESC LIMIT 500"
-        
-        cursor.execute(query, params)
+        # Fetch one extra row to know whether another page exists
+        cursor.execute(*trip_events_query(pump_id, start_date, end_date, after, limit + 1, site_id))
         rows = cursor.fetchall()
+        next_cursor = encode_page_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
         
         # Count total trips
-        count_query = "SELECT COUNT(*) as total FROM trip_events WHERE event_type = 'TRIP'"
-        count_params = []
-        if pump_id and pump_id != 'all':
-            count_query += " AND pump_id = ?"
-            count_params.append(int(pump_id))
-        if start_date:
-            count_query += " AND timestamp >= ?"
-            count_params.append(start_date)
-        if end_date:
-            count_query += " AND timestamp <= ?"
-            count_params.append(end_date + " 23:59:59")
-        
+        count_query, count_params = trip_count_query(pump_id, start_date, end_date, site_id)
         cursor.execute(count_query, count_params)
         total_trips = cursor.fetchone()['total']
         
@@ -500,140 +2817,228 @@ def get_trip_events():
         events = []
         for row in rows:
             events.append({
+                'id': row['id'],
                 'timestamp': row['timestamp'],
                 'pump_name': row['pump_name'],
+                'site_id': row['site_id'],
                 'event_type': row['event_type'],
                 'pressure': row['pressure'],
-                'duration': '--'
+                'duration': 'Active' if row['trip_active'] else (
+                    format_duration(row['duration_seconds']) if row['duration_seconds'] is not None else '--'),
+                'duration_seconds': row['duration_seconds']
             })
         
-        return jsonify({'events': events, 'total_trips': total_trips})
+        return jsonify({'events': events, 'total_trips': total_trips, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({"error": str(e), 'events': [], 'total_trips': 0}), 500
 
+@app.route('/api/trip-events/<int:event_id>/waveform')
+def get_trip_waveform(event_id):
+    """Pressure captured around one trip: offsets in ms from the trip edge, pre-trigger samples first"""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('''
+            SELECT b.trip_event_id, b.pump_id, b.trigger_time, b.pre_samples, b.samples, b.waveform, e.timestamp
+            FROM trip_bursts b JOIN trip_events e ON e.id = b.trip_event_id
+            WHERE b.trip_event_id = ?
+        ''', (event_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return jsonify({"error": "no waveform captured for this trip event"}), 404
+        
+        waveform = decode_burst(row['waveform'], row['samples'])
+        waveform.update({
+            'trip_event_id': row['trip_event_id'],
+            'pump_id': row['pump_id'],
+            'pump_name': PUMP_NAMES.get(row['pump_id'], ''),
+            'site_id': PUMP_SITES.get(row['pump_id']),
+            'timestamp': row['timestamp'],
+            'trigger_time': row['trigger_time'],
+            'pre_samples': row['pre_samples'],
+            'samples': row['samples'],
+            'bytes': len(row['waveform'])
+        })
+        return jsonify(waveform)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/trip-intervals')
+def get_trip_intervals():
+    """Trip intervals (trip to clear) with durations, newest first"""
+    pump_id = request.args.get('pump_id')
+    pump_id = int(pump_id) if pump_id and pump_id != 'all' else None
+    site_id = request.args.get('site')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    if site_id and site_id not in SITE_PUMPS:
+        return jsonify({"error": "unknown site", 'intervals': []}), 404
+    
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        intervals = []
+        for row in conn.execute(*trip_intervals_query(pump_id, start_date, end_date, site_id)):
+            interval = dict(row)
+            interval['pump_name'] = PUMP_NAMES.get(row['pump_id'], '')
+            interval['site_id'] = PUMP_SITES.get(row['pump_id'])
+            interval['duration'] = format_duration(row['duration_seconds']) if row['duration_seconds'] is not None else 'Active'
+            intervals.append(interval)
+        conn.close()
+        
+        closed = [i['duration_seconds'] for i in intervals if i['duration_seconds'] is not None]
+        return jsonify({
+            'intervals': intervals,
+            'mttr_seconds': sum(closed) / len(closed) if closed else None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e), 'intervals': []}), 500
+
+@app.route('/api/kpis')
+def get_kpis():
+    """Availability, MTBF, MTTR and running hours per pump per day, week or month"""
+    pump_id = request.args.get('pump_id')
+    pump_id = int(pump_id) if pump_id and pump_id != 'all' else None
+    period = request.args.get('period', 'day')
+    site_id = request.args.get('site')
+    if period not in ('day', 'week', 'month'):
+        return jsonify({"error": "period must be day, week or month", 'kpis': []}), 400
+    if site_id and site_id not in SITE_PUMPS:
+        return jsonify({"error": "unknown site", 'kpis': []}), 404
+    
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(*kpi_query(pump_id, request.args.get('start_date'), request.args.get('end_date'),
+                                       period, site_id)).fetchall()
+        conn.close()
+        return jsonify({'period': period, 'kpis': [kpi_metrics(row) for row in rows]})
+    except Exception as e:
+        return jsonify({"error": str(e), 'kpis': []}), 500
+
 @app.route('/api/pressure-history')
 def get_pressure_history():
     pump_id = request.args.get('pump_id', type=int)
-    hours = request.args.get('hours', 24, type=int)
+    site_id = request.args.get('site')
+    hours = min(max(request.args.get('hours', 24, type=float), 1 / 60), MAX_HISTORY_HOURS)
+    interval = request.args.get('interval', type=float)
+    if site_id and site_id not in SITE_PUMPS:
+        return jsonify({"error": "unknown site"}), 404
     
     try:
-        conn = sqlite3.connect('pump_events.db')
+        conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        
-        query = "SELECT * FROM pressure_history WHERE timestamp >= ?"
-        params = [cutoff_time.strftime('%Y-%m-%d %H:%M:%S')]
-        
-        if pump_id:
-            query += " AND pump_id = ?"
-            params.append(pump_id)
-        
-        query += " ORDER BY timestamp DESC"
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        # Timestamps are stored in UTC
+        cutoff = time.time() - hours * 3600
+        tier = choose_history_tier(hours, interval, pump_id)
+        
+        if tier is None:
+            interval = zoom_interval(hours, interval)
+            rows = [{
+                'pump_id': sample_pump_id,
+                'pump_name': PUMP_NAMES.get(sample_pump_id, ''),
+                'site_id': PUMP_SITES.get(sample_pump_id),
+                'pressure': round(pressure, 2),
+                'pressure_setpoint': round(setpoint, 2),
+                'status': PRESSURE_STATUSES[status],
+                'timestamp': db_timestamp(ts),
+                'interval': interval
+            } for sample_pump_id, ts, pressure, setpoint, status in thin_samples(
+                read_pressure_samples(conn, cutoff, None, pump_id, site_id), interval)]
+            rows.sort(key=lambda row: row['timestamp'], reverse=True)
+        else:
+            cutoff_bucket = int(cutoff // tier) * tier
+            cursor.execute(*rollup_history_query(tier, cutoff_bucket, pump_id, site_id))
+            buckets = {(row['pump_id'], row['bucket']): dict(row) for row in cursor.fetchall()}
+            # Merge in this process's buckets still being filled, so the last minutes show up
+            pump_ids = {pump_id} if pump_id else set(SITE_PUMPS[site_id]) if site_id else None
+            for open_pump_id, bucket, low, high, total, last, setpoint, samples in pressure_rollups.open_rows(tier, pump_ids):
+                if bucket < cutoff_bucket:
+                    continue
+                row = buckets.setdefault((open_pump_id, bucket), {
+                    'pump_id': open_pump_id, 'bucket': bucket, 'pressure': 0.0, 'pressure_min': low,
+                    'pressure_max': high, 'samples': 0})
+                row['pressure'] = (row['pressure'] * row['samples'] + total) / (row['samples'] + samples)
+                row['pressure_min'] = min(row['pressure_min'], low)
+                row['pressure_max'] = max(row['pressure_max'], high)
+                row.update(pressure_last=last, pressure_setpoint=setpoint, samples=row['samples'] + samples)
+            rows = []
+            for row in sorted(buckets.values(), key=lambda row: row['bucket'], reverse=True):
+                row['pump_name'] = PUMP_NAMES.get(row['pump_id'], '')
+                row['site_id'] = PUMP_SITES.get(row['pump_id'])
+                row['timestamp'] = db_timestamp(row.pop('bucket'))
+                row['pressure'] = round(row['pressure'], 2)
+                row['tier'] = tier
+                rows.append(row)
         conn.close()
         
-        return jsonify([dict(row) for row in rows])
+        return jsonify(rows)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/live-window')
+def get_live_window():
+    """Full-rate samples for one pump from the in-memory ring buffer"""
+    pump_id = request.args.get('pump_id', type=int)
+    seconds = min(max(request.args.get('seconds', 300, type=float), 0), LIVE_WINDOW_HOURS * 3600)
+    if pump_id not in PUMP_NAMES:
+        return jsonify({"error": "unknown pump_id"}), 400
+    
+    if monitors[PUMP_SITES[pump_id]].polled_elsewhere():
+        return jsonify({"error": "the live window is held in memory by the poller process"}), 503
+    
+    window = monitors[PUMP_SITES[pump_id]].live_window.window(pump_id, seconds)
+    window.update({'pump_id': pump_id, 'pump_name': PUMP_NAMES[pump_id], 'site_id': PUMP_SITES[pump_id],
+                   'seconds': seconds})
+    return jsonify(window)
+
+# Short-lived cache of the per-pump trip statistics shared by all health pollers
+HEALTH_CACHE_TTL = 2.0  # seconds
+health_cache = {'expires': 0.0, 'stats': {}}
+health_cache_lock = threading.Lock()
+
+def get_pump_trip_stats():
+    """{pump_id: (trip count last 24 h, last trip timestamp)}, at most HEALTH_CACHE_TTL old"""
+    with health_cache_lock:
+        if time.monotonic() < health_cache['expires']:
+            return health_cache['stats']
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            stats = {pump_id: (count, last) for pump_id, count, last in conn.execute(pump_trip_stats_query())}
+        finally:
+            conn.close()
+        health_cache['stats'] = stats
+        health_cache['expires'] = time.monotonic() + HEALTH_CACHE_TTL
+        return stats
+
 @app.route('/api/pump-health')
 def get_pump_health():
     """Get real-time pump health from PLC + historical trip data from database"""
+    site_id = request.args.get('site')
+    if site_id and site_id not in monitors:
+        return jsonify({"error": "unknown site", 'pumps': []}), 404
+    
     try:
-        # Get real-time data from PLC
-        if monitor.connected:
-            plc_data = monitor.read_db39()
-        else:
-            plc_data = {}
+        # Get real-time data from the last published snapshot(s)
+        plc_data = combined_status(site_id)
         
-        # Get trip counts from database
-        conn = sqlite3.connect('pump_events.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        # Get trip counts from database (cached for HEALTH_CACHE_TTL)
+        trip_stats = get_pump_trip_stats()
         
         health_data = []
         
-        # Map pump data to consistent structure
-        pump_realtime = {
-            1: {
-                'pressure': plc_data.get('pressure', 0),
-                'setpoint': plc_data.get('pressure_setpoint', 0),
-                'is_ready': plc_data.get('ready_yellow', False),
-                'is_running': plc_data.get('running_green', False),
-                'is_trip': plc_data.get('trip_red', False)
-            },
-            2: {
-                'pressure': plc_data.get('p2_pressure', 0),
-                'setpoint': plc_data.get('p2_pressure_setpoint', 0),
-                'is_ready': plc_data.get('p2_ready_yellow', False),
-                'is_running': plc_data.get('p2_running_green', False),
-                'is_trip': plc_data.get('p2_trip_red', False)
-            },
-            3: {
-                'pressure': plc_data.get('p3_pressure', 0),
-                'setpoint': plc_data.get('p3_pressure_setpoint', 0),
-                'is_ready': plc_data.get('p3_ready_yellow', False),
-                'is_running': plc_data.get('p3_running_green', False),
-                'is_trip': plc_data.get('p3_trip_red', False)
-            },
-            4: {
-                'pressure': plc_data.get('p4_pressure', 0),
-                'setpoint': plc_data.get('p4_pressure_setpoint', 0),
-                'is_ready': plc_data.get('p4_ready_yellow', False),
-                'is_running': plc_data.get('p4_running_green', False),
-                'is_trip': plc_data.get('p4_trip_red', False)
-            },
-            5: {
-                'pressure': plc_data.get('p5_pressure', 0),
-                'setpoint': plc_data.get('p5_pressure_setpoint', 0),
-                'is_ready': plc_data.get('p5_ready_yellow', False),
-                'is_running': plc_data.get('p5_running_green', False),
-                'is_trip': plc_data.get('p5_trip_red', False)
-            },
-            6: {
-                'pressure': plc_data.get('p6_pressure', 0),
-                'setpoint': plc_data.get('p6_pressure_setpoint', 0),
-                'is_ready': plc_data.get('p6_ready_yellow', False),
-                'is_running': plc_data.get('p6_running_green', False),
-                'is_trip': plc_data.get('p6_trip_red', False)
-            },
-            7: {
-                'pressure': plc_data.get('p7_pressure', 0),
-                'setpoint': plc_data.get('p7_pressure_setpoint', 0),
-                'is_ready': plc_data.get('p7_ready_yellow', False),
-                'is_running': plc_data.get('p7_running_green', False),
-                'is_trip': plc_data.get('p7_trip_red', False)
-            }
-        }
-        
-        for pump_id in range(1, 8):
-            # Get trip count last 24 hours from database
-            cursor.execute('''
-                SELECT COUNT(*) as trip_count FROM trip_events 
-                WHERE pump_id = ? AND event_type = 'TRIP' 
-                AND timestamp >= datetime('now', '-24 hours')
-            ''', (pump_id,))
-            trip_count = cursor.fetchone()['trip_count']
-            
-            # Get last trip time
-            cursor.execute('''
-                SELECT timestamp FROM trip_events 
-                WHERE pump_id = ? AND event_type = 'TRIP'
-                ORDER BY timestamp DESC LIMIT 1
-            ''', (pump_id,))
-            last_trip_row = cursor.fetchone()
-            last_trip = last_trip_row['timestamp'] if last_trip_row else None
+        for pump_id in (SITE_PUMPS[site_id] if site_id else PUMP_NAMES):
+            trip_count, last_trip = trip_stats.get(pump_id, (0, None))
             
             # Get real-time data
-            rt = pump_realtime[pump_id]
+            rt = pump_realtime(plc_data, pump_id)
             
             health_data.append({
                 'pump_id': pump_id,
                 'name': PUMP_NAMES[pump_id],
+                'site_id': PUMP_SITES[pump_id],
                 'pressure': rt['pressure'],
                 'setpoint': rt['setpoint'],
                 'is_ready': rt['is_ready'],
@@ -643,11 +3048,10 @@ def get_pump_health():
                 'last_trip': last_trip
             })
         
-        conn.close()
-        
         # Calculate uptime (time since last system start)
         import datetime as dt
-        uptime_seconds = int(time.time() - monitor.start_time) if hasattr(monitor, 'start_time') else 0
+        site_monitor = monitors[site_id or DEFAULT_SITE_ID]
+        uptime_seconds = int(time.time() - site_monitor.start_time) if hasattr(site_monitor, 'start_time') else 0
         hours, remainder = divmod(uptime_seconds, 3600)
         minutes, seconds = divmod(remainder, 60)
         uptime_str = f"{hours}h {minutes}m"
@@ -655,11 +3059,216 @@ def get_pump_health():
         return jsonify({
             'pumps': health_data,
             'uptime': uptime_str,
-            'connected': monitor.connected
+            'connected': all(monitors[site].is_connected() for site in ([site_id] if site_id else monitors)),
+            'sites': {site: monitors[site].is_connected() for site in ([site_id] if site_id else monitors)}
         })
     except Exception as e:
         return jsonify({"error": str(e), 'pumps': []}), 500
 
+# PDF reports are rendered page-sized table chunk by chunk from a database cursor
+# into a spool file, then streamed to the client
+REPORT_ROWS_PER_TABLE = 35
+REPORT_SPOOL_MEMORY = 1024 * 1024  # bytes kept in memory before spooling to disk
+REPORT_STREAM_CHUNK = 64 * 1024
+
+TRIP_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#fff5f5')]),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+]
+TRIP_HEADERS = ['#', 'Pump Name', 'Event', 'Timestamp', 'Pressure', 'Setpoint']
+TRIP_COL_WIDTHS = [0.4*inch, 2*inch, 1*inch, 1.5*inch, 0.8*inch, 0.8*inch]
+
+class FlowableStream(list):
+    """List of flowables that refills itself from a generator as platypus consumes it.
+    
+    SimpleDocTemplate.build() pops flowables off the front of a list; feeding it
+    this instead means only a couple of table chunks exist at any time.
+    """
+    
+    def __init__(self, source, lookahead=2):
+        super().__init__()
+        self.source = iter(source)
+        self.lookahead = lookahead
+    
+    def _fill(self):
+        while self.source is not None and list.__len__(self) < self.lookahead:
+            try:
+                self.append(next(self.source))
+            except StopIteration:
+                self.source = None
+    
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+    
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+def report_health_rows(plc_data):
+    """Rows for the real-time health table of the PDF report"""
+    health_data = []
+    for pid in PUMP_NAMES:
+        rt = pump_realtime(plc_data, pid)
+        status = 'TRIP' if rt['is_trip'] else ('RUNNING' if rt['is_running'] else ('READY' if rt['is_ready'] else 'OFFLINE'))
+        health = 'CRITICAL' if rt['is_trip'] else ('NORMAL' if rt['is_running'] else 'ATTENTION')
+        health_data.append([pid, PUMP_NAMES[pid], f"{rt['pressure']:.2f}", f"{rt['setpoint']:.2f}", status, health])
+    return health_data
+
+def trip_table_chunks(cursor, total, on_progress=None):
+    """Yield one styled Table per REPORT_ROWS_PER_TABLE rows of the cursor"""
+    trip_red = colors.HexColor('#e74c3c')
+    cleared_green = colors.HexColor('#27ae60')
+    number = total
+    while True:
+        rows = cursor.fetchmany(REPORT_ROWS_PER_TABLE)
+        if not rows:
+            return
+        data = [TRIP_HEADERS]
+        style = list(TRIP_TABLE_STYLE)
+        for i, row in enumerate(rows, start=1):
+            data.append([
+                str(number),  # Descending order number
+                row['pump_name'],
+                row['event_type'],
+                row['timestamp'],
+                f"{row['pressure']:.2f}" if row['pressure'] else '--',
+                f"{row['pressure_setpoint']:.2f}" if row['pressure_setpoint'] else '--'
+            ])
+            # Color code event types
+            style.append(('TEXTCOLOR', (2, i), (2, i), trip_red if row['event_type'] == 'TRIP' else cleared_green))
+            number -= 1
+        yield Table(data, colWidths=TRIP_COL_WIDTHS, style=TableStyle(style))
+        if on_progress:
+            on_progress((total - number) / total)
+
+def render_report(output, pump_id, start_date, end_date, health_data, on_progress=None):
+    """Write the PDF report to the file-like `output`, calling on_progress(fraction) per table chunk"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        # One read transaction so the count and the rows come from the same snapshot
+        conn.execute('BEGIN')
+        where, params = trip_events_filter(pump_id, start_date, end_date)
+        total_events = conn.execute("SELECT COUNT(*) FROM trip_events " + where, params).fetchone()[0]
+        cursor = conn.execute(*report_events_query(pump_id, start_date, end_date))
+        
+        doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch, pageCompression=1)
+        doc.build(FlowableStream(report_elements(cursor, total_events, pump_id, start_date, end_date, health_data,
+                                                 on_progress)))
+    finally:
+        conn.close()
+
+def report_elements(cursor, total_events, pump_id, start_date, end_date, health_data, on_progress=None):
+    """Generate the report's flowables in document order"""
+    styles = getSampleStyleSheet()
+    
+    # Custom styles
+    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=20, spaceAfter=10, 
+                                 textColor=colors.HexColor('#1a1a2e'), alignment=1)
+    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Normal'], fontSize=10, 
+                                    textColor=colors.HexColor('#666666'), alignment=1, spaceAfter=20)
+    section_style = ParagraphStyle('Section', parent=styles['Heading2'], fontSize=14, spaceBefore=20, 
+                                   spaceAfter=10, textColor=colors.HexColor('#2c3e50'))
+    info_style = ParagraphStyle('Info', parent=styles['Normal'], fontSize=9, textColor=colors.HexColor('#555555'))
+    
+    # Header
+    yield Paragraph("CHALLAWA MONITORING SYSTEM", title_style)
+    yield Paragraph("Pump Status & Trip Events Report", subtitle_style)
+    
+    # Report metadata
+    report_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    pump_filter = PUMP_NAMES.get(pump_id, 'All Pumps') if pump_id else 'All Pumps'
+    date_range = f"{start_date or 'Beginning'} to {end_date or 'Now'}"
+    
+    meta_data = [
+        ['Report Generated:', report_time, 'Pump Filter:', pump_filter],
+        ['Date Range:', date_range, 'Total Trip Events:', str(total_events)]
+    ]
+    meta_table = Table(meta_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
+    meta_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#666666')),
+        ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#666666')),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (3, 0), (3, -1), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    yield meta_table
+    yield Spacer(1, 20)
+    
+    # Section 1: Real-Time Pump Health Status
+    yield Paragraph("1. REAL-TIME PUMP HEALTH STATUS", section_style)
+    if health_data:
+        health_headers = ['ID', 'Pump Name', 'Pressure (bar)', 'Setpoint (bar)', 'Status', 'Health']
+        health_table_data = [health_headers] + health_data
+        health_style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('TOPPADDING', (0, 0), (-1, 0), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]
+        # Color code health status
+        for i, row in enumerate(health_data):
+            health_status = row[5]
+            if health_status == 'CRITICAL':
+                health_style.append(('TEXTCOLOR', (5, i+1), (5, i+1), colors.HexColor('#e74c3c')))
+                health_style.append(('TEXTCOLOR', (4, i+1), (4, i+1), colors.HexColor('#e74c3c')))
+            elif health_status == 'ATTENTION':
+                health_style.append(('TEXTCOLOR', (5, i+1), (5, i+1), colors.HexColor('#f39c12')))
+            else:
+                health_style.append(('TEXTCOLOR', (5, i+1), (5, i+1), colors.HexColor('#27ae60')))
+        yield Table(health_table_data, colWidths=[0.4*inch, 2.2*inch, 1*inch, 1*inch, 0.9*inch, 0.9*inch],
+                    style=TableStyle(health_style))
+    else:
+        yield Paragraph("PLC not connected - No real-time data available", info_style)
+    
+    yield Spacer(1, 20)
+    
+    # Section 2: Trip Events Log
+    yield Paragraph("2. TRIP EVENTS LOG", section_style)
+    if total_events:
+        yield from trip_table_chunks(cursor, total_events, on_progress)
+    else:
+        yield Paragraph("No trip events found for the selected criteria.", info_style)
+    
+    yield Spacer(1, 30)
+    
+    # Footer
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, 
+                                  textColor=colors.HexColor('#999999'), alignment=1)
+    yield Paragraph("--- End of Report ---", footer_style)
+    yield Paragraph(f"Challawa Monitoring System | Generated: {report_time}", footer_style)
+
+def stream_file(spool):
+    """Yield a spooled file in REPORT_STREAM_CHUNK pieces, closing it at the end"""
+    try:
+        spool.seek(0)
+        while True:
+            chunk = spool.read(REPORT_STREAM_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
 @app.route('/api/generate-pdf')
 def generate_pdf():
     pump_id_param = request.args.get('pump_id')
@@ -668,209 +3277,357 @@ def generate_pdf():
     end_date = request.args.get('end_date')
     
     try:
-        conn = sqlite3.connect('pump_events.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get trip events
-        query = "SELECT * FROM trip_events WHERE 1=1"
-        params = []
-        if pump_id:
-            query += " AND pump_id = ?"
-            params.append(pump_id)
-        if start_date:
-            query += " AND timestamp >= ?"
-            params.append(start_date)
-        if end_date:
-            query += " AND timestamp <= ?"
-            params.append(end_date + " 23:59:59")
-        query += " ORDER BY id DESC"
-        cursor.execute(query, params)
-        trip_rows = cursor.fetchall()
+        filename = f"challawa_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         
-        conn.close()
+        # Serve an identical report rendered in the last REPORT_CACHE_TTL seconds straight from the cache
+        cached = report_jobs.cached_path(report_cache_key(pump_id, start_date, end_date), REPORT_CACHE_TTL)
+        if cached:
+            return send_file(cached, mimetype='application/pdf', as_attachment=True, download_name=filename)
         
         # Get real-time health data
-        health_data = []
-        if monitor.connected:
-            plc_data = monitor.read_db39()
-            pump_realtime = {
-                1: {'pressure': plc_data.get('pressure', 0), 'setpoint': plc_data.get('pressure_setpoint', 0),
-                    'is_ready': plc_data.get('ready_yellow', False), 'is_running': plc_data.get('running_green', False),
-                    'is_trip': plc_data.get('trip_red', False)},
-                2: {'pressure': plc_data.get('p2_pressure', 0), 'setpoint': plc_data.get('p2_pressure_setpoint', 0),
-                    'is_ready': plc_data.get('p2_ready_yellow', False), 'is_running': plc_data.get('p2_running_green', False),
-                    'is_trip': plc_data.get('p2_trip_red', False)},
-                3: {'pressure': plc_data.get('p3_pressure', 0), 'setpoint': plc_data.get('p3_pressure_setpoint', 0),
-                    'is_ready': plc_data.get('p3_ready_yellow', False), 'is_running': plc_data.get('p3_running_green', False),
-                    'is_trip': plc_data.get('p3_trip_red', False)},
-                4: {'pressure': plc_data.get('p4_pressure', 0), 'setpoint': plc_data.get('p4_pressure_setpoint', 0),
-                    'is_ready': plc_data.get('p4_ready_yellow', False), 'is_running': plc_data.get('p4_running_green', False),
-                    'is_trip': plc_data.get('p4_trip_red', False)},
-                5: {'pressure': plc_data.get('p5_pressure', 0), 'setpoint': plc_data.get('p5_pressure_setpoint', 0),
-                    'is_ready': plc_data.get('p5_ready_yellow', False), 'is_running': plc_data.get('p5_running_green', False),
-                    'is_trip': plc_data.get('p5_trip_red', False)},
-                6: {'pressure': plc_data.get('p6_pressure', 0), 'setpoint': plc_data.get('p6_pressure_setpoint', 0),
-                    'is_ready': plc_data.get('p6_ready_yellow', False), 'is_running': plc_data.get('p6_running_green', False),
-                    'is_trip': plc_data.get('p6_trip_red', False)},
-                7: {'pressure': plc_data.get('p7_pressure', 0), 'setpoint': plc_data.get('p7_pressure_setpoint', 0),
-                    'is_ready': plc_data.get('p7_ready_yellow', False), 'is_running': plc_data.get('p7_running_green', False),
-                    'is_trip': plc_data.get('p7_trip_red', False)},
-            }
-            for pid in range(1, 8):
-                rt = pump_realtime[pid]
-                status = 'TRIP' if rt['is_trip'] else ('RUNNING' if rt['is_running'] else ('READY' if rt['is_ready'] else 'OFFLINE'))
-                health = 'CRITICAL' if rt['is_trip'] else ('NORMAL' if rt['is_running'] else 'ATTENTION')
-                health_data.append([pid, PUMP_NAMES[pid], f"{rt['pressure']:.2f}", f"{rt['setpoint']:.2f}", status, health])
+        plc_data = combined_status()
+        health_data = report_health_rows(plc_data) if plc_data else []
         
         # Generate PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=20, spaceAfter=10, 
-                                     textColor=colors.HexColor('#1a1a2e'), alignment=1)
-        subtitle_style = ParagraphStyle('Subtitle', parent=styles['Normal'], fontSize=10, 
-                                        textColor=colors.HexColor('#666666'), alignment=1, spaceAfter=20)
-        section_style = ParagraphStyle('Section', parent=styles['Heading2'], fontSize=14, spaceBefore=20, 
-                                       spaceAfter=10, textColor=colors.HexColor('#2c3e50'))
-        info_style = ParagraphStyle('Info', parent=styles['Normal'], fontSize=9, textColor=colors.HexColor('#555555'))
-        
-        # Header
-        elements.append(Paragraph("CHALLAWA MONITORING SYSTEM", title_style))
-        elements.append(Paragraph("Pump Status & Trip Events Report", subtitle_style))
-        
-        # Report metadata
-        report_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        pump_filter = PUMP_NAMES.get(pump_id, 'All Pumps') if pump_id else 'All Pumps'
-        date_range = f"{start_date or 'Beginning'} to {end_date or 'Now'}"
-        
-        meta_data = [
-            ['Report Generated:', report_time, 'Pump Filter:', pump_filter],
-            ['Date Range:', date_range, 'Total Trip Events:', str(len(trip_rows))]
-        ]
-        meta_table = Table(meta_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
-        meta_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#666666')),
-            ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#666666')),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (3, 0), (3, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(meta_table)
-        elements.append(Spacer(1, 20))
-        
-        # Section 1: Real-Time Pump Health Status
-        elements.append(Paragraph("1. REAL-TIME PUMP HEALTH STATUS", section_style))
-        if health_data:
-            health_headers = ['ID', 'Pump Name', 'Pressure (bar)', 'Setpoint (bar)', 'Status', 'Health']
-            health_table_data = [health_headers] + health_data
-            health_table = Table(health_table_data, colWidths=[0.4*inch, 2.2*inch, 1*inch, 1*inch, 0.9*inch, 0.9*inch])
-            health_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                ('TOPPADDING', (0, 0), (-1, 0), 10),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            # Color code health status
-            for i, row in enumerate(health_data):
-                health_status = row[5]
-                if health_status == 'CRITICAL':
-                    health_table.setStyle(TableStyle([('TEXTCOLOR', (5, i+1), (5, i+1), colors.HexColor('#e74c3c'))]))
-                    health_table.setStyle(TableStyle([('TEXTCOLOR', (4, i+1), (4, i+1), colors.HexColor('#e74c3c'))]))
-                elif health_status == 'ATTENTION':
-                    health_table.setStyle(TableStyle([('TEXTCOLOR', (5, i+1), (5, i+1), colors.HexColor('#f39c12'))]))
-                else:
-                    health_table.setStyle(TableStyle([('TEXTCOLOR', (5, i+1), (5, i+1), colors.HexColor('#27ae60'))]))
-            elements.append(health_table)
-        else:
-            elements.append(Paragraph("PLC not connected - No real-time data available", info_style))
-        
-        elements.append(Spacer(1, 20))
-        
-        # Section 2: Trip Events Log
-        elements.append(Paragraph("2. TRIP EVENTS LOG", section_style))
-        if trip_rows:
-            trip_headers = ['#', 'Pump Name', 'Event', 'Timestamp', 'Pressure', 'Setpoint']
-            trip_data = []
-            for idx, row in enumerate(trip_rows):
-                trip_data.append([
-                    str(len(trip_rows) - idx),  # Descending order number
-                    row['pump_name'],
-                    row['event_type'],
-                    row['timestamp'],
-                    f"{row['pressure']:.2f}" if row['pressure'] else '--',
-                    f"{row['pressure_setpoint']:.2f}" if row['pressure_setpoint'] else '--'
-                ])
+        spool = tempfile.SpooledTemporaryFile(max_size=REPORT_SPOOL_MEMORY)
+        try:
+            render_report(spool, pump_id, start_date, end_date, health_data)
+        except Exception:
+            spool.close()
+            raise
+        size = spool.tell()
+        
+        return Response(stream_file(spool), mimetype='application/pdf', direct_passthrough=True,
+                       headers={'Content-Disposition': f'attachment; filename={filename}',
+                                'Content-Length': str(size)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Background report rendering. Jobs run in a process pool; finished PDFs are
+# cached under a hash of (pump filter, date range, last event id) so identical
+# requests are served without rendering again. Every PDF also carries the live
+# health snapshot and its generation time, so a cached one is only reused for
+# REPORT_CACHE_TTL seconds.
+REPORT_WORKERS = 2
+REPORT_PROGRESS_POLL = 0.2  # seconds
+REPORT_CACHE_DIR = 'report_cache'
+REPORT_CACHE_MAX_FILES = 50
+REPORT_CACHE_TTL = 60  # seconds
+REPORT_JOB_TTL = 3600  # seconds a finished job stays pollable
+
+# Set in report worker processes by report_worker_init()
+report_progress_queue = None
+
+def report_worker_init(progress_queue):
+    global report_progress_queue
+    report_progress_queue = progress_queue
+
+def render_report_file(job_id, path, pump_id, start_date, end_date, health_data):
+    """Process pool entry point: render a report to `path` atomically"""
+    def on_progress(fraction):
+        if report_progress_queue is not None:
+            report_progress_queue.put((job_id, fraction))
+    
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as output:
+            render_report(output, pump_id, start_date, end_date, health_data, on_progress)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+def report_cache_key(pump_id, start_date, end_date):
+    """Content address of a report: its filters plus the newest trip event id"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        last_event_id = conn.execute("SELECT MAX(id) FROM trip_event_log").fetchone()[0] or 0
+    finally:
+        conn.close()
+    spec = json.dumps([pump_id, start_date or '', end_date or '', last_event_id])
+    return hashlib.sha256(spec.encode()).hexdigest()[:32]
+
+class ReportJobs:
+    """Queue of report renders with progress tracking and a PDF cache on disk"""
+    
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, workers=REPORT_WORKERS):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.workers = workers
+        self.pool = None
+        self.progress_queue = None
+        self.jobs = {}       # job id -> job dict
+        self.by_key = {}     # cache key -> id of the job rendering it
+        self.lock = threading.Lock()
+    
+    def _start_pool(self):
+        if self.pool is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Spawned rather than forked: a fork would copy the monitor threads and, under
+            # eventlet/gevent, a patched interpreter
+            context = multiprocessing.get_context('spawn')
+            self.progress_queue = context.Queue()
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                            initializer=report_worker_init, initargs=(self.progress_queue,))
+            socketio.start_background_task(self.progress_loop, self.progress_queue)
+    
+    def _drop_pool(self, pool):
+        """Forget a pool broken by a dead worker (OOM, kill); the next submit starts a fresh one"""
+        if pool is None or self.pool is not pool:
+            return
+        print("⚠ Report worker died, restarting the render pool")
+        self.pool = None
+        self.progress_queue = None  # ends the old pool's progress_loop
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def cached_path(self, key, max_age=None):
+        """The rendered PDF for `key`, if any (and no older than max_age seconds when given)"""
+        path = os.path.join(self.cache_dir, f"{key}.pdf")
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return None
+        return path if max_age is None or age <= max_age else None
+    
+    def submit(self, pump_id, start_date, end_date, health_data, sid=None):
+        """Return the job for this report, starting a render only if none is cached or running"""
+        key = report_cache_key(pump_id, start_date, end_date)
+        with self.lock:
+            self.prune()
+            running = self.by_key.get(key)
+            if running in self.jobs:
+                if sid:
+                    self.jobs[running]['sids'].add(sid)
+                return self.jobs[running]
             
-            trip_table_data = [trip_headers] + trip_data
-            trip_table = Table(trip_table_data, colWidths=[0.4*inch, 2*inch, 1*inch, 1.5*inch, 0.8*inch, 0.8*inch])
-            trip_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                ('TOPPADDING', (0, 0), (-1, 0), 10),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#fff5f5')]),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            # Color code event types
-            for i, row in enumerate(trip_data):
-                if row[2] == 'TRIP':
-                    trip_table.setStyle(TableStyle([('TEXTCOLOR', (2, i+1), (2, i+1), colors.HexColor('#e74c3c'))]))
-                else:
-                    trip_table.setStyle(TableStyle([('TEXTCOLOR', (2, i+1), (2, i+1), colors.HexColor('#27ae60'))]))
-            elements.append(trip_table)
-        else:
-            elements.append(Paragraph("No trip events found for the selected criteria.", info_style))
-        
-        elements.append(Spacer(1, 30))
-        
-        # Footer
-        footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, 
-                                      textColor=colors.HexColor('#999999'), alignment=1)
-        elements.append(Paragraph("--- End of Report ---", footer_style))
-        elements.append(Paragraph(f"Challawa Monitoring System | Generated: {report_time}", footer_style))
-        
-        doc.build(elements)
-        buffer.seek(0)
-        
-        filename = f"challawa_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        return Response(buffer.getvalue(), mimetype='application/pdf',
-                       headers={'Content-Disposition': f'attachment; filename={filename}'})
+            job = {
+                'id': uuid.uuid4().hex,
+                'key': key,
+                'status': 'queued',
+                'progress': 0.0,
+                'error': None,
+                'created': time.time(),
+                'finished': None,
+                'sids': {sid} if sid else set()  # socket clients pushed progress and completion
+            }
+            self.jobs[job['id']] = job
+            
+            if self.cached_path(key, REPORT_CACHE_TTL):
+                job.update(status='done', progress=1.0, finished=time.time(), cached=True)
+                return job
+            
+            args = (render_report_file, job['id'], os.path.join(self.cache_dir, f"{key}.pdf"),
+                    pump_id, start_date, end_date, health_data)
+            try:
+                self._start_pool()
+                try:
+                    future = self.pool.submit(*args)
+                except BrokenProcessPool:
+                    # A worker died since the last submit; retry once on a fresh pool
+                    self._drop_pool(self.pool)
+                    self._start_pool()
+                    future = self.pool.submit(*args)
+            except Exception as e:
+                job.update(status='error', error=str(e), finished=time.time())
+                raise
+            self.by_key[key] = job['id']
+            pool = self.pool
+        # Outside the lock: a future that is already done runs its callback right away
+        future.add_done_callback(lambda f, job_id=job['id']: self.finished(job_id, f, pool))
+        return job
+    
+    def progress_loop(self, progress_queue):
+        while self.progress_queue is progress_queue:
+            # Poll rather than block: a blocking get would stall a gevent/eventlet worker's hub
+            try:
+                job_id, fraction = progress_queue.get_nowait()
+            except queue.Empty:
+                socketio.sleep(REPORT_PROGRESS_POLL)
+                continue
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None or job['status'] not in ('queued', 'running'):
+                    continue
+                job['status'] = 'running'
+                job['progress'] = round(fraction, 3)
+                sids = list(job['sids'])
+            # Socket clients that passed their sid get pushed updates; others poll
+            for sid in sids:
+                socketio.emit('report_progress', self.public(job), to=sid)
+    
+    def finished(self, job_id, future, pool):
+        error = 'render cancelled' if future.cancelled() else future.exception()
+        with self.lock:
+            if isinstance(error, BrokenProcessPool):
+                self._drop_pool(pool)
+            job = self.jobs[job_id]
+            self.by_key.pop(job['key'], None)
+            job['finished'] = time.time()
+            if error:
+                job.update(status='error', error=str(error))
+            else:
+                job.update(status='done', progress=1.0)
+            self.evict()
+            sids = list(job['sids'])
+        for sid in sids:
+            socketio.emit('report_ready', self.public(job), to=sid)
+    
+    def evict(self):
+        """Keep at most REPORT_CACHE_MAX_FILES cached PDFs, dropping the oldest"""
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith('.pdf')]
+        files.sort(key=os.path.getmtime)
+        for path in files[:max(0, len(files) - REPORT_CACHE_MAX_FILES)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def prune(self):
+        cutoff = time.time() - REPORT_JOB_TTL
+        for job_id in [j['id'] for j in self.jobs.values() if j['finished'] and j['finished'] < cutoff]:
+            del self.jobs[job_id]
+    
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def counts(self):
+        """Jobs per status"""
+        with self.lock:
+            counts = dict.fromkeys(('queued', 'running', 'done', 'error'), 0)
+            for job in self.jobs.values():
+                counts[job['status']] += 1
+            return counts
+    
+    def public(self, job):
+        """JSON view of a job"""
+        data = {k: job[k] for k in ('id', 'status', 'progress', 'error')}
+        data['cached'] = job.get('cached', False)
+        if job['status'] == 'done':
+            data['download_url'] = f"/api/reports/{job['id']}/download"
+        return data
+    
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+report_jobs = ReportJobs()
+
+@app.route('/api/reports', methods=['POST'])
+def submit_report():
+    params = request.get_json(silent=True) or request.form
+    pump_id_param = params.get('pump_id')
+    pump_id = int(pump_id_param) if pump_id_param and pump_id_param != 'all' else None
+    start_date = params.get('start_date') or None
+    end_date = params.get('end_date') or None
+    
+    try:
+        plc_data = combined_status()
+        health_data = report_health_rows(plc_data) if plc_data else []
+        job = report_jobs.submit(pump_id, start_date, end_date, health_data, sid=params.get('sid'))
+        return jsonify(report_jobs.public(job)), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/reports/<job_id>')
+def get_report_job(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown report job"}), 404
+    return jsonify(report_jobs.public(job))
+
+@app.route('/api/reports/<job_id>/download')
+def download_report(job_id):
+    job = report_jobs.get(job_id)
+    path = report_jobs.cached_path(job['key']) if job and job['status'] == 'done' else None
+    if path is None:
+        return jsonify({"error": "report not ready"}), 404
+    filename = f"challawa_report_{datetime.fromtimestamp(job['finished']).strftime('%Y%m%d_%H%M%S')}.pdf"
+    return send_file(path, mimetype='application/pdf', as_attachment=True, download_name=filename)
+
 # Track connected clients (reduce log spam)
 connected_clients = 0
 
+def subscription_rooms(site_id=None, pump_ids=None, binary=False):
+    """Rooms for a subscription request: given pumps, else a whole site; raises ValueError"""
+    if pump_ids:
+        for pump_id in pump_ids:
+            if pump_id not in PUMP_SITES:
+                raise ValueError(f"unknown pump_id {pump_id}")
+        return [pump_room(pump_id) for pump_id in pump_ids]
+    site_monitor = monitors.get(site_id or DEFAULT_SITE_ID)
+    if site_monitor is None:
+        raise ValueError("unknown site")
+    return [site_monitor.binary_room if binary and BINARY_FRAMES_ENABLED else site_monitor.json_room]
+
+def send_room_snapshot(room):
+    """Send the joining client the cached snapshot for one room"""
+    if room.startswith('pump:'):
+        pump_id = int(room[5:])
+        site_monitor = monitors[PUMP_SITES[pump_id]]
+        emit('pump_data', site_monitor.pump_payload(site_monitor.get_status(), pump_id))
+        return
+    site_monitor = monitors[room.rsplit(':', 1)[0]]
+    if room == site_monitor.binary_room:
+        emit('pump_frame', site_monitor.binary_frame())
+    else:
+        emit('pump_data', site_monitor.get_status())
+
+def subscription_request(message):
+    """(site_id, pump_ids, binary) from connect query arguments or a subscribe message"""
+    pumps = message.get('pumps')
+    if isinstance(pumps, str):
+        pumps = pumps.split(',')
+    try:
+        pump_ids = [int(pump_id) for pump_id in pumps or []]
+    except (TypeError, ValueError):
+        raise ValueError("pumps must be a list of pump ids")
+    return message.get('site'), pump_ids, message.get('format') == 'binary'
+
 @socketio.on('connect')
 def handle_connect():
     global connected_clients
+    # ?site=<id> subscribes to a whole site (default site when omitted), ?pumps=1,3 to single pumps
+    try:
+        rooms = subscription_rooms(*subscription_request(request.args))
+    except ValueError:
+        return False  # unknown site or pump: refuse the connection
     connected_clients += 1
     if connected_clients == 1:
         print(f'Client connected (total: {connected_clients})')
-    if monitor.connected:
-        socketio.emit('pump_data', monitor.read_db39())
+    # Reply to the joining client only, from the cached snapshot, in the format it asked for
+    for room in rooms:
+        subscriptions.join(request.sid, room)
+        send_room_snapshot(room)
+
+@socketio.on('subscribe')
+def handle_subscribe(message):
+    """Join more rooms: {'site': id, 'format': 'json'|'binary'} or {'pumps': [ids]}"""
+    try:
+        rooms = subscription_rooms(*subscription_request(message or {}))
+    except ValueError as e:
+        return {'error': str(e)}
+    for room in rooms:
+        if room not in subscriptions.rooms(request.sid):
+            subscriptions.join(request.sid, room)
+            send_room_snapshot(room)
+    return {'rooms': subscriptions.rooms(request.sid)}
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(message):
+    """Leave rooms; same message shape as subscribe"""
+    try:
+        rooms = subscription_rooms(*subscription_request(message or {}))
+    except ValueError as e:
+        return {'error': str(e)}
+    for room in rooms:
+        subscriptions.leave(request.sid, room)
+    return {'rooms': subscriptions.rooms(request.sid)}
 
 @socketio.on('disconnect')
 def handle_disconnect():
     global connected_clients
+    subscriptions.drop(request.sid)
     connected_clients = max(0, connected_clients - 1)
     if connected_clients == 0:
         print('All clients disconnected')
@@ -1632,7 +4389,9 @@ HTML_TEMPLATE = '''
             reconnectionAttempts: Infinity,
             reconnectionDelay: 1000,
             reconnectionDelayMax: 5000,
-            timeout: 20000
+            timeout: 20000,
+            // Ask for compact binary frames; the server falls back to JSON if disabled
+            query: { format: window.DataView ? 'binary' : 'json' }
         });
         
         const maxPressure = 10;
@@ -1648,10 +4407,7 @@ HTML_TEMPLATE = '''
             pollingInterval = setInterval(() => {
                 fetch('/api/status')
                     .then(r => r.json())
-                    .then(data => {
-                        updateStatus(data);
-                        lastUpdate = Date.now();
-                    })
+                    .then(applyFullFrame)
                     .catch(err => console.error('Polling error:', err));
             }, 1000);
         }
@@ -1752,7 +4508,24 @@ HTML_TEMPLATE = '''
             }
         }
         
-        function updateStatus(data) {
+        // Last full pump_data state; pump_delta frames are merged into it
+        let pumpState = {};
+        const ALL_PUMPS = [1, 2, 3, 4, 5, 6, 7];
+        
+        function pumpsInDelta(delta) {
+            const pumps = new Set();
+            Object.keys(delta).forEach(key => {
+                const match = key.match(/^p(\d+)_/);
+                if (match) {
+                    pumps.add(parseInt(match[1]));
+                } else if (key !== 'connected' && key !== 'sequence' && key !== 'snapshot_age') {
+                    pumps.add(1);
+                }
+            });
+            return Array.from(pumps);
+        }
+        
+        function updateStatus(data, pumps = ALL_PUMPS) {
             // Connection status
             const badge = document.getElementById('connectionBadge');
             const text = document.getElementById('connectionText');
@@ -1767,14 +4540,8 @@ HTML_TEMPLATE = '''
                 text.textContent = 'Disconnected';
             }
             
-            // Update all pumps
-            updatePumpCard(1, data, '');
-            updatePumpCard(2, data, 'p2');
-            updatePumpCard(3, data, 'p3');
-            updatePumpCard(4, data, 'p4');
-            updatePumpCard(5, data, 'p5');
-            updatePumpCard(6, data, 'p6');
-            updatePumpCard(7, data, 'p7');
+            // Update changed pumps only
+            pumps.forEach(pumpNum => updatePumpCard(pumpNum, data, pumpNum === 1 ? '' : 'p' + pumpNum));
             
             // Check for any alarms
             const hasAlarm = data.trip_red || data.p2_trip_red || data.p3_trip_red || 
@@ -1783,19 +4550,84 @@ HTML_TEMPLATE = '''
             alarmBadge.style.display = hasAlarm ? 'flex' : 'none';
         }
         
+        function applyFullFrame(data) {
+            pumpState = data;
+            updateStatus(pumpState);
+            lastUpdate = Date.now();
+        }
+        
         socket.on('pump_data', (data) => {
-            updateStatus(data);
+            applyFullFrame(data);
+            stopPollingFallback();
+        });
+        
+        // Binary frame: see encode_binary_frame() in pump_dasboard.py for the layout
+        function decodePumpFrame(buffer) {
+            const view = new DataView(buffer);
+            if (view.getUint8(0) !== 2) return null;  // unknown frame version
+            const pumpCount = view.getUint8(2);
+            const data = {
+                connected: (view.getUint8(1) & 1) === 1,
+                sequence: view.getUint32(4, true)
+            };
+            const statusOffset = 8 + pumpCount;
+            const valuesOffset = 8 + Math.ceil(2 * pumpCount / 4) * 4;
+            for (let i = 0; i < pumpCount; i++) {
+                const pumpId = view.getUint8(8 + i);
+                const prefix = pumpId === 1 ? '' : 'p' + pumpId + '_';
+                const bits = view.getUint8(statusOffset + i);
+                data[prefix + 'ready_yellow'] = (bits & 1) !== 0;
+                data[prefix + 'running_green'] = (bits & 2) !== 0;
+                data[prefix + 'trip_red'] = (bits & 4) !== 0;
+                if (pumpId === 1) data.alarm = (bits & 8) !== 0;
+                data[prefix + 'pressure'] = view.getFloat32(valuesOffset + i * 8, true);
+                data[prefix + 'pressure_setpoint'] = view.getFloat32(valuesOffset + i * 8 + 4, true);
+            }
+            return data;
+        }
+        
+        socket.on('pump_frame', (buffer) => {
+            lastUpdate = Date.now();
+            stopPollingFallback();
+            const data = decodePumpFrame(buffer);
+            if (!data) return;
+            if (pumpState.sequence === undefined) {
+                applyFullFrame(data);
+                return;
+            }
+            // Redraw only the pumps whose values moved since the last frame
+            const delta = {};
+            Object.keys(data).forEach(key => {
+                if (key === 'sequence') return;
+                if (key.endsWith('pressure') || key.endsWith('pressure_setpoint')) {
+                    if (Math.abs(data[key] - (pumpState[key] || 0)) >= 0.005) delta[key] = data[key];
+                } else if (data[key] !== pumpState[key]) {
+                    delta[key] = data[key];
+                }
+            });
+            Object.assign(pumpState, data);
+            const pumps = pumpsInDelta(delta);
+            if (pumps.length || 'connected' in delta) {
+                updateStatus(pumpState, pumps);
+            }
+        });
+        
+        socket.on('pump_delta', (delta) => {
             lastUpdate = Date.now();
             stopPollingFallback();
+            // Deltas are meaningless until a full frame has arrived
+            if (pumpState.sequence === undefined) return;
+            Object.assign(pumpState, delta);
+            const pumps = pumpsInDelta(delta);
+            if (pumps.length || 'connected' in delta) {
+                updateStatus(pumpState, pumps);
+            }
         });
         
         // Initial fetch
         fetch('/api/status')
             .then(r => r.json())
-            .then(data => {
-                updateStatus(data);
-                lastUpdate = Date.now();
-            });
+            .then(applyFullFrame);
         
         // Start polling as initial fallback
         setTimeout(() => {
@@ -2451,7 +5283,7 @@ REPORTS_TEMPLATE = '''
                     </svg>
                     Query
                 </button>
-                <button class="btn btn-success" onclick="downloadPDF()">
+                <button class="btn btn-success" id="pdfButton" onclick="downloadPDF()">
                     <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
                         <path d="M21 15v4a2 2 0 01-2 2H5a2 2 0 01-2-2v-4M7 10l5 5 5-5M12 15V3"/>
                     </svg>
@@ -2522,47 +5354,84 @@ REPORTS_TEMPLATE = '''
         loadHealth();
         queryData();
         
+        // Keyset pagination state for the trip events table
+        let eventsQuery = '';
+        let nextCursor = null;
+        let loadingPage = false;
+        let pageObserver = null;
+        
         function queryData() {
             const pump = document.getElementById('pumpSelect').value;
             const start = document.getElementById('startDate').value;
             const end = document.getElementById('endDate').value;
             
             document.getElementById('tripEventsContainer').innerHTML = '<p class="loading">Loading...</p>';
+            eventsQuery = `pump_id=${pump}&start_date=${start}&end_date=${end}`;
+            nextCursor = null;
             
-            fetch(`/api/trip-events?pump_id=${pump}&start_date=${start}&end_date=${end}`)
+            fetch(`/api/trip-events?${eventsQuery}`)
                 .then(r => r.json())
                 .then(data => {
                     document.getElementById('totalTrips').textContent = data.total_trips || 0;
-                    renderEvents(data.events);
+                    nextCursor = data.next_cursor;
+                    renderEvents(data.events, false);
                 })
                 .catch(() => {
                     document.getElementById('tripEventsContainer').innerHTML = '<p class="no-data">Error loading data</p>';
                 });
         }
         
-        function renderEvents(events) {
+        function loadMoreEvents() {
+            if (!nextCursor || loadingPage) return;
+            loadingPage = true;
+            const query = eventsQuery;
+            fetch(`/api/trip-events?${query}&cursor=${encodeURIComponent(nextCursor)}`)
+                .then(r => r.json())
+                .then(data => {
+                    // Ignore pages from a query the user has since replaced
+                    if (query !== eventsQuery) return;
+                    nextCursor = data.next_cursor;
+                    renderEvents(data.events, true);
+                })
+                .finally(() => { loadingPage = false; });
+        }
+        
+        function eventRow(e) {
+            const badge = e.event_type === 'TRIP' ? 'badge-danger' : 'badge-success';
+            return `<tr>
+                <td>${e.timestamp}</td>
+                <td>${e.pump_name}</td>
+                <td><span class="badge ${badge}">${e.event_type}</span></td>
+                <td>${e.pressure ? e.pressure.toFixed(2) : '--'} bar</td>
+                <td>${e.duration || '--'}</td>
+            </tr>`;
+        }
+        
+        function renderEvents(events, append) {
             const container = document.getElementById('tripEventsContainer');
-            if (!events || events.length === 0) {
+            if (!append && (!events || events.length === 0)) {
                 container.innerHTML = '<p class="no-data">No trip events found</p>';
                 return;
             }
             
-            let html = `<table class="data-table">
-                <thead><tr><th>Time</th><th>Pump</th><th>Event</th><th>Pressure</th></tr></thead>
-                <tbody>`;
-            
-            events.forEach(e => {
-                const badge = e.event_type === 'TRIP' ? 'badge-danger' : 'badge-success';
-                html += `<tr>
-                    <td>${e.timestamp}</td>
-                    <td>${e.pump_name}</td>
-                    <td><span class="badge ${badge}">${e.event_type}</span></td>
-                    <td>${e.pressure ? e.pressure.toFixed(2) : '--'} bar</td>
-                </tr>`;
-            });
+            if (!append) {
+                container.innerHTML = `<table class="data-table">
+                    <thead><tr><th>Time</th><th>Pump</th><th>Event</th><th>Pressure</th><th>Duration</th></tr></thead>
+                    <tbody id="tripEventsBody"></tbody></table>
+                    <p class="loading" id="tripEventsMore" style="cursor: pointer" onclick="loadMoreEvents()">Load more</p>`;
+            }
+            document.getElementById('tripEventsBody').insertAdjacentHTML('beforeend', events.map(eventRow).join(''));
             
-            html += '</tbody></table>';
-            container.innerHTML = html;
+            // Fetch the next page automatically when the end of the table scrolls into view
+            const more = document.getElementById('tripEventsMore');
+            more.style.display = nextCursor ? 'block' : 'none';
+            if (pageObserver) pageObserver.disconnect();
+            if (nextCursor && window.IntersectionObserver) {
+                pageObserver = new IntersectionObserver(entries => {
+                    if (entries[0].isIntersecting) loadMoreEvents();
+                });
+                pageObserver.observe(more);
+            }
         }
         
         function loadHealth() {
@@ -2662,7 +5531,45 @@ REPORTS_TEMPLATE = '''
             const pump = document.getElementById('pumpSelect').value;
             const start = document.getElementById('startDate').value;
             const end = document.getElementById('endDate').value;
-            window.location.href = `/api/generate-pdf?pump_id=${pump}&start_date=${start}&end_date=${end}`;
+            const button = document.getElementById('pdfButton');
+            const label = button.lastChild;
+            const originalLabel = label.textContent;
+            
+            function finish() {
+                button.disabled = false;
+                label.textContent = originalLabel;
+            }
+            
+            function poll(job) {
+                if (job.status === 'done') {
+                    finish();
+                    window.location.href = job.download_url;
+                } else if (job.status === 'error' || !job.id) {
+                    finish();
+                    alert('Report failed: ' + job.error);
+                } else {
+                    label.textContent = ` Generating ${Math.round(job.progress * 100)}%`;
+                    setTimeout(() => {
+                        fetch(`/api/reports/${job.id}`).then(r => r.json()).then(poll).catch(finish);
+                    }, 1000);
+                }
+            }
+            
+            // Render in the background and poll; repeated requests are served from the cache
+            button.disabled = true;
+            label.textContent = ' Generating...';
+            fetch('/api/reports', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({pump_id: pump, start_date: start, end_date: end})
+            })
+                .then(r => r.json())
+                .then(poll)
+                .catch(() => {
+                    finish();
+                    // Fall back to synchronous rendering
+                    window.location.href = `/api/generate-pdf?pump_id=${pump}&start_date=${start}&end_date=${end}`;
+                });
         }
         
         // Refresh health every 5 seconds
@@ -2673,6 +5580,29 @@ REPORTS_TEMPLATE = '''
 '''
 
 if __name__ == '__main__':
+    # Local message bus broker for multi-process deployments
+    if '--bus' in sys.argv:
+        if not (MESSAGE_QUEUE or '').startswith('unix://'):
+            sys.exit("--bus needs PUMP_MESSAGE_QUEUE=unix:///path/to/bus.sock")
+        try:
+            run_message_bus(MESSAGE_QUEUE[len('unix://'):])
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    
+    # Poller only: web workers serve the clients and receive updates over the message queue
+    if '--poller' in sys.argv:
+        if not MESSAGE_QUEUE:
+            print("⚠ PUMP_MESSAGE_QUEUE is not set; live updates will not reach any web worker")
+        poller_leader.lead()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\nShutting down...")
+            stop_monitors()
+        sys.exit(0)
+    
     # Create templates directory and save HTML
     import os
     os.makedirs('templates', exist_ok=True)
@@ -2684,14 +5614,15 @@ if __name__ == '__main__':
     # Initialize database
     init_database()
     
-    # Start monitoring
-    monitor.start()
+    # Start monitoring, unless another process already owns the PLC poller
+    poller_leader.lead()
 
     try:
         print("\n" + "=" * 50)
         print("  Challawa Monitoring System")
         print("=" * 50)
-        print(f"  PLC: {PLC_IP}")
+        for site_monitor in monitors.values():
+            print(f"  PLC: {site_monitor.plc_ip} ({site_monitor.name})")
         print("  Local Dashboard: http://127.0.0.1:5000")
         print("  Public Dashboard: https://challawaop.akfotekengineering.com")
         print("=" * 50 + "\n")
@@ -2706,5 +5637,5 @@ if __name__ == '__main__':
 
     except KeyboardInterrupt:
         print("\nShutting down...")
-        monitor.stop()
+        stop_monitors()
 
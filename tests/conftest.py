@@ -0,0 +1,27 @@
+"""
+Shared fixtures. The app creates its database in the working directory on
+import, so it is imported from a scratch directory and the repository's
+pump_events.db is never touched.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+@pytest.fixture(scope='session')
+def pd():
+    workdir = tempfile.mkdtemp(prefix='pump_tests_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import pump_dasboard
+        yield pump_dasboard
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,130 @@
+"""
+BurstCapture re-trip handling and its poll rate under the AIMD controller.
+
+Run from the repository root:  python -m pytest -q tests
+"""
+
+import sqlite3
+
+class RecordingWriter:
+    def __init__(self):
+        self.rows = []
+
+    def submit(self, sql, rows):
+        self.rows.extend(rows)
+        return True
+
+def pump_data(pd, pump_id, pressure, tripped):
+    prefix = pd.pump_prefix(pump_id)
+    return {'connected': True, prefix + 'pressure': pressure, prefix + 'pressure_setpoint': 4.0,
+            prefix + 'running_green': not tripped, prefix + 'trip_red': tripped}
+
+def run(pd, capture, window, pump_id, start, cycles, trips):
+    """Feed one sample per second, triggering at the given cycle numbers"""
+    for cycle in range(cycles):
+        ts = start + cycle
+        if cycle in trips:
+            capture.trigger(pump_id, ts)
+        window.append(pump_data(pd, pump_id, 0.0 if cycle in trips else 3.0, cycle in trips), ts)
+        capture.update(ts)
+
+def test_retrip_stores_both_bursts(pd, monkeypatch):
+    writer = RecordingWriter()
+    monkeypatch.setattr(pd, 'db_writer', writer)
+    window = pd.LiveWindow([1], 600)
+    capture = pd.BurstCapture(window)
+    start = 1_000_000.0
+    first, second = 40, 45  # second trip lands inside the first burst's post window
+    run(pd, capture, window, 1, start, 70, {first, second})
+
+    assert capture.captured == 2
+    assert not capture.active()
+    (pump_a, trigger_a, pre_a, samples_a, _, _, _, ms_a), (pump_b, trigger_b, pre_b, samples_b, _, _, _, ms_b) = writer.rows
+    assert (pump_a, pump_b) == (1, 1)
+    assert (trigger_a, trigger_b) == (start + first, start + second)
+    assert (ms_a, ms_b) == (pd.event_ms(start + first), pd.event_ms(start + second))
+    # The first burst ends where the re-trip's begins
+    assert samples_a - pre_a == second - first
+    assert samples_b - pre_b == pd.BURST_POST_SECONDS + 1
+
+def test_retrip_after_close_opens_new_burst(pd, monkeypatch):
+    writer = RecordingWriter()
+    monkeypatch.setattr(pd, 'db_writer', writer)
+    window = pd.LiveWindow([1], 600)
+    capture = pd.BurstCapture(window)
+    run(pd, capture, window, 1, 2_000_000.0, 90, {40, 40 + pd.BURST_POST_SECONDS + 5})
+
+    assert capture.captured == 2
+    assert [row[3] - row[2] for row in writer.rows] == [pd.BURST_POST_SECONDS + 1] * 2
+
+def open_burst(pd, capture, window):
+    window.append(pump_data(pd, 1, 3.0, False), 100.0)
+    capture.trigger(1, 101.0)
+
+def test_burst_polls_fast_only_at_the_rate_floor(pd):
+    window = pd.LiveWindow([1], 600)
+    capture = pd.BurstCapture(window)
+    rate = pd.AdaptiveRate(period=pd.MIN_CYCLE_TIME)
+    assert capture.period(rate) == rate.period  # no burst open
+    open_burst(pd, capture, window)
+    assert capture.period(rate) == pd.BURST_CYCLE_TIME
+
+    # A PLC the controller has backed off keeps its slow rate through a burst
+    rate.update(2, False, None)
+    assert rate.period > pd.MIN_CYCLE_TIME
+    assert capture.period(rate) == rate.period
+
+def test_busy_read_ends_the_fast_phase(pd):
+    window = pd.LiveWindow([1], 600)
+    capture = pd.BurstCapture(window)
+    rate = pd.AdaptiveRate(period=pd.MIN_CYCLE_TIME)
+    open_burst(pd, capture, window)
+    capture.read_outcome(0, False)
+    assert capture.period(rate) == pd.BURST_CYCLE_TIME
+    capture.read_outcome(1, False)
+    assert capture.period(rate) == rate.period
+    # Clean cycles do not resume fast polling while the burst is still open
+    capture.read_outcome(0, False)
+    assert capture.period(rate) == rate.period
+
+def test_busy_read_before_a_trip_blocks_fast_polling(pd, monkeypatch):
+    monkeypatch.setattr(pd, 'db_writer', RecordingWriter())
+    window = pd.LiveWindow([1], 600)
+    capture = pd.BurstCapture(window)
+    rate = pd.AdaptiveRate(period=pd.MIN_CYCLE_TIME)
+    capture.read_outcome(0, True)
+    open_burst(pd, capture, window)
+    assert capture.period(rate) == rate.period
+    # Once the bursts are stored, a clean cycle lifts the throttle for the next trip
+    capture.update(200.0)
+    capture.read_outcome(0, False)
+    open_burst(pd, capture, window)
+    assert capture.period(rate) == pd.BURST_CYCLE_TIME
+
+def test_trips_within_one_second_keep_their_own_bursts(pd, monkeypatch):
+    """trip, clear, trip inside one second: each burst links to its own trip row"""
+    monkeypatch.setattr(pd, 'db_writer', pd.DatabaseWriter(pd.DB_PATH))
+    pd.db_writer.start()
+    window = pd.LiveWindow([1], 600)
+    capture = pd.BurstCapture(window)
+    previous = {1: False}
+    start = 3_000_000.0
+    for cycle in range(200):
+        ts = start + cycle * 0.1
+        tripped = cycle in (100, 104)
+        data = pump_data(pd, 1, 0.0 if tripped else 3.0, tripped)
+        for pump_id, event_code, *_ in pd.log_events(data, previous, ts=ts):
+            if event_code == pd.EVENT_CODES['TRIP']:
+                capture.trigger(pump_id, ts)
+        window.append(data, ts)
+        capture.update(ts)
+    capture.update(start + 100, force=True)
+    pd.db_writer.stop()
+
+    conn = sqlite3.connect(pd.DB_PATH)
+    rows = conn.execute('''
+        SELECT e.id, b.trigger_time FROM trip_event_log e JOIN trip_bursts b ON b.trip_event_id = e.id
+        WHERE e.event_code = 1 AND e.timestamp = ? ORDER BY e.id
+    ''', (pd.db_timestamp(start + 10),)).fetchall()
+    conn.close()
+    assert [trigger for _, trigger in rows] == [start + 10.0, start + 10.4]